@@ -1,6 +1,9 @@
 from django.contrib import admin
 from django.utils.translation import gettext_lazy as _
-from .models import Document, Bulletin, BulletinSubject, Attestation
+from .models import (
+    Document, Bulletin, BulletinSubject, Attestation, DocumentJob, DocumentArchive, DocumentBlob,
+    BulletinDelivery
+)
 
 
 @admin.register(Document)
@@ -35,4 +38,39 @@ class AttestationAdmin(admin.ModelAdmin):
     list_filter = ('attestation_type', 'language', 'academic_year', 'created_at')
     search_fields = ('student__user__first_name', 'student__user__last_name', 'class_name')
     ordering = ('-created_at',)
-    readonly_fields = ('created_at',)
\ No newline at end of file
+    readonly_fields = ('created_at',)
+
+
+@admin.register(DocumentJob)
+class DocumentJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'job_type', 'language', 'status', 'progress', 'requested_by', 'created_at', 'finished_at')
+    list_filter = ('job_type', 'status', 'language', 'created_at')
+    search_fields = ('document__title', 'task_id')
+    ordering = ('-created_at',)
+    readonly_fields = ('created_at', 'started_at', 'finished_at', 'task_id')
+
+
+@admin.register(DocumentArchive)
+class DocumentArchiveAdmin(admin.ModelAdmin):
+    list_display = ('academic_year', 'file_path', 'document_count', 'original_size', 'packed_size', 'created_at')
+    list_filter = ('academic_year',)
+    search_fields = ('academic_year', 'file_path')
+    ordering = ('-created_at',)
+    readonly_fields = ('created_at',)
+
+
+@admin.register(DocumentBlob)
+class DocumentBlobAdmin(admin.ModelAdmin):
+    list_display = ('sha256', 'file_path', 'size', 'created_at')
+    search_fields = ('sha256', 'file_path')
+    ordering = ('-created_at',)
+    readonly_fields = ('sha256', 'file_path', 'size', 'created_at')
+
+
+@admin.register(BulletinDelivery)
+class BulletinDeliveryAdmin(admin.ModelAdmin):
+    list_display = ('bulletin', 'email', 'language', 'status', 'attempts', 'sent_at')
+    list_filter = ('status', 'language', 'bulletin__academic_year', 'bulletin__trimester')
+    search_fields = ('email', 'parent__user__first_name', 'parent__user__last_name')
+    ordering = ('-created_at',)
+    readonly_fields = ('created_at', 'sent_at', 'attempts', 'error')
@@ -0,0 +1,114 @@
+"""
+Arabic shaping and bidi reordering for the ReportLab path.
+
+ReportLab draws glyphs left to right, one code point at a time, so Arabic
+text has to be reshaped into its contextual presentation forms and put
+in visual order before it reaches a Paragraph or a Table cell.
+
+Static labels are shaped once when a layout is compiled; data strings
+(student, teacher and subject names, notes) go through a bounded LRU so
+large Arabic batches reshape each distinct string only once.
+"""
+import re
+from functools import lru_cache
+
+import arabic_reshaper
+from bidi.algorithm import get_display
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+ARABIC_TEXT_CACHE_SIZE = 4096
+
+ARABIC_RE = re.compile('[\u0600-\u06ff\u0750-\u077f\u08a0-\u08ff\ufb50-\ufdff\ufe70-\ufeff]')
+LINE_BREAK_RE = re.compile(r'<br\s*/?>|\n\s*\n')
+BOLD_RE = re.compile(r'(</?b>)')
+
+_reshaper = arabic_reshaper.ArabicReshaper(configuration={'delete_harakat': False})
+
+
+def has_arabic(text):
+    return bool(text) and ARABIC_RE.search(text) is not None
+
+
+def _shape(text):
+    return get_display(_reshaper.reshape(text), base_dir='R')
+
+
+def shape_label(text):
+    """
+    Shape a static label. Called once per label when a layout is compiled.
+    """
+    return _shape(text) if has_arabic(text) else text
+
+
+@lru_cache(maxsize=ARABIC_TEXT_CACHE_SIZE)
+def shape_text(text):
+    """
+    Shape a single-line data string (names, class, subject), cached
+    """
+    return _shape(text) if has_arabic(text) else text
+
+
+def shape_value(value):
+    """
+    Shape any table cell value, leaving non-Arabic values untouched
+    """
+    if value is None:
+        return value
+    text = str(value)
+    return shape_text(text) if has_arabic(text) else text
+
+
+def _wrap(text, font_name, font_size, width):
+    """
+    Greedy word wrap on the logical (unshaped) text, measured on the shaped words
+    """
+    lines, current = [], []
+    for word in text.split():
+        candidate = ' '.join(current + [word])
+        if current and stringWidth(_reshaper.reshape(candidate), font_name, font_size) > width:
+            lines.append(' '.join(current))
+            current = [word]
+        else:
+            current.append(word)
+    if current:
+        lines.append(' '.join(current))
+    return lines
+
+
+def _shape_line(line, font_name, font_size, width):
+    """
+    Shape one logical line of Paragraph markup into visual-order markup lines
+    """
+    if '<b>' not in line and '</b>' not in line:
+        line = ' '.join(line.split())
+        if not has_arabic(line):
+            return [line]
+        return [shape_text(part) for part in _wrap(line, font_name, font_size, width)]
+
+    # Bold runs: shape each run, then reverse the run order for the RTL line
+    runs, bold = [], False
+    for token in BOLD_RE.split(line):
+        if token in ('<b>', '</b>'):
+            bold = token == '<b>'
+        elif token.strip():
+            runs.append((' '.join(token.split()), bold))
+    parts = []
+    for text, is_bold in reversed(runs):
+        shaped = shape_text(text)
+        parts.append(f'<b>{shaped}</b>' if is_bold else shaped)
+    return [' '.join(parts)]
+
+
+@lru_cache(maxsize=ARABIC_TEXT_CACHE_SIZE)
+def shape_markup(text, font_name, font_size, width):
+    """
+    Shape Paragraph markup (<b> and <br/> only) for right-to-left display.
+    Long lines are wrapped here, in logical order, because ReportLab would
+    otherwise wrap the visual string and put the end of a sentence first.
+    """
+    if not has_arabic(text):
+        return text
+    lines = []
+    for line in LINE_BREAK_RE.split(text.strip()):
+        lines.extend(_shape_line(line, font_name, font_size, width))
+    return '<br/>'.join(lines)
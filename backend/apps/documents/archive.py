@@ -0,0 +1,206 @@
+"""
+Yearly archive packs for generated documents.
+
+Once an academic year is closed, its generated PDFs are packed into a
+single file per year instead of living forever as individual files:
+
+    PACK_MAGIC
+    member*                      zlib-compressed document, one per file
+    index entry* (INDEX_ENTRY)   document id, offset, packed length, original length
+    trailer (TRAILER)            index offset, entry count, PACK_MAGIC
+
+The offset and length of each member are also stored on the Document
+row, so a single document is served with one seek and one read, without
+unpacking anything else. Documents sharing a content blob share one
+member: the index then holds one entry per document at the same offset.
+The index at the end of the pack keeps the file self-describing should the
+database rows ever need to be rebuilt.
+
+Each archive run writes a new pack under a unique name: documents already
+archived keep pointing at the pack they were written to, which is never
+overwritten.
+"""
+import os
+import struct
+import tempfile
+import uuid
+import zlib
+
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils import timezone
+
+from .models import Document, DocumentArchive
+from .storage import document_storage
+
+PACK_MAGIC = b'SSMPACK1'
+INDEX_ENTRY = struct.Struct('<IQII')
+TRAILER = struct.Struct('<QI8s')
+COMPRESSION_LEVEL = 6
+UPDATE_BATCH_SIZE = 1000
+
+
+class PackWriter:
+    """
+    Appends compressed documents to an open binary file, then writes the index
+    """
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.entries = []
+        self.fileobj.write(PACK_MAGIC)
+
+    def add(self, document_id, content):
+        packed = zlib.compress(content, COMPRESSION_LEVEL)
+        offset = self.fileobj.tell()
+        self.fileobj.write(packed)
+        self.link(document_id, offset, len(packed), len(content))
+        return offset, len(packed)
+
+    def link(self, document_id, offset, length, size):
+        """
+        Index a document under a member already written
+        """
+        self.entries.append((document_id, offset, length, size))
+
+    def close(self):
+        index_offset = self.fileobj.tell()
+        for entry in self.entries:
+            self.fileobj.write(INDEX_ENTRY.pack(*entry))
+        self.fileobj.write(TRAILER.pack(index_offset, len(self.entries), PACK_MAGIC))
+
+
+def read_index(fileobj):
+    """
+    Index of a pack: {document_id: (offset, packed length, original length)}
+    """
+    fileobj.seek(-TRAILER.size, os.SEEK_END)
+    index_offset, count, magic = TRAILER.unpack(fileobj.read(TRAILER.size))
+    if magic != PACK_MAGIC:
+        raise ValueError('Not a document archive pack')
+    fileobj.seek(index_offset)
+    data = fileobj.read(count * INDEX_ENTRY.size)
+    return {
+        document_id: (offset, length, size)
+        for document_id, offset, length, size in INDEX_ENTRY.iter_unpack(data)
+    }
+
+
+def read_member(fileobj, offset, length):
+    fileobj.seek(offset)
+    return zlib.decompress(fileobj.read(length))
+
+
+def read_archived_document(document):
+    """
+    Bytes of an archived document, read from its pack by offset
+    """
+    with document_storage().open(document.archive.file_path, 'rb') as f:
+        return read_member(f, document.archive_offset, document.archive_length)
+
+
+def serve_archived_document(request, document):
+    """
+    Deliver a document straight out of its archive pack
+    """
+    etag = f'"a{document.archive_id:x}-{document.archive_offset:x}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(read_archived_document(document), content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="{os.path.basename(document.file_path)}"'
+    response['ETag'] = etag
+    return response
+
+
+def documents_for_year(academic_year):
+    """
+    Generated documents of an academic year that still live as individual files
+    """
+    return Document.objects.filter(
+        Q(bulletin__academic_year=academic_year) |
+        Q(attestation__academic_year=academic_year) |
+        Q(jobs__bulletin__academic_year=academic_year),
+        archive__isnull=True,
+        file_size__isnull=False
+    ).distinct().order_by('id')
+
+
+def archive_academic_year(academic_year):
+    """
+    Pack the year's documents into one archive file and point the Document
+    rows at it. Individual files are deleted once the rows are committed;
+    shared content blobs are released and left to the blob collector.
+    Returns the DocumentArchive, or None when there was nothing to pack.
+    """
+    storage = document_storage()
+    packed = []
+    members = {}
+    original_size = 0
+
+    with tempfile.TemporaryFile() as pack:
+        writer = PackWriter(pack)
+        documents = documents_for_year(academic_year).values_list('id', 'file_path', 'blob_id')
+        for document_id, file_path, blob_id in documents.iterator():
+            if file_path in members:
+                # Same blob as a document already packed: reuse its member
+                offset, length, size = members[file_path]
+                writer.link(document_id, offset, length, size)
+            else:
+                if not storage.exists(file_path):
+                    continue
+                with storage.open(file_path, 'rb') as f:
+                    content = f.read()
+                offset, length = writer.add(document_id, content)
+                members[file_path] = (offset, length, len(content))
+                original_size += len(content)
+            packed.append((document_id, file_path if blob_id is None else None, offset, length))
+
+        if not packed:
+            return None
+
+        writer.close()
+        packed_size = pack.tell()
+        pack.seek(0)
+        # A unique name per run: earlier packs stay intact for the rows pointing into them
+        name = storage.save(f"archives/{academic_year}-{uuid.uuid4().hex}.pack", File(pack))
+
+    now = timezone.now()
+    with transaction.atomic():
+        archive = DocumentArchive.objects.create(
+            academic_year=academic_year,
+            file_path=name,
+            document_count=len(packed),
+            original_size=original_size,
+            packed_size=packed_size
+        )
+        for start in range(0, len(packed), UPDATE_BATCH_SIZE):
+            Document.objects.bulk_update([
+                Document(
+                    id=document_id, archive=archive, archive_offset=offset, archive_length=length,
+                    is_archived=True, archived_at=now, blob=None
+                )
+                for document_id, file_path, offset, length in packed[start:start + UPDATE_BATCH_SIZE]
+            ], ['archive', 'archive_offset', 'archive_length', 'is_archived', 'archived_at', 'blob'])
+
+        file_paths = {file_path for document_id, file_path, offset, length in packed if file_path}
+        transaction.on_commit(lambda: delete_files(file_paths))
+
+    return archive
+
+
+def delete_files(file_paths):
+    storage = document_storage()
+    for file_path in file_paths:
+        storage.delete(file_path)
+
+
+def archive_summary(academic_year):
+    """
+    What archiving a year would pack: document count and total size
+    """
+    return Document.objects.filter(
+        id__in=documents_for_year(academic_year).values('id')
+    ).aggregate(count=Count('id'), size=Sum('file_size'))
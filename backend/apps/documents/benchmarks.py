@@ -0,0 +1,463 @@
+"""
+PDF generation benchmarks.
+
+Bulletins are built in memory (unsaved model instances) so a run measures
+rendering only, without database queries.
+
+The suite (run_suite) renders factory-built bulletins and attestations in
+French and Arabic and is compared against a stored baseline by
+`manage.py benchmark_pdf --suite` and by PDFBenchmarkSuiteTest. Each case
+runs in a fresh process whose peak RSS is reset before it starts (Linux
+only): a spawned child inherits its parent's ru_maxrss, so the resource
+module would report the test runner's high-water mark instead.
+"""
+import json
+import os
+import re
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from multiprocessing import get_context
+
+import django
+
+from apps.accounts.models import User, Student, Institution
+from apps.finance.models import Invoice, Payment, Receipt
+from .models import Attestation, Bulletin, BulletinSubject
+from .pdf_generator import BulletinPDFGenerator, AttestationPDFGenerator, ReceiptPDFGenerator
+from .renderers import RENDERERS, ReportLabRenderer, StaticPage, engine_available
+
+PAGE_RE = re.compile(rb'/Type\s*/Page\b')
+
+SUBJECT_NAMES = [
+    ('Mathématiques', 'الرياضيات'),
+    ('Français', 'الفرنسية'),
+    ('Arabe', 'العربية'),
+    ('Anglais', 'الإنجليزية'),
+    ('Sciences', 'العلوم'),
+    ('Physique', 'الفيزياء'),
+    ('Histoire', 'التاريخ'),
+    ('Géographie', 'الجغرافيا'),
+    ('Éducation islamique', 'التربية الإسلامية'),
+    ('Informatique', 'الإعلامية'),
+]
+
+
+def synthetic_institution():
+    return Institution(
+        name="École Pilote de Tunis",
+        name_ar="المدرسة النموذجية بتونس",
+        address="12 Avenue Habib Bourguiba, Tunis",
+        phone="+216 71 000 000",
+        email="contact@ecole.tn"
+    )
+
+
+def synthetic_bulletin(index, subject_count=10, language='fr'):
+    """
+    Unsaved bulletin with its subjects, deterministic for a given index
+    """
+    bulletin = Bulletin(
+        student=synthetic_student(index),
+        academic_year="2024-2025",
+        trimester="1er Trimestre",
+        class_name=f"Classe {index % 5 + 1}",
+        language=language,
+        total_average=Decimal(10 + index % 9),
+        class_rank=index % 30 + 1,
+        level_rank=index % 100 + 1,
+        total_days=100,
+        present_days=100 - index % 10,
+        absent_days=index % 10,
+        attendance_rate=Decimal(100 - index % 10),
+        teacher_notes="Bon trimestre, continuez vos efforts.",
+        principal_notes="Travail satisfaisant."
+    )
+    subjects = []
+    for i in range(subject_count):
+        name, name_ar = SUBJECT_NAMES[i % len(SUBJECT_NAMES)]
+        subjects.append(BulletinSubject(
+            bulletin=bulletin,
+            subject_name=f"{name} {i // len(SUBJECT_NAMES) + 1}" if i >= len(SUBJECT_NAMES) else name,
+            subject_name_ar=name_ar,
+            coefficient=Decimal(1 + i % 4),
+            average=Decimal(8 + (index + i) % 11),
+            teacher_name=f"Enseignant {i + 1}",
+            teacher_notes="Participation active en classe." if i % 2 else ""
+        ))
+    return bulletin, subjects
+
+
+def synthetic_student(index):
+    user = User(first_name=f"Élève{index}", last_name="Ben Salah", username=f"student{index}")
+    return Student(user=user, student_id=f"STU{index:06d}", date_of_birth=date(2012, 1, 1 + index % 28))
+
+
+def synthetic_attestation(index, attestation_type='presence', language='fr'):
+    return Attestation(
+        student=synthetic_student(index),
+        attestation_type=attestation_type,
+        language=language,
+        academic_year="2024-2025",
+        class_name=f"Classe {index % 5 + 1}",
+        level_name="7ème année",
+        created_at=datetime(2024, 9, 16, 9, 0, tzinfo=timezone.utc)
+    )
+
+
+def synthetic_receipt(index):
+    invoice = Invoice(
+        invoice_number=f"INV-{index:06d}",
+        invoice_type='tuition',
+        student=synthetic_student(index),
+        amount=Decimal('450.00'),
+        description="Frais de scolarité - 1er trimestre",
+        due_date=date(2024, 10, 1)
+    )
+    payment = Payment(
+        invoice=invoice,
+        amount=invoice.amount,
+        payment_method='cash',
+        payment_date=datetime(2024, 9, 16, 10, 30, tzinfo=timezone.utc),
+        reference_number=f"REF{index:06d}",
+        status='completed'
+    )
+    return Receipt(payment=payment, receipt_number=f"RCP-{index:06d}")
+
+
+def count_pages(content):
+    return len(PAGE_RE.findall(content))
+
+
+def benchmark_bulletins(count=100, language='fr', subject_count=10, engine=None, trace_memory=False):
+    """
+    Render `count` bulletins and return throughput figures.
+    With trace_memory, peak Python heap usage is measured with tracemalloc
+    (slower, so throughput numbers of traced runs are not comparable).
+    """
+    institution = synthetic_institution()
+    bulletins = [synthetic_bulletin(i, subject_count, language) for i in range(count)]
+
+    # Warm up: fonts, layouts and stylesheets are per-process costs
+    BulletinPDFGenerator(language=language, engine=engine).build_bulletin(
+        bulletins[0][0], language, subjects=bulletins[0][1], institution=institution
+    )
+
+    if trace_memory:
+        tracemalloc.start()
+    total_bytes = total_pages = 0
+    start = time.perf_counter()
+    for bulletin, subjects in bulletins:
+        generator = BulletinPDFGenerator(language=language, engine=engine)
+        content = generator.build_bulletin(bulletin, language, subjects=subjects, institution=institution)
+        total_bytes += len(content)
+        total_pages += count_pages(content)
+    elapsed = time.perf_counter() - start
+    peak_memory = None
+    if trace_memory:
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {
+        'engine': engine or 'default',
+        'language': language,
+        'documents': count,
+        'subjects': subject_count,
+        'seconds': elapsed,
+        'docs_per_sec': count / elapsed if elapsed else 0,
+        'pages_per_sec': total_pages / elapsed if elapsed else 0,
+        'avg_bytes': total_bytes // count if count else 0,
+        'peak_memory': peak_memory,
+    }
+
+
+def benchmark_class_pack(count=30, language='fr', subject_count=10, shared_header=True, repeat=5):
+    """
+    Render a merged pack of `count` bulletins. With shared_header=False the
+    header and footer are drawn again on every page instead of referencing
+    the shared forms, for comparison. Best time of `repeat` runs.
+    """
+    institution = synthetic_institution()
+    generator = BulletinPDFGenerator(language=language)
+    contexts = [
+        generator.bulletin_context(bulletin, subjects, institution)
+        for bulletin, subjects in (synthetic_bulletin(i, subject_count, language) for i in range(count))
+    ]
+    renderer = ReportLabRenderer(generator)
+
+    def render():
+        page = None
+        if not shared_header:
+            page = StaticPage(
+                generator._create_institution_header(institution, language),
+                generator._create_page_footer(institution, language),
+                shared=False
+            )
+        return renderer.render_pack('bulletin', contexts, language, page)
+
+    render()  # warm up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        content = render()
+        timings.append(time.perf_counter() - start)
+
+    return {
+        'documents': count,
+        'language': language,
+        'shared_header': shared_header,
+        'seconds': min(timings),
+        'pages': count_pages(content),
+        'bytes': len(content),
+    }
+
+
+def sample_sizes(languages=('fr', 'ar'), pack_count=30):
+    """
+    Bytes and pages of one generated document per document type and
+    language, plus bytes per bulletin in a merged class pack
+    """
+    institution = synthetic_institution()
+    report = []
+    for language in languages:
+        bulletins = BulletinPDFGenerator(language=language)
+        attestations = AttestationPDFGenerator(language=language)
+        receipts = ReceiptPDFGenerator(language=language)
+        bulletin, subjects = synthetic_bulletin(1, language=language)
+        samples = {
+            'bulletin': lambda: bulletins.build_bulletin(
+                bulletin, language, subjects=subjects, institution=institution
+            ),
+            'attestation_presence': lambda: attestations.build_presence_attestation(
+                synthetic_attestation(1, 'presence', language), language, institution=institution
+            ),
+            'attestation_inscription': lambda: attestations.build_inscription_attestation(
+                synthetic_attestation(1, 'inscription', language), language, institution=institution
+            ),
+            'receipt': lambda: receipts.build_receipt(synthetic_receipt(1), language, institution=institution),
+        }
+        for document_type, render in samples.items():
+            content = render()
+            report.append({
+                'document_type': document_type,
+                'language': language,
+                'bytes': len(content),
+                'pages': count_pages(content),
+            })
+
+        pack = benchmark_class_pack(pack_count, language, repeat=1)
+        report.append({
+            'document_type': f'bulletin pack /{pack_count}',
+            'language': language,
+            'bytes': pack['bytes'] // pack_count,
+            'pages': pack['pages'] / pack_count,
+        })
+    return report
+
+
+def compare_engines(count=50, languages=('fr', 'ar'), subject_count=10, engines=None):
+    """
+    Run the bulletin benchmark for every engine and language.
+    Engines that cannot run here (e.g. WeasyPrint without Pango) are reported as unavailable.
+    """
+    results = []
+    for engine in engines or RENDERERS:
+        if not engine_available(engine):
+            results.append({'engine': engine, 'available': False})
+            continue
+        for language in languages:
+            throughput = benchmark_bulletins(count, language, subject_count, engine=engine)
+            memory = benchmark_bulletins(max(count // 10, 1), language, subject_count, engine=engine, trace_memory=True)
+            throughput['peak_memory'] = memory['peak_memory']
+            throughput['available'] = True
+            results.append(throughput)
+    return results
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'testdata', 'benchmark_baseline.json')
+
+# (document type, language, subjects per bulletin)
+SUITE_CASES = [
+    ('bulletin', 'fr', 5),
+    ('bulletin', 'fr', 30),
+    ('bulletin', 'ar', 5),
+    ('bulletin', 'ar', 30),
+    ('attestation_presence', 'fr', 0),
+    ('attestation_presence', 'ar', 0),
+]
+
+# Allowed relative regression per metric before a run fails
+REGRESSION_TOLERANCES = {
+    'docs_per_sec': 0.30,
+    'p95_ms': 0.50,
+    'alloc_kib_per_doc': 0.20,
+    'avg_bytes': 0.10,
+    'peak_rss_mib': 0.30,
+}
+HIGHER_IS_BETTER = {'docs_per_sec'}
+
+
+def factory_documents(document_type, language, subject_count, count, seed=0):
+    """
+    Unsaved documents built with the project factories, reproducible for a seed
+    """
+    import factory.random
+    from faker import Faker
+    from factories import AttestationFactory, BulletinFactory, BulletinSubjectFactory
+
+    factory.random.reseed_random(seed)
+    Faker.seed(seed)
+
+    documents = []
+    for _ in range(count):
+        if document_type == 'bulletin':
+            bulletin = BulletinFactory.build(language=language)
+            subjects = BulletinSubjectFactory.build_batch(subject_count, bulletin=bulletin)
+            documents.append((bulletin, subjects))
+        else:
+            documents.append((AttestationFactory.build(attestation_type='presence', language=language), None))
+    return documents
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[round(fraction * (len(sorted_values) - 1))]
+
+
+def _reset_peak_rss():
+    # Writing 5 to clear_refs resets the VmHWM of /proc/self/status
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        return False
+    return True
+
+
+def _peak_rss_mib():
+    # Peak resident set size since the last reset, None where /proc is not available
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 2**10
+    except OSError:
+        pass
+    return None
+
+
+def profile_case(document_type, language, subject_count, count=20, engine=None):
+    """
+    Render one suite case twice: a timed pass (docs/sec, latency percentiles,
+    output size) and a tracemalloc pass (peak Python heap allocated per document).
+    """
+    institution = synthetic_institution()
+    documents = factory_documents(document_type, language, subject_count, count)
+
+    if document_type == 'bulletin':
+        generator = BulletinPDFGenerator(language=language, engine=engine)
+
+        def render(document):
+            bulletin, subjects = document
+            return generator.build_bulletin(bulletin, language, subjects=subjects, institution=institution)
+    else:
+        generator = AttestationPDFGenerator(language=language, engine=engine)
+
+        def render(document):
+            return generator.build_presence_attestation(document[0], language, institution=institution)
+
+    render(documents[0])  # warm up per-process caches
+
+    latencies = []
+    total_bytes = 0
+    for document in documents:
+        start = time.perf_counter()
+        total_bytes += len(render(document))
+        latencies.append(time.perf_counter() - start)
+
+    allocations = []
+    tracemalloc.start()
+    for document in documents:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        render(document)
+        allocations.append(tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+
+    latencies.sort()
+    elapsed = sum(latencies)
+    return {
+        'documents': count,
+        'docs_per_sec': round(count / elapsed, 2) if elapsed else 0,
+        'p50_ms': round(_percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(_percentile(latencies, 0.95) * 1000, 2),
+        'alloc_kib_per_doc': round(sum(allocations) / len(allocations) / 1024, 1),
+        'avg_bytes': total_bytes // count,
+    }
+
+
+def isolated_case(args):
+    """
+    Profile a case in the current (fresh) process and add its own peak RSS
+    where it can be measured. Module level so it can run in a worker process.
+    """
+    measured = _reset_peak_rss()
+    metrics = profile_case(*args)
+    peak = _peak_rss_mib()
+    if measured and peak is not None:
+        metrics['peak_rss_mib'] = round(peak, 1)
+    return metrics
+
+
+def case_key(document_type, language, subject_count):
+    return f"{document_type}:{language}:{subject_count}"
+
+
+def run_suite(count=20, cases=SUITE_CASES, engine=None):
+    """
+    Profile every suite case, each in a new spawned process: {case key: metrics}
+    """
+    results = {}
+    for document_type, language, subject_count in cases:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn'), initializer=django.setup) as pool:
+            results[case_key(document_type, language, subject_count)] = pool.submit(
+                isolated_case, (document_type, language, subject_count, count, engine)
+            ).result()
+    return results
+
+
+def check_regressions(results, baseline, tolerances=REGRESSION_TOLERANCES):
+    """
+    Human-readable list of metrics that regressed past their tolerance
+    """
+    regressions = []
+    for key, metrics in results.items():
+        reference = baseline.get(key)
+        if not reference:
+            continue
+        for metric, tolerance in tolerances.items():
+            if metric not in metrics or not reference.get(metric):
+                continue
+            change = (metrics[metric] - reference[metric]) / reference[metric]
+            if metric in HIGHER_IS_BETTER:
+                change = -change
+            if change > tolerance:
+                regressions.append(
+                    f"{key} {metric}: {metrics[metric]} vs baseline {reference[metric]} "
+                    f"({change:+.0%} worse, tolerance {tolerance:.0%})"
+                )
+    return regressions
+
+
+def load_baseline(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write('\n')
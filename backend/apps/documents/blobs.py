@@ -0,0 +1,114 @@
+"""
+Content-addressed storage for generated documents.
+
+Rendered files are stored once under blobs/<aa>/<sha256>.pdf and shared
+by every Document that produced the same bytes. Each Document also keeps
+the render key (fingerprint of the data it was rendered from), so a
+regeneration from unchanged data reuses the existing blob without
+rendering or writing anything.
+
+Blobs that no document references any more are removed by
+collect_garbage(), after a grace period that protects blobs written by a
+job that has not linked its document yet.
+"""
+import hashlib
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.db import IntegrityError
+from django.db.models import ProtectedError
+from django.utils import timezone
+
+from .models import Document, DocumentBlob
+from .storage import document_storage
+
+BLOB_PREFIX = 'blobs'
+GC_GRACE_PERIOD = timedelta(hours=1)
+
+
+def blob_path(digest, extension='pdf'):
+    return f"{BLOB_PREFIX}/{digest[:2]}/{digest}.{extension}"
+
+
+def find_rendered_blob(render_key):
+    """
+    Blob already rendered from identical data, if any
+    """
+    if not render_key:
+        return None
+    document = Document.objects.filter(
+        render_key=render_key, blob__isnull=False
+    ).select_related('blob').only('blob').first()
+    return document.blob if document else None
+
+
+def store_blob(content):
+    """
+    Store bytes under their content hash. Identical content is written once.
+    Returns (blob, created).
+    """
+    digest = hashlib.sha256(content).hexdigest()
+    blob = DocumentBlob.objects.filter(sha256=digest).first()
+    if blob:
+        return blob, False
+
+    storage = document_storage()
+    name = blob_path(digest)
+    if not storage.exists(name):
+        saved_name = storage.save(name, ContentFile(content))
+        if saved_name != name:
+            # Written concurrently by another worker: same bytes, keep theirs
+            storage.delete(saved_name)
+
+    try:
+        return DocumentBlob.objects.get_or_create(sha256=digest, defaults={'file_path': name, 'size': len(content)})
+    except IntegrityError:
+        return DocumentBlob.objects.get(sha256=digest), False
+
+
+def unreferenced_blobs(grace_period=GC_GRACE_PERIOD):
+    return DocumentBlob.objects.filter(
+        documents__isnull=True,
+        created_at__lt=timezone.now() - grace_period
+    )
+
+
+def collect_garbage(grace_period=GC_GRACE_PERIOD, dry_run=False):
+    """
+    Delete blobs no document references. Returns (count, bytes) reclaimed.
+    """
+    storage = document_storage()
+    count = reclaimed = 0
+    for blob in unreferenced_blobs(grace_period).iterator():
+        count += 1
+        reclaimed += blob.size
+        if dry_run:
+            continue
+        # Row first: a document linking the blob meanwhile makes the delete fail
+        try:
+            deleted, _ = DocumentBlob.objects.filter(id=blob.id, documents__isnull=True).delete()
+        except ProtectedError:
+            continue
+        if deleted:
+            storage.delete(blob.file_path)
+    return count, reclaimed
+
+
+def orphan_files(grace_period=GC_GRACE_PERIOD):
+    """
+    Files under blobs/ with no DocumentBlob row (e.g. a worker died between write and insert)
+    """
+    storage = document_storage()
+    cutoff = timezone.now() - grace_period
+    if not storage.exists(BLOB_PREFIX):
+        return []
+    known = set(DocumentBlob.objects.values_list('file_path', flat=True))
+    orphans = []
+    directories, _ = storage.listdir(BLOB_PREFIX)
+    for directory in directories:
+        _, files = storage.listdir(f"{BLOB_PREFIX}/{directory}")
+        for file_name in files:
+            name = f"{BLOB_PREFIX}/{directory}/{file_name}"
+            if name not in known and storage.get_modified_time(name) < cutoff:
+                orphans.append(name)
+    return orphans
@@ -0,0 +1,283 @@
+"""
+E-mail distribution of bulletins to parents.
+
+Instead of every parent logging in to download the bulletin when results
+are published, the bulletins are mailed to them:
+
+- queue_deliveries() resolves the parents of all the bulletins through
+  ParentStudent in one query and records one BulletinDelivery per parent
+- send_deliveries() sends the due deliveries in batches over one SMTP
+  connection kept open for the whole run, paced by a rate limit. The PDF
+  attached is the stored rendering when it is up to date, rendered in
+  memory otherwise, and read once per bulletin and language in a batch.
+- a batch is claimed in a short transaction (SKIP LOCKED) that pushes its
+  next attempt CLAIM_TIMEOUT ahead, so concurrent runs skip it; mails are
+  sent outside any transaction and each delivery's status is saved right
+  after its send, so a crash never re-mails the parents already served.
+  Deliveries a dead run claimed become due again when the claim expires.
+- a failed delivery is retried with an increasing delay, up to
+  BULLETIN_MAIL_MAX_ATTEMPTS; its status and last error stay on the row
+"""
+import logging
+import smtplib
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.accounts.models import ParentStudent
+from .archive import read_archived_document
+from .layouts import LABELS
+from .models import BulletinDelivery, DocumentJob
+from .pdf_generator import BulletinPDFGenerator
+from .storage import document_storage
+
+logger = logging.getLogger(__name__)
+
+RETRY_DELAY = timedelta(minutes=5)
+CLAIM_TIMEOUT = timedelta(minutes=30)
+
+MAIL_TEXTS = {
+    'fr': {
+        'subject': "Bulletin scolaire de {student} - {trimester} {academic_year}",
+        'body': (
+            "Bonjour {parent},\n\n"
+            "Veuillez trouver ci-joint le bulletin scolaire de {student} "
+            "pour le {trimester} de l'année scolaire {academic_year}.\n\n"
+            "Cordialement,\nL'administration"
+        ),
+    },
+    'ar': {
+        'subject': "كشف أعداد {student} - {trimester} {academic_year}",
+        'body': (
+            "السلام عليكم {parent}،\n\n"
+            "تجدون مصاحبا كشف أعداد {student} "
+            "({trimester}) للسنة الدراسية {academic_year}.\n\n"
+            "مع التحية،\nالإدارة"
+        ),
+    },
+}
+
+
+class RateLimiter:
+    """
+    Paces calls to at most `rate` per second (no limit when rate is 0)
+    """
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_at = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if now < self.next_at:
+            time.sleep(self.next_at - now)
+        self.next_at = max(now, self.next_at) + self.interval
+
+
+def delivery_language(parent_language, bulletin_language, language=None):
+    """
+    Explicit language, else the parent's preferred one, else the bulletin's
+    """
+    for candidate in (language, parent_language, bulletin_language):
+        if candidate in LABELS:
+            return candidate
+    return 'fr'
+
+
+def queue_deliveries(bulletins, language=None):
+    """
+    Record a pending delivery for every parent of the bulletins. Parents
+    already mailed are skipped, failed deliveries are queued again.
+    Returns the number of deliveries queued.
+    """
+    bulletins = list(bulletins.only('id', 'student_id', 'language'))
+    bulletin_ids = [bulletin.id for bulletin in bulletins]
+
+    parents = defaultdict(list)
+    for student_id, parent_id, email, preferred_language in ParentStudent.objects.filter(
+        student_id__in={bulletin.student_id for bulletin in bulletins}
+    ).exclude(parent__user__email='').values_list(
+        'student_id', 'parent_id', 'parent__user__email', 'parent__user__preferred_language'
+    ):
+        parents[student_id].append((parent_id, email, preferred_language))
+
+    existing = set(BulletinDelivery.objects.filter(bulletin_id__in=bulletin_ids).values_list('bulletin_id', 'parent_id'))
+    deliveries = [
+        BulletinDelivery(
+            bulletin=bulletin, parent_id=parent_id, email=email,
+            language=delivery_language(preferred_language, bulletin.language, language)
+        )
+        for bulletin in bulletins
+        for parent_id, email, preferred_language in parents[bulletin.student_id]
+        if (bulletin.id, parent_id) not in existing
+    ]
+
+    with transaction.atomic():
+        BulletinDelivery.objects.bulk_create(deliveries, batch_size=1000, ignore_conflicts=True)
+        requeued = BulletinDelivery.objects.filter(bulletin_id__in=bulletin_ids, status='failed').update(
+            status='pending', attempts=0, next_attempt_at=None
+        )
+    return len(deliveries) + requeued
+
+
+def due_deliveries():
+    return BulletinDelivery.objects.filter(
+        Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=timezone.now()),
+        status='pending'
+    )
+
+
+def stored_bulletin_pdfs(deliveries):
+    """
+    Up-to-date stored renderings of the deliveries' bulletins: {(bulletin id, language): bytes}
+    """
+    keys = {(delivery.bulletin_id, delivery.language) for delivery in deliveries}
+    updated = {delivery.bulletin_id: delivery.bulletin.updated_at for delivery in deliveries}
+    jobs = DocumentJob.objects.filter(
+        bulletin_id__in=updated, status='done'
+    ).select_related('document__archive').order_by('bulletin_id', 'language', '-finished_at')
+
+    pdfs = {}
+    for job in jobs:
+        key = (job.bulletin_id, job.language)
+        if key not in keys or key in pdfs or job.finished_at < updated[job.bulletin_id]:
+            continue
+        document = job.document
+        try:
+            if document.archive_id:
+                pdfs[key] = read_archived_document(document)
+            else:
+                with document_storage().open(document.file_path, 'rb') as f:
+                    pdfs[key] = f.read()
+        except OSError:
+            continue
+    return pdfs
+
+
+def delivery_message(delivery, content, connection):
+    bulletin = delivery.bulletin
+    student = bulletin.student
+    texts = MAIL_TEXTS.get(delivery.language, MAIL_TEXTS['fr'])
+    values = {
+        'student': student.user.get_full_name(),
+        'parent': delivery.parent.user.get_full_name(),
+        'trimester': bulletin.trimester,
+        'academic_year': bulletin.academic_year,
+    }
+    message = EmailMessage(
+        subject=texts['subject'].format(**values),
+        body=texts['body'].format(**values),
+        to=[delivery.email],
+        connection=connection
+    )
+    filename = f"bulletin_{student.student_id}_{bulletin.academic_year}_{bulletin.trimester}_{delivery.language}.pdf"
+    message.attach(filename, content, 'application/pdf')
+    return message
+
+
+def record_failure(delivery, error, max_attempts):
+    delivery.attempts += 1
+    delivery.error = str(error)
+    if delivery.attempts >= max_attempts:
+        delivery.status = 'failed'
+        delivery.next_attempt_at = None
+    else:
+        delivery.next_attempt_at = timezone.now() + RETRY_DELAY * 2 ** (delivery.attempts - 1)
+
+
+def reconnect(connection):
+    """
+    Reopen a dropped SMTP connection. If that fails too, the backend opens
+    one per message until the next run.
+    """
+    connection.close()
+    try:
+        connection.open()
+    except (OSError, smtplib.SMTPException) as e:
+        logger.warning("Could not reopen the SMTP connection: %s", e)
+
+
+def claim_deliveries(batch_size):
+    """
+    Take the next batch of due deliveries for this run
+    """
+    with transaction.atomic():
+        batch = list(
+            due_deliveries()
+            .select_related('bulletin__student__user', 'parent__user')
+            .select_for_update(skip_locked=True, of=('self',))
+            .order_by('id')[:batch_size]
+        )
+        if batch:
+            BulletinDelivery.objects.filter(id__in=[delivery.id for delivery in batch]).update(
+                next_attempt_at=timezone.now() + CLAIM_TIMEOUT
+            )
+    return batch
+
+
+def send_deliveries(batch_size=None, rate=None, max_attempts=None, connection=None):
+    """
+    Send every due delivery. Returns counts: {'sent', 'failed', 'retrying'}.
+    """
+    batch_size = batch_size or settings.BULLETIN_MAIL_BATCH_SIZE
+    rate = settings.BULLETIN_MAIL_RATE if rate is None else rate
+    max_attempts = max_attempts or settings.BULLETIN_MAIL_MAX_ATTEMPTS
+    connection = connection or get_connection()
+    limiter = RateLimiter(rate)
+    counts = {'sent': 0, 'failed': 0, 'retrying': 0}
+
+    connection.open()
+    try:
+        while True:
+            batch = claim_deliveries(batch_size)
+            if not batch:
+                break
+
+            pdfs = stored_bulletin_pdfs(batch)
+            for delivery in batch:
+                key = (delivery.bulletin_id, delivery.language)
+                try:
+                    if key not in pdfs:
+                        pdfs[key] = BulletinPDFGenerator(language=delivery.language).build_bulletin(
+                            delivery.bulletin, delivery.language
+                        )
+                    limiter.wait()
+                    delivery_message(delivery, pdfs[key], connection).send()
+                except Exception as e:
+                    logger.warning("Bulletin delivery %s to %s failed: %s", delivery.id, delivery.email, e)
+                    record_failure(delivery, e, max_attempts)
+                    counts['failed' if delivery.status == 'failed' else 'retrying'] += 1
+                    if isinstance(e, smtplib.SMTPServerDisconnected):
+                        reconnect(connection)
+                else:
+                    delivery.status = 'sent'
+                    delivery.attempts += 1
+                    delivery.error = ''
+                    delivery.next_attempt_at = None
+                    delivery.sent_at = timezone.now()
+                    counts['sent'] += 1
+                delivery.save(update_fields=['status', 'attempts', 'error', 'next_attempt_at', 'sent_at'])
+    finally:
+        connection.close()
+
+    return counts
+
+
+def next_retry_delay():
+    """
+    Seconds until the earliest pending retry, or None when no retry is pending
+    """
+    next_attempt_at = BulletinDelivery.objects.filter(
+        status='pending', next_attempt_at__isnull=False
+    ).order_by('next_attempt_at').values_list('next_attempt_at', flat=True).first()
+    if next_attempt_at is None:
+        return None
+    return max(0, (next_attempt_at - timezone.now()).total_seconds())
@@ -0,0 +1,83 @@
+"""
+Fonts prepared for embedding in generated PDFs.
+
+ReportLab embeds a subset of the TrueType font in every PDF, containing
+only the glyphs a document uses, but it copies those glyphs and the font
+tables as they are in the source file. DejaVuSans carries hinting
+instructions (cvt, fpgm, prep and per-glyph bytecode, useless in a PDF
+viewer) and a 10 KB license text in its name table, which made up most
+of the bytes of every bulletin.
+
+embedding_font() strips them once, keeping every glyph and metric, and
+caches the result on disk keyed by the source file, so each process only
+pays for reading it.
+"""
+import logging
+import os
+import tempfile
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Name records kept: copyright, family, style, unique id, full name, version, PostScript name
+KEPT_NAME_IDS = [0, 1, 2, 3, 4, 5, 6]
+# OpenType layout tables are not used by ReportLab (Arabic is shaped beforehand)
+DROPPED_TABLES = ['FFTM', 'GDEF', 'GPOS', 'GSUB', 'MATH', 'kern']
+
+
+def font_cache_dir():
+    return settings.DOCUMENT_FONT_CACHE_DIR or os.path.join(tempfile.gettempdir(), 'document-fonts')
+
+
+def optimize_font(source, target):
+    """
+    Write `source` to `target` without hinting, layout tables and long name records
+    """
+    from fontTools import subset
+    from fontTools.ttLib import TTFont as FontToolsFont
+
+    options = subset.Options()
+    options.hinting = False
+    options.layout_features = []
+    options.name_IDs = KEPT_NAME_IDS
+    options.notdef_outline = True
+    options.glyph_names = False
+    options.drop_tables += DROPPED_TABLES
+
+    font = FontToolsFont(source)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(glyphs=font.getGlyphOrder())
+    # fontTools logs every pruned table at INFO level
+    subset_logger = logging.getLogger('fontTools.subset')
+    level = subset_logger.level
+    subset_logger.setLevel(logging.WARNING)
+    try:
+        subsetter.subset(font)
+    finally:
+        subset_logger.setLevel(level)
+
+    # Write then rename: concurrent workers never read a partial file
+    fd, partial = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        font.save(f)
+    os.replace(partial, target)
+
+
+def embedding_font(path):
+    """
+    Path of the font ReportLab should embed for `path`: the optimized copy,
+    or the source itself when fontTools is unavailable or fails
+    """
+    stat = os.stat(path)
+    name = os.path.splitext(os.path.basename(path))[0]
+    target = os.path.join(font_cache_dir(), f"{name}-{stat.st_size:x}-{stat.st_mtime_ns:x}.ttf")
+    if os.path.exists(target):
+        return target
+    try:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        optimize_font(path, target)
+    except Exception as e:
+        logger.warning("Embedding %s unoptimized: %s", path, e)
+        return path
+    return target
@@ -0,0 +1,156 @@
+"""
+Institution profile cache for document rendering.
+
+Every document carries the institution header, so the institution row and
+its logo - decoded and scaled down to the size it is drawn at - are loaded
+once per process and kept in memory. After warmup, rendering reads neither
+the database nor the logo file for institution data.
+
+Saving or deleting an Institution bumps a version stored in the Django
+cache; each process compares it with the version of its own profile and
+reloads on mismatch. The cache is Redis (CACHE_URL, else the Celery
+broker), shared by every web and worker process, so this invalidates the
+profile everywhere, not only in the process that saved.
+"""
+import threading
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from PIL import Image as PILImage
+from reportlab.lib.units import inch
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import Flowable
+
+from apps.accounts.models import Institution
+
+PROFILE_VERSION_KEY = 'documents:institution-profile-version'
+LOGO_HEIGHT = 0.8 * inch
+LOGO_MAX_WIDTH = 2.5 * inch
+# Resolution the logo is scaled to: enough for print, far below typical uploads
+LOGO_DPI = 200
+
+_lock = threading.Lock()
+_profile = None
+
+
+class InstitutionLogo:
+    """
+    Logo decoded and scaled once. Its pixel data is kept, so documents only
+    compress it into their image XObject.
+    """
+
+    def __init__(self, image):
+        self.reader = ImageReader(image)
+        self.reader.getRGBData()
+        pixel_width, pixel_height = image.size
+        self.height = LOGO_HEIGHT
+        self.width = min(LOGO_MAX_WIDTH, LOGO_HEIGHT * pixel_width / pixel_height)
+
+    def flowable(self):
+        return LogoFlowable(self)
+
+
+class LogoFlowable(Flowable):
+    """
+    Logo centred above the institution header (one per document, the decoded image is shared)
+    """
+
+    def __init__(self, logo):
+        super().__init__()
+        self.logo = logo
+        self.spaceAfter = 6
+
+    def wrap(self, availWidth, availHeight):
+        self.avail_width = availWidth
+        return availWidth, self.logo.height
+
+    def draw(self):
+        logo = self.logo
+        self.canv.drawImage(logo.reader, (self.avail_width - logo.width) / 2, 0, logo.width, logo.height, mask='auto')
+
+
+def decode_logo(logo):
+    """
+    Logo of an ImageField decoded and scaled to its drawn size, or None when unreadable
+    """
+    try:
+        with logo.open('rb') as f:
+            image = PILImage.open(f)
+            image.load()
+    except (OSError, ValueError):
+        return None
+
+    image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+    max_height = int(LOGO_HEIGHT / inch * LOGO_DPI)
+    max_width = int(LOGO_MAX_WIDTH / inch * LOGO_DPI)
+    image.thumbnail((max_width, max_height), PILImage.LANCZOS)
+    return InstitutionLogo(image)
+
+
+class InstitutionProfile:
+    """
+    The institution row and its decoded logo, as used by the PDF generators
+    """
+
+    def __init__(self, institution, version=None):
+        self.institution = institution
+        self.version = version
+        self.logo = decode_logo(institution.logo) if institution is not None and institution.logo else None
+
+    def logo_for(self, institution):
+        """
+        Cached logo when the institution is the profile's one, as saved
+        """
+        if self.institution is None or institution is None:
+            return None
+        if institution.pk != self.institution.pk or institution.logo.name != self.institution.logo.name:
+            return None
+        return self.logo
+
+
+def institution_profile():
+    """
+    Cached profile of the institution (single-institution deployment)
+    """
+    global _profile
+    version = cache.get(PROFILE_VERSION_KEY)
+    profile = _profile
+    if profile is not None and profile.version == version:
+        return profile
+    with _lock:
+        if _profile is None or _profile.version != version:
+            _profile = InstitutionProfile(Institution.objects.first(), version)
+        return _profile
+
+
+def current_institution():
+    return institution_profile().institution
+
+
+def institution_logo(institution):
+    """
+    Decoded logo of an institution: from the profile when it is the cached
+    institution, decoded on the spot otherwise (e.g. unsaved instances)
+    """
+    if institution is None or not institution.logo:
+        return None
+    logo = institution_profile().logo_for(institution)
+    return logo if logo is not None else decode_logo(institution.logo)
+
+
+def invalidate_institution_profile():
+    global _profile
+    cache.set(PROFILE_VERSION_KEY, uuid.uuid4().hex, None)
+    with _lock:
+        _profile = None
+
+
+@receiver(post_save, sender=Institution)
+@receiver(post_delete, sender=Institution)
+def institution_changed(sender, **kwargs):
+    # Again on commit: other processes may have reloaded the old row meanwhile
+    invalidate_institution_profile()
+    transaction.on_commit(invalidate_institution_profile)
@@ -0,0 +1,322 @@
+"""
+Precompiled PDF layouts.
+
+Everything in a document that does not depend on the student - fonts,
+paragraph styles, table styles, column widths and translated labels -
+is compiled once per (language, LAYOUT_VERSION) and shared by every
+document rendered in the process. Generators only fill in the
+student-specific cells. Bump LAYOUT_VERSION whenever the layout changes.
+"""
+import os
+from functools import lru_cache
+
+from django.conf import settings
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import Paragraph, TableStyle
+
+from .arabic import shape_label, shape_markup, shape_value
+from .fonts import embedding_font
+
+LAYOUT_VERSION = 6
+
+FONT_FILES = {
+    'DejaVuSans': 'DejaVuSans.ttf',
+    'NotoSansArabic': 'NotoSansArabic.ttf',
+}
+
+LANGUAGE_FONTS = {
+    'fr': 'DejaVuSans',
+    'ar': 'NotoSansArabic',
+}
+
+# Used when a language's font is not installed; DejaVuSans covers Arabic too
+FALLBACK_FONT = 'DejaVuSans'
+
+RTL_LANGUAGES = {'ar'}
+
+LABELS = {
+    'fr': {
+        'address': "Adresse",
+        'phone': "Téléphone",
+        'email': "Email",
+        'student_title': "INFORMATIONS ÉLÈVE",
+        'student_rows': ["Nom complet:", "Identifiant élève:", "Classe:", "Année scolaire:", "Trimestre:"],
+        'academic_title': "RÉSULTATS ACADÉMIQUES",
+        'academic_rows': ["Moyenne générale:", "Rang dans la classe:", "Rang dans le niveau:"],
+        'grades_title': "DÉTAIL DES NOTES",
+        'grades_headers': ["Matière", "Coefficient", "Moyenne", "Enseignant", "Remarques"],
+        'attendance_title': "ASSIDUITÉ",
+        'attendance_rows': ["Total des jours:", "Jours présents:", "Jours absents:", "Taux d'assiduité:"],
+        'notes_title': "OBSERVATIONS",
+        'teacher_notes': "Remarques des enseignants:",
+        'principal_notes': "Remarques du directeur:",
+        'no_remark': "Aucune remarque",
+        'not_available': "N/A",
+        'presence_title': "ATTESTATION DE PRÉSENCE",
+        'inscription_title': "ATTESTATION D'INSCRIPTION",
+        'receipt_title': "REÇU DE PAIEMENT",
+        'receipt_rows': [
+            "N° de reçu:", "Date de paiement:", "Élève:", "Facture:",
+            "Objet:", "Mode de paiement:", "Référence:", "Montant payé:",
+        ],
+        'payment_methods': {
+            'cash': "Espèces",
+            'bank_transfer': "Virement bancaire",
+            'cheque': "Chèque",
+            'card': "Carte bancaire",
+        },
+        'currency': "TND",
+        'report_title': "RAPPORT FINANCIER",
+        'report_rows': ["Rapport:", "Période:", "Total des recettes:", "Total des dépenses:", "Résultat net:"],
+        'income_title': "RECETTES PAR MODE DE PAIEMENT",
+        'expenses_title': "DÉPENSES PAR CATÉGORIE",
+        'expense_categories': {
+            'utilities': "Charges courantes",
+            'maintenance': "Maintenance",
+            'supplies': "Fournitures",
+            'equipment': "Équipement",
+            'transportation': "Transport",
+            'other': "Autres",
+            'salaries': "Salaires des enseignants",
+        },
+    },
+    'ar': {
+        'address': "العنوان",
+        'phone': "الهاتف",
+        'email': "البريد الإلكتروني",
+        'student_title': "معلومات التلميذ",
+        'student_rows': ["الاسم الكامل:", "رقم التلميذ:", "الفصل:", "السنة الدراسية:", "الثلث:"],
+        'academic_title': "النتائج الأكاديمية",
+        'academic_rows': ["المعدل العام:", "الترتيب في الفصل:", "الترتيب في المستوى:"],
+        'grades_title': "تفاصيل الدرجات",
+        'grades_headers': ["المادة", "المعامل", "المعدل", "المعلم", "ملاحظات"],
+        'attendance_title': "الحضور",
+        'attendance_rows': ["إجمالي الأيام:", "أيام الحضور:", "أيام الغياب:", "معدل الحضور:"],
+        'notes_title': "الملاحظات",
+        'teacher_notes': "ملاحظات المعلمين:",
+        'principal_notes': "ملاحظات المدير:",
+        'no_remark': "لا توجد ملاحظات",
+        'not_available': "غير متوفر",
+        'presence_title': "شهادة حضور",
+        'inscription_title': "شهادة التسجيل",
+        'receipt_title': "وصل خلاص",
+        'receipt_rows': [
+            "رقم الوصل:", "تاريخ الدفع:", "التلميذ:", "الفاتورة:",
+            "الموضوع:", "طريقة الدفع:", "المرجع:", "المبلغ المدفوع:",
+        ],
+        'payment_methods': {
+            'cash': "نقدا",
+            'bank_transfer': "تحويل بنكي",
+            'cheque': "شيك",
+            'card': "بطاقة بنكية",
+        },
+        'currency': "د.ت",
+        'report_title': "التقرير المالي",
+        'report_rows': ["التقرير:", "الفترة:", "مجموع المداخيل:", "مجموع المصاريف:", "النتيجة الصافية:"],
+        'income_title': "المداخيل حسب طريقة الدفع",
+        'expenses_title': "المصاريف حسب الصنف",
+        'expense_categories': {
+            'utilities': "المصاريف الجارية",
+            'maintenance': "الصيانة",
+            'supplies': "اللوازم",
+            'equipment': "التجهيزات",
+            'transportation': "النقل",
+            'other': "أخرى",
+            'salaries': "أجور المدرسين",
+        },
+    },
+}
+
+INFO_COL_WIDTHS = [2*inch, 3*inch]
+GRADES_COL_WIDTHS = [1.5*inch, 0.8*inch, 0.8*inch, 1.2*inch, 1.5*inch]
+
+# SimpleDocTemplate frame width: A4 minus 1 inch margins and 6pt frame padding
+TEXT_WIDTH = A4[0] - 2*inch - 12
+
+
+@lru_cache(maxsize=None)
+def register_fonts():
+    """
+    Register the TTF fonts once per process. Parsing a TTF is by far the
+    most expensive step of a render, so it must never happen per document.
+    """
+    font_path = os.path.join(settings.BASE_DIR, 'static', 'fonts')
+    registered = set()
+    for font_name, file_name in FONT_FILES.items():
+        path = os.path.join(font_path, file_name)
+        if not os.path.exists(path):
+            continue
+        try:
+            pdfmetrics.registerFont(TTFont(font_name, embedding_font(path)))
+            registered.add(font_name)
+        except Exception as e:
+            print(f"Font setup error: {e}")
+    return frozenset(registered)
+
+
+def _table_style(font_name, align, font_size):
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), align),
+        ('FONTNAME', (0, 0), (-1, -1), font_name),
+        ('FONTSIZE', (0, 0), (-1, -1), font_size),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ])
+
+
+class Layout:
+    """
+    Static, student-independent parts of the documents for one language
+    """
+
+    def __init__(self, language):
+        self.language = language
+        self.rtl = language in RTL_LANGUAGES
+        # Unshaped labels, for values that go through text() like any data cell
+        self.raw_labels = LABELS.get(language, LABELS['fr'])
+        self.labels = self._compile_labels(self.raw_labels)
+
+        fonts = register_fonts()
+        font_name = LANGUAGE_FONTS.get(language, FALLBACK_FONT)
+        if font_name not in fonts:
+            font_name = FALLBACK_FONT if FALLBACK_FONT in fonts else 'Helvetica'
+        self.font_name = font_name
+
+        self.styles = self._build_styles()
+        self.info_table_style = _table_style(self.font_name, 'RIGHT' if self.rtl else 'LEFT', 10)
+        self.grades_table_style = _table_style(self.font_name, 'CENTER', 9)
+        self.info_col_widths = self.row(INFO_COL_WIDTHS)
+        self.grades_col_widths = self.row(GRADES_COL_WIDTHS)
+
+    def _compile_labels(self, labels):
+        """
+        Right-to-left labels are reshaped once here, not per document
+        """
+        if not self.rtl:
+            return labels
+        compiled = {}
+        for key, value in labels.items():
+            if isinstance(value, list):
+                compiled[key] = [shape_label(item) for item in value]
+            elif isinstance(value, dict):
+                compiled[key] = {name: shape_label(item) for name, item in value.items()}
+            else:
+                compiled[key] = shape_label(value)
+        return compiled
+
+    def _build_styles(self):
+        styles = getSampleStyleSheet()
+
+        # Title style
+        styles.add(ParagraphStyle(
+            name='CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=18,
+            spaceAfter=30,
+            alignment=TA_CENTER,
+            fontName=self.font_name
+        ))
+
+        # Subtitle style
+        styles.add(ParagraphStyle(
+            name='CustomSubtitle',
+            parent=styles['Heading2'],
+            fontSize=14,
+            spaceAfter=20,
+            alignment=TA_CENTER,
+            fontName=self.font_name
+        ))
+
+        # Normal text style
+        styles.add(ParagraphStyle(
+            name='CustomNormal',
+            parent=styles['Normal'],
+            fontSize=10,
+            fontName=self.font_name,
+            alignment=TA_RIGHT if self.rtl else TA_LEFT
+        ))
+
+        # Table header style
+        styles.add(ParagraphStyle(
+            name='TableHeader',
+            parent=styles['Normal'],
+            fontSize=10,
+            fontName=self.font_name,
+            alignment=TA_CENTER
+        ))
+
+        # Page footer style
+        styles.add(ParagraphStyle(
+            name='PageFooter',
+            parent=styles['Normal'],
+            fontSize=8,
+            fontName=self.font_name,
+            textColor=colors.grey,
+            alignment=TA_CENTER
+        ))
+        return styles
+
+    def text(self, value):
+        """
+        Data string ready to be drawn (shaped and reordered for right-to-left)
+        """
+        return shape_value(value) if self.rtl else value
+
+    def row(self, cells):
+        """
+        Table row or column widths in reading order, mirrored for right-to-left
+        """
+        return list(reversed(cells)) if self.rtl else list(cells)
+
+    def paragraph(self, markup, style_name='CustomNormal'):
+        """
+        Paragraph in the layout's style, with right-to-left markup shaped and wrapped
+        """
+        style = self.styles[style_name]
+        if self.rtl:
+            markup = shape_markup(markup, style.fontName, style.fontSize, TEXT_WIDTH)
+        return Paragraph(markup, style)
+
+    def info_table_data(self, rows_key, values):
+        """
+        Two-column info table: empty header row, then the translated labels
+        next to the document's values
+        """
+        return [['', '']] + [
+            self.row([label, self.text(value)]) for label, value in zip(self.labels[rows_key], values)
+        ]
+
+    def institution_details(self, institution, include_email=True):
+        return institution_details(
+            self.language, institution.address, institution.phone,
+            institution.email if include_email else None
+        )
+
+
+@lru_cache(maxsize=64)
+def institution_details(language, address, phone, email):
+    """
+    Institution header markup, cached on its content
+    """
+    labels = LABELS.get(language, LABELS['fr'])
+    details = f"{labels['address']}: {address}<br/>{labels['phone']}: {phone}"
+    if email is not None:
+        details += f"<br/>{labels['email']}: {email}"
+    return details
+
+
+@lru_cache(maxsize=None)
+def get_layout(language, version=LAYOUT_VERSION):
+    """
+    Compiled layout for a language, built on first use
+    """
+    return Layout(language)
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.academics.models import AcademicYear
+from apps.documents.archive import archive_academic_year, archive_summary
+
+
+class Command(BaseCommand):
+    help = "Pack a closed academic year's generated documents into a compressed archive file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('academic_year', help='Academic year name, e.g. 2023-2024')
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many documents would be archived'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Archive even if the academic year is not closed yet'
+        )
+
+    def handle(self, *args, **options):
+        academic_year = options['academic_year']
+
+        year = AcademicYear.objects.filter(name=academic_year).first()
+        if not options['force']:
+            if year is None:
+                raise CommandError(f'Unknown academic year: {academic_year}')
+            if year.is_current or year.end_date >= timezone.now().date():
+                raise CommandError(f'Academic year {academic_year} is not closed yet (use --force to override)')
+
+        summary = archive_summary(academic_year)
+        self.stdout.write(f"{summary['count']} documents ({summary['size'] or 0} bytes) to archive for {academic_year}")
+        if options['dry_run'] or not summary['count']:
+            return
+
+        archive = archive_academic_year(academic_year)
+        if archive is None:
+            self.stdout.write(self.style.WARNING('No document files found in storage'))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {archive.document_count} documents into {archive.file_path}: "
+            f"{archive.original_size} -> {archive.packed_size} bytes"
+        ))
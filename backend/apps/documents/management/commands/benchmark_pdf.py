@@ -0,0 +1,140 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.documents.benchmarks import (
+    benchmark_bulletins, benchmark_class_pack, compare_engines, run_suite, check_regressions,
+    load_baseline, save_baseline, BASELINE_PATH, REGRESSION_TOLERANCES
+)
+from apps.documents.renderers import RENDERERS
+
+
+class Command(BaseCommand):
+    help = 'Benchmark bulletin PDF generation (documents per second)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--count',
+            type=int,
+            default=100,
+            help='Number of bulletins to render per language (default: 100)'
+        )
+        parser.add_argument(
+            '--language',
+            choices=['fr', 'ar', 'all'],
+            default='all',
+            help='Language to benchmark (default: all)'
+        )
+        parser.add_argument(
+            '--subjects',
+            type=int,
+            default=10,
+            help='Number of subjects per bulletin (default: 10)'
+        )
+        parser.add_argument(
+            '--engine',
+            choices=list(RENDERERS),
+            help='Rendering engine (default: the one configured for bulletins)'
+        )
+        parser.add_argument(
+            '--compare-engines',
+            action='store_true',
+            help='Compare all rendering engines: pages/sec, peak memory and output size'
+        )
+        parser.add_argument(
+            '--pack',
+            action='store_true',
+            help='Render merged class packs of --count bulletins, with and without the shared header/footer forms'
+        )
+        parser.add_argument(
+            '--suite',
+            action='store_true',
+            help='Run the profiling suite (fr/ar, 5 to 30 subjects) and compare it to the stored baseline'
+        )
+        parser.add_argument(
+            '--baseline',
+            default=BASELINE_PATH,
+            help='Baseline file for --suite (default: apps/documents/testdata/benchmark_baseline.json)'
+        )
+        parser.add_argument(
+            '--update-baseline',
+            action='store_true',
+            help='Store the --suite results as the new baseline instead of comparing'
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            help='Allowed relative regression for every metric, e.g. 0.2 (default: per-metric tolerances)'
+        )
+
+    def handle(self, *args, **options):
+        languages = ['fr', 'ar'] if options['language'] == 'all' else [options['language']]
+
+        if options['suite']:
+            self.suite(options)
+            return
+
+        if options['compare_engines']:
+            self.compare(options, languages)
+            return
+
+        if options['pack']:
+            self.pack(options, languages)
+            return
+
+        for language in languages:
+            result = benchmark_bulletins(options['count'], language, options['subjects'], engine=options['engine'])
+            self.stdout.write(
+                f"{language}: {result['documents']} bulletins x {result['subjects']} subjects "
+                f"in {result['seconds']:.2f}s - {result['docs_per_sec']:.1f} docs/sec, "
+                f"{result['avg_bytes']} bytes/doc"
+            )
+
+    def compare(self, options, languages):
+        self.stdout.write(f"{'engine':<12}{'lang':<6}{'pages/sec':>11}{'docs/sec':>10}{'peak MiB':>10}{'bytes/doc':>11}")
+        for result in compare_engines(options['count'], languages, options['subjects']):
+            if not result['available']:
+                self.stdout.write(self.style.WARNING(f"{result['engine']:<12}not available in this environment"))
+                continue
+            self.stdout.write(
+                f"{result['engine']:<12}{result['language']:<6}{result['pages_per_sec']:>11.1f}"
+                f"{result['docs_per_sec']:>10.1f}{result['peak_memory'] / 2**20:>10.1f}{result['avg_bytes']:>11}"
+            )
+
+    def pack(self, options, languages):
+        for language in languages:
+            for shared_header in (False, True):
+                result = benchmark_class_pack(options['count'], language, options['subjects'], shared_header)
+                label = 'shared forms' if shared_header else 'redrawn'
+                self.stdout.write(
+                    f"{language} {label:<12}: {result['documents']} bulletins, "
+                    f"{result['pages']} pages in {result['seconds'] * 1000:.0f}ms, {result['bytes']} bytes"
+                )
+
+    def suite(self, options):
+        results = run_suite(count=options['count'], engine=options['engine'])
+
+        self.stdout.write(
+            f"{'case':<30}{'docs/sec':>10}{'p50 ms':>9}{'p95 ms':>9}{'alloc KiB':>11}{'bytes/doc':>11}{'RSS MiB':>9}"
+        )
+        for key, metrics in results.items():
+            self.stdout.write(
+                f"{key:<30}{metrics['docs_per_sec']:>10.1f}{metrics['p50_ms']:>9.1f}{metrics['p95_ms']:>9.1f}"
+                f"{metrics['alloc_kib_per_doc']:>11.1f}{metrics['avg_bytes']:>11}{metrics['peak_rss_mib']:>9.1f}"
+            )
+
+        if options['update_baseline']:
+            save_baseline(results, options['baseline'])
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['baseline']}"))
+            return
+
+        baseline = load_baseline(options['baseline'])
+        if not baseline:
+            self.stdout.write(self.style.WARNING('No baseline stored yet, run with --update-baseline'))
+            return
+
+        tolerances = REGRESSION_TOLERANCES
+        if options['tolerance'] is not None:
+            tolerances = {metric: options['tolerance'] for metric in REGRESSION_TOLERANCES}
+        regressions = check_regressions(results, baseline, tolerances)
+        if regressions:
+            raise CommandError('Performance regressed past the baseline:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('No regression against the baseline'))
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.documents.distribution import queue_deliveries, send_deliveries
+from apps.documents.layouts import LABELS
+from apps.documents.models import Bulletin
+
+
+class Command(BaseCommand):
+    help = "Mail a trimester's bulletins to the students' parents"
+
+    def add_arguments(self, parser):
+        parser.add_argument('academic_year', help='Academic year, e.g. 2024-2025')
+        parser.add_argument('trimester', help='Trimester, as stored on the bulletins')
+        parser.add_argument('--class-name', help='Only the bulletins of this class')
+        parser.add_argument(
+            '--language',
+            choices=list(LABELS),
+            help="Bulletin language (default: each parent's preferred language)"
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            help='Messages per second (default: settings.BULLETIN_MAIL_RATE)'
+        )
+        parser.add_argument(
+            '--queue-only',
+            action='store_true',
+            help='Record the deliveries without sending them'
+        )
+
+    def handle(self, *args, **options):
+        bulletins = Bulletin.objects.filter(academic_year=options['academic_year'], trimester=options['trimester'])
+        if options['class_name']:
+            bulletins = bulletins.filter(class_name=options['class_name'])
+
+        queued = queue_deliveries(bulletins, options['language'])
+        self.stdout.write(f"{queued} deliveries queued")
+        if options['queue_only']:
+            return
+
+        started = time.perf_counter()
+        counts = send_deliveries(rate=options['rate'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Sent {counts['sent']} mails in {time.perf_counter() - started:.2f}s, "
+            f"{counts['retrying']} to retry, {counts['failed']} failed"
+        ))
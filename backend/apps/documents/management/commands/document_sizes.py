@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Avg, Count, Max, Sum
+
+from apps.documents.benchmarks import sample_sizes
+from apps.documents.models import Document
+
+
+class Command(BaseCommand):
+    help = 'Report generated PDF sizes per document type: stored documents and freshly rendered samples'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sample',
+            action='store_true',
+            help='Also render one synthetic document per type and language and report its size'
+        )
+        parser.add_argument(
+            '--pack-count',
+            type=int,
+            default=30,
+            help='Bulletins in the sample merged pack (default: 30)'
+        )
+
+    def handle(self, *args, **options):
+        stored = Document.objects.filter(file_size__isnull=False).values('document_type', 'language').annotate(
+            count=Count('id'), total=Sum('file_size'), average=Avg('file_size'), largest=Max('file_size')
+        ).order_by('document_type', 'language')
+
+        self.stdout.write('Stored documents')
+        self.stdout.write(f"{'type':<26}{'lang':<6}{'count':>8}{'avg bytes':>12}{'max bytes':>12}{'total MiB':>12}")
+        for row in stored:
+            self.stdout.write(
+                f"{row['document_type']:<26}{row['language']:<6}{row['count']:>8}{row['average']:>12.0f}"
+                f"{row['largest']:>12}{row['total'] / 2**20:>12.2f}"
+            )
+
+        if not options['sample']:
+            return
+
+        self.stdout.write('\nRendered samples')
+        self.stdout.write(f"{'type':<26}{'lang':<6}{'bytes':>10}{'pages':>8}")
+        for row in sample_sizes(pack_count=options['pack_count']):
+            self.stdout.write(f"{row['document_type']:<26}{row['language']:<6}{row['bytes']:>10}{row['pages']:>8g}")
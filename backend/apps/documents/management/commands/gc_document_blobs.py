@@ -0,0 +1,43 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from apps.documents.blobs import collect_garbage, orphan_files, GC_GRACE_PERIOD
+from apps.documents.storage import document_storage
+
+
+class Command(BaseCommand):
+    help = 'Delete stored document blobs that no document references any more'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report what would be deleted'
+        )
+        parser.add_argument(
+            '--grace-minutes',
+            type=int,
+            default=int(GC_GRACE_PERIOD.total_seconds() // 60),
+            help='Keep unreferenced blobs younger than this (default: 60)'
+        )
+        parser.add_argument(
+            '--orphans',
+            action='store_true',
+            help='Also delete files under blobs/ that have no database row'
+        )
+
+    def handle(self, *args, **options):
+        grace_period = timedelta(minutes=options['grace_minutes'])
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+
+        count, reclaimed = collect_garbage(grace_period, dry_run=options['dry_run'])
+        self.stdout.write(f"{verb} {count} unreferenced blobs ({reclaimed} bytes)")
+
+        if options['orphans']:
+            orphans = orphan_files(grace_period)
+            if not options['dry_run']:
+                storage = document_storage()
+                for name in orphans:
+                    storage.delete(name)
+            self.stdout.write(f"{verb} {len(orphans)} orphan files")
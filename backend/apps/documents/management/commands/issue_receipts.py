@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.documents.layouts import LABELS
+from apps.documents.receipts import issue_receipts, pending_payments, RECEIPT_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Issue receipt PDFs for all completed payments that have none yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--language',
+            choices=list(LABELS),
+            help="Receipt language (default: each student's preferred language)"
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Rendering processes (default: settings.RECEIPT_RENDER_WORKERS)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=RECEIPT_BATCH_SIZE,
+            help=f'Payments issued per transaction (default: {RECEIPT_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many receipts would be issued'
+        )
+
+    def handle(self, *args, **options):
+        pending = pending_payments().count()
+        self.stdout.write(f"{pending} completed payments without a receipt")
+        if options['dry_run'] or not pending:
+            return
+
+        started = time.perf_counter()
+        issued = issue_receipts(
+            language=options['language'],
+            workers=options['workers'],
+            batch_size=options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Issued {issued} receipts in {time.perf_counter() - started:.2f}s"
+        ))
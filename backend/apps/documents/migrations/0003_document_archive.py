@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0002_documentjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('academic_year', models.CharField(max_length=20, verbose_name='Academic Year')),
+                ('file_path', models.CharField(max_length=500, verbose_name='File Path')),
+                ('document_count', models.PositiveIntegerField(default=0, verbose_name='Document Count')),
+                ('original_size', models.PositiveBigIntegerField(default=0, verbose_name='Original Size')),
+                ('packed_size', models.PositiveBigIntegerField(default=0, verbose_name='Packed Size')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+            ],
+            options={
+                'verbose_name': 'Document Archive',
+                'verbose_name_plural': 'Document Archives',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='archive_length',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Archive Length'),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='archive_offset',
+            field=models.PositiveBigIntegerField(blank=True, null=True, verbose_name='Archive Offset'),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='archive',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='documents', to='documents.documentarchive'),
+        ),
+    ]
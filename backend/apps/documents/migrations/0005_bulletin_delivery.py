@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('documents', '0004_document_blob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BulletinDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=254, verbose_name='Email')),
+                ('language', models.CharField(choices=[('fr', 'French'), ('ar', 'Arabic')], default='fr', max_length=2, verbose_name='Language')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=10, verbose_name='Status')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Attempts')),
+                ('error', models.TextField(blank=True, verbose_name='Error')),
+                ('next_attempt_at', models.DateTimeField(blank=True, null=True, verbose_name='Next attempt at')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Sent at')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+                ('bulletin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='documents.bulletin')),
+                ('parent', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bulletin_deliveries', to='accounts.parent')),
+            ],
+            options={
+                'verbose_name': 'Bulletin Delivery',
+                'verbose_name_plural': 'Bulletin Deliveries',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='documents_b_status_2bf9b2_idx')],
+                'unique_together': {('bulletin', 'parent')},
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0005_bulletin_delivery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentjob',
+            name='file_path',
+            field=models.CharField(blank=True, max_length=500, verbose_name='File Path'),
+        ),
+        migrations.AddField(
+            model_name='documentjob',
+            name='parameters',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Parameters'),
+        ),
+        migrations.AlterField(
+            model_name='documentjob',
+            name='document',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='documents.document'),
+        ),
+        migrations.AlterField(
+            model_name='documentjob',
+            name='job_type',
+            field=models.CharField(choices=[('bulletin', 'Bulletin Scolaire'), ('attestation_presence', 'Attestation de Présence'), ('attestation_inscription', "Attestation d'Inscription"), ('bulletin_pack', 'Bulletins de classe')], max_length=30, verbose_name='Job Type'),
+        ),
+    ]
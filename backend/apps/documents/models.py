@@ -1,6 +1,45 @@
 from django.db import models
 from django.utils.translation import gettext_lazy as _
-from apps.accounts.models import Student, Institution
+from apps.accounts.models import Student, Institution, User, Parent
+
+
+class DocumentArchive(models.Model):
+    """
+    Compressed pack of a closed academic year's generated documents
+    """
+    academic_year = models.CharField(_('Academic Year'), max_length=20)
+    file_path = models.CharField(_('File Path'), max_length=500)
+    document_count = models.PositiveIntegerField(_('Document Count'), default=0)
+    original_size = models.PositiveBigIntegerField(_('Original Size'), default=0)
+    packed_size = models.PositiveBigIntegerField(_('Packed Size'), default=0)
+    created_at = models.DateTimeField(_('Created at'), auto_now_add=True)
+    
+    class Meta:
+        verbose_name = _('Document Archive')
+        verbose_name_plural = _('Document Archives')
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.academic_year} ({self.document_count} documents)"
+
+
+class DocumentBlob(models.Model):
+    """
+    Generated file stored once under its content hash and shared by every
+    document that rendered to the same bytes
+    """
+    sha256 = models.CharField(_('SHA-256'), max_length=64, unique=True)
+    file_path = models.CharField(_('File Path'), max_length=500)
+    size = models.PositiveIntegerField(_('Size'))
+    created_at = models.DateTimeField(_('Created at'), auto_now_add=True)
+    
+    class Meta:
+        verbose_name = _('Document Blob')
+        verbose_name_plural = _('Document Blobs')
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.size} bytes)"
 
 
 class Document(models.Model):
@@ -30,6 +69,15 @@ class Document(models.Model):
     is_archived = models.BooleanField(_('Archived'), default=False)
     archived_at = models.DateTimeField(_('Archived at'), null=True, blank=True)
     
+    # Location of the file inside its yearly archive pack, once archived
+    archive = models.ForeignKey(DocumentArchive, on_delete=models.PROTECT, null=True, blank=True, related_name='documents')
+    archive_offset = models.PositiveBigIntegerField(_('Archive Offset'), null=True, blank=True)
+    archive_length = models.PositiveIntegerField(_('Archive Length'), null=True, blank=True)
+    
+    # Content-addressed file and the fingerprint of the data it was rendered from
+    blob = models.ForeignKey(DocumentBlob, on_delete=models.PROTECT, null=True, blank=True, related_name='documents')
+    render_key = models.CharField(_('Render Key'), max_length=64, blank=True, db_index=True)
+    
     class Meta:
         verbose_name = _('Document')
         verbose_name_plural = _('Documents')
@@ -138,4 +186,87 @@ class Attestation(models.Model):
         ordering = ['-created_at']
     
     def __str__(self):
-        return f"{self.get_attestation_type_display()} - {self.student.user.get_full_name()}"
\ No newline at end of file
+        return f"{self.get_attestation_type_display()} - {self.student.user.get_full_name()}"
+
+
+class DocumentJob(models.Model):
+    """
+    Background document generation job
+    """
+    JOB_TYPE_CHOICES = [
+        ('bulletin', _('Bulletin Scolaire')),
+        ('attestation_presence', _('Attestation de Présence')),
+        ('attestation_inscription', _('Attestation d\'Inscription')),
+        ('bulletin_pack', _('Bulletins de classe')),
+    ]
+    
+    STATUS_CHOICES = [
+        ('queued', _('Queued')),
+        ('running', _('Running')),
+        ('done', _('Done')),
+        ('failed', _('Failed')),
+    ]
+    
+    job_type = models.CharField(_('Job Type'), max_length=30, choices=JOB_TYPE_CHOICES)
+    language = models.CharField(_('Language'), max_length=2, choices=Document.LANGUAGE_CHOICES, default='fr')
+    bulletin = models.ForeignKey(Bulletin, on_delete=models.CASCADE, null=True, blank=True, related_name='jobs')
+    attestation = models.ForeignKey(Attestation, on_delete=models.CASCADE, null=True, blank=True, related_name='jobs')
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, null=True, blank=True, related_name='jobs')
+    
+    # Merged bulletin packs have no Document: bulletin ids and languages, and the stored file
+    parameters = models.JSONField(_('Parameters'), default=dict, blank=True)
+    file_path = models.CharField(_('File Path'), max_length=500, blank=True)
+    
+    status = models.CharField(_('Status'), max_length=10, choices=STATUS_CHOICES, default='queued')
+    progress = models.PositiveSmallIntegerField(_('Progress'), default=0)
+    error = models.TextField(_('Error'), blank=True)
+    task_id = models.CharField(_('Task ID'), max_length=50, blank=True)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='document_jobs')
+    created_at = models.DateTimeField(_('Created at'), auto_now_add=True)
+    started_at = models.DateTimeField(_('Started at'), null=True, blank=True)
+    finished_at = models.DateTimeField(_('Finished at'), null=True, blank=True)
+    
+    class Meta:
+        verbose_name = _('Document Job')
+        verbose_name_plural = _('Document Jobs')
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['bulletin', 'language', 'status']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_job_type_display()} #{self.id} ({self.get_status_display()})"
+
+
+class BulletinDelivery(models.Model):
+    """
+    E-mail delivery of a bulletin to one parent
+    """
+    STATUS_CHOICES = [
+        ('pending', _('Pending')),
+        ('sent', _('Sent')),
+        ('failed', _('Failed')),
+    ]
+    
+    bulletin = models.ForeignKey(Bulletin, on_delete=models.CASCADE, related_name='deliveries')
+    parent = models.ForeignKey(Parent, on_delete=models.CASCADE, related_name='bulletin_deliveries')
+    email = models.EmailField(_('Email'))
+    language = models.CharField(_('Language'), max_length=2, choices=Document.LANGUAGE_CHOICES, default='fr')
+    status = models.CharField(_('Status'), max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(_('Attempts'), default=0)
+    error = models.TextField(_('Error'), blank=True)
+    next_attempt_at = models.DateTimeField(_('Next attempt at'), null=True, blank=True)
+    sent_at = models.DateTimeField(_('Sent at'), null=True, blank=True)
+    created_at = models.DateTimeField(_('Created at'), auto_now_add=True)
+    
+    class Meta:
+        verbose_name = _('Bulletin Delivery')
+        verbose_name_plural = _('Bulletin Deliveries')
+        ordering = ['-created_at']
+        unique_together = ['bulletin', 'parent']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+    
+    def __str__(self):
+        return f"Bulletin #{self.bulletin_id} -> {self.email} ({self.get_status_display()})"
@@ -2,99 +2,151 @@ from django.http import HttpResponse
 from django.template.loader import render_to_string
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-import os
+from reportlab.platypus import Paragraph, Spacer, Table
 from datetime import datetime
-from decimal import Decimal
+import hashlib
+import json
 
+from django.db import models
+
+from .institution import current_institution, institution_logo
+from .layouts import get_layout, LAYOUT_VERSION
+from .renderers import get_renderer, StaticPage
 from .models import Document, Bulletin, BulletinSubject, Attestation
-from apps.accounts.models import Student, Institution
+from apps.accounts.models import Student
 from apps.academics.models import Grade, Attendance
 
+# Languages of a bilingual rendering, in page order
+BILINGUAL_LANGUAGES = ('fr', 'ar')
+
+# Bookkeeping fields that never appear in a rendered document
+FINGERPRINT_EXCLUDED_FIELDS = {'id', 'document', 'created_at', 'updated_at', 'generated_at'}
+
+
+def _fingerprint_value(value):
+    if isinstance(value, models.Model):
+        return {
+            field.attname: field.value_from_object(value)
+            for field in value._meta.concrete_fields
+            if field.name not in FINGERPRINT_EXCLUDED_FIELDS
+        }
+    if isinstance(value, (list, tuple)):
+        return [_fingerprint_value(item) for item in value]
+    return value
+
 
 class PDFGenerator:
     """
     Base class for PDF generation
     """
     
-    def __init__(self, language='fr'):
+    # document type -> method building the ReportLab story from a render context
+    story_builders = {}
+    
+    def __init__(self, language='fr', engine=None):
         self.language = language
-        self.setup_fonts()
-        self.styles = getSampleStyleSheet()
-        self.setup_custom_styles()
+        self.engine = engine
+        self.layout = get_layout(language)
+        self.styles = self.layout.styles
     
-    def setup_fonts(self):
+    def render(self, document_type, context, language):
         """
-        Setup fonts for French and Arabic text
+        Render a document with the engine configured for its type
         """
-        try:
-            # Register fonts for multilingual support
-            font_path = os.path.join(settings.BASE_DIR, 'static', 'fonts')
-            
-            # French fonts
-            if os.path.exists(os.path.join(font_path, 'DejaVuSans.ttf')):
-                pdfmetrics.registerFont(TTFont('DejaVuSans', os.path.join(font_path, 'DejaVuSans.ttf')))
-            
-            # Arabic fonts
-            if os.path.exists(os.path.join(font_path, 'NotoSansArabic.ttf')):
-                pdfmetrics.registerFont(TTFont('NotoSansArabic', os.path.join(font_path, 'NotoSansArabic.ttf')))
-                
-        except Exception as e:
-            print(f"Font setup error: {e}")
+        return get_renderer(document_type, self, self.engine).render(document_type, context, language)
+    
+    def render_pack(self, document_type, contexts, language):
+        """
+        Render several documents of one type into a single merged PDF
+        """
+        return get_renderer(document_type, self, self.engine).render_pack(document_type, contexts, language)
     
-    def setup_custom_styles(self):
+    def render_sections(self, document_type, sections):
         """
-        Setup custom paragraph styles
+        Render (context, language) sections of one type into a single PDF
         """
-        # Title style
-        self.styles.add(ParagraphStyle(
-            name='CustomTitle',
-            parent=self.styles['Heading1'],
-            fontSize=18,
-            spaceAfter=30,
-            alignment=TA_CENTER,
-            fontName='DejaVuSans' if self.language == 'fr' else 'NotoSansArabic'
-        ))
+        return get_renderer(document_type, self, self.engine).render_sections(document_type, sections)
+    
+    def render_key(self, document_type, context, language):
+        """
+        Fingerprint of everything that determines the rendered file:
+        documents with the same key render to the same bytes
+        """
+        payload = [
+            document_type, language, LAYOUT_VERSION,
+            get_renderer(document_type, self, self.engine).name,
+            {key: _fingerprint_value(value) for key, value in context.items()},
+        ]
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+    
+    def build_story(self, document_type, context, language):
+        """
+        ReportLab story for a document type
+        """
+        return getattr(self, self.story_builders[document_type])(context, language)
+    
+    def font_for(self, language):
+        """
+        Font name for a language, falling back to DejaVuSans, then Helvetica, when its TTF is not installed
+        """
+        return get_layout(language).font_name
+    
+    def static_page(self, context, language, name='Static'):
+        """
+        Header and footer repeated on every page, drawn once per document or pack
+        """
+        institution = context.get('institution')
+        if not institution:
+            return StaticPage(name=name)
+        return StaticPage(
+            self._create_institution_header(institution, language),
+            self._create_page_footer(institution, language),
+            name=name
+        )
+    
+    def _create_page_footer(self, institution, language):
+        """
+        Create page footer
+        """
+        layout = get_layout(language)
+        institution_name = institution.name_ar if language == 'ar' and institution.name_ar else institution.name
+        return [layout.paragraph(f"{institution_name} - {institution.phone}", 'PageFooter')]
+    
+    def _create_institution_header(self, institution, language):
+        """
+        Create institution header
+        """
+        layout = get_layout(language)
+        elements = []
+        
+        # Logo, decoded once per process
+        logo = institution_logo(institution)
+        if logo:
+            elements.append(logo.flowable())
         
-        # Subtitle style
-        self.styles.add(ParagraphStyle(
-            name='CustomSubtitle',
-            parent=self.styles['Heading2'],
-            fontSize=14,
-            spaceAfter=20,
-            alignment=TA_CENTER,
-            fontName='DejaVuSans' if self.language == 'fr' else 'NotoSansArabic'
-        ))
+        # Institution name
+        institution_name = institution.name_ar if language == 'ar' and institution.name_ar else institution.name
+        elements.append(layout.paragraph(institution_name, 'CustomTitle'))
         
-        # Normal text style
-        self.styles.add(ParagraphStyle(
-            name='CustomNormal',
-            parent=self.styles['Normal'],
-            fontSize=10,
-            fontName='DejaVuSans' if self.language == 'fr' else 'NotoSansArabic'
-        ))
+        # Institution details
+        elements.append(layout.paragraph(layout.institution_details(institution)))
         
-        # Table header style
-        self.styles.add(ParagraphStyle(
-            name='TableHeader',
-            parent=self.styles['Normal'],
-            fontSize=10,
-            fontName='DejaVuSans' if self.language == 'fr' else 'NotoSansArabic',
-            alignment=TA_CENTER
-        ))
+        return elements
+    
+    def _info_table(self, layout, title_key, rows_key, values):
+        """
+        Titled two-column info table using the precompiled layout
+        """
+        table = Table(layout.info_table_data(rows_key, values), colWidths=layout.info_col_widths)
+        table.setStyle(layout.info_table_style)
+        return [Paragraph(layout.labels[title_key], layout.styles['CustomSubtitle']), table]
 
 
 class BulletinPDFGenerator(PDFGenerator):
     """
     Generate Bulletin Scolaire (Report Card) PDF
     """
+    story_builders = {'bulletin': '_bulletin_story'}
     
     def generate_bulletin(self, bulletin_id, language='fr'):
         """
@@ -103,194 +155,140 @@ class BulletinPDFGenerator(PDFGenerator):
         try:
             bulletin = Bulletin.objects.get(id=bulletin_id)
             student = bulletin.student
-            institution = Institution.objects.first()  # Assuming single institution
-            
+
             # Create PDF response
-            response = HttpResponse(content_type='application/pdf')
+            response = HttpResponse(self.build_bulletin(bulletin, language), content_type='application/pdf')
             filename = f"bulletin_{student.student_id}_{bulletin.academic_year}_{bulletin.trimester}_{language}.pdf"
             response['Content-Disposition'] = f'attachment; filename="{filename}"'
-            
-            # Create PDF document
-            doc = SimpleDocTemplate(response, pagesize=A4)
-            story = []
-            
-            # Add institution header
-            if institution:
-                story.append(self._create_institution_header(institution, language))
-                story.append(Spacer(1, 20))
-            
-            # Add student information
-            story.append(self._create_student_info(student, bulletin, language))
-            story.append(Spacer(1, 20))
-            
-            # Add academic information
-            story.append(self._create_academic_info(bulletin, language))
-            story.append(Spacer(1, 20))
-            
-            # Add grades table
-            story.append(self._create_grades_table(bulletin, language))
-            story.append(Spacer(1, 20))
-            
-            # Add attendance information
-            story.append(self._create_attendance_info(bulletin, language))
-            story.append(Spacer(1, 20))
-            
-            # Add notes
-            story.append(self._create_notes_section(bulletin, language))
-            
-            # Build PDF
-            doc.build(story)
             return response
-            
+
         except Exception as e:
             return HttpResponse(f"Error generating bulletin: {str(e)}", status=500)
+
+    def build_bulletin(self, bulletin, language='fr', subjects=None, institution=None):
+        """
+        Render bulletin PDF and return its bytes.
+        Subjects and institution may be passed in when already loaded.
+        """
+        return self.render('bulletin', self.bulletin_context(bulletin, subjects, institution), language)
     
-    def _create_institution_header(self, institution, language):
+    def build_bilingual(self, bulletin, languages=BILINGUAL_LANGUAGES, combined=False, subjects=None, institution=None):
         """
-        Create institution header
+        Render a bulletin in several languages from one load of its data.
+        Returns {language: bytes}, or a single PDF with one section per
+        language when combined.
         """
-        elements = []
-        
-        # Institution name
-        institution_name = institution.name_ar if language == 'ar' and institution.name_ar else institution.name
-        elements.append(Paragraph(institution_name, self.styles['CustomTitle']))
-        
-        # Institution details
-        if language == 'fr':
-            details = f"Adresse: {institution.address}<br/>Téléphone: {institution.phone}<br/>Email: {institution.email}"
-        else:
-            details = f"العنوان: {institution.address}<br/>الهاتف: {institution.phone}<br/>البريد الإلكتروني: {institution.email}"
-        
-        elements.append(Paragraph(details, self.styles['CustomNormal']))
-        
-        return elements
+        context = self.bulletin_context(bulletin, subjects, institution)
+        if combined:
+            return self.render_sections('bulletin', [(context, language) for language in languages])
+        return {language: self.render('bulletin', context, language) for language in languages}
+    
+    def build_class_pack(self, bulletins, language='fr', institution=None):
+        """
+        Render the bulletins of a class into one merged PDF.
+        With several languages, each bulletin is followed by its translations.
+        """
+        if institution is None:
+            institution = current_institution()
+        contexts = [self.bulletin_context(bulletin, bulletin.subjects.all(), institution) for bulletin in bulletins]
+        if isinstance(language, str):
+            return self.render_pack('bulletin', contexts, language)
+        return self.render_sections('bulletin', [(context, lang) for context in contexts for lang in language])
+    
+    def bulletin_context(self, bulletin, subjects=None, institution=None):
+        """
+        Data rendered into a bulletin
+        """
+        if institution is None:
+            institution = current_institution()  # Assuming single institution
+        if subjects is None:
+            subjects = BulletinSubject.objects.filter(bulletin=bulletin)
+
+        return {
+            'bulletin': bulletin,
+            'student': bulletin.student,
+            'student_name': bulletin.student.user.get_full_name(),
+            'subjects': list(subjects),
+            'institution': institution,
+        }
+    
+    def _bulletin_story(self, context, language):
+        bulletin, student = context['bulletin'], context['student']
+        story = []
+
+        # Institution header and footer are drawn on every page (static_page)
+
+        # Add student information
+        story.extend(self._create_student_info(student, bulletin, language))
+        story.append(Spacer(1, 20))
+
+        # Add academic information
+        story.extend(self._create_academic_info(bulletin, language))
+        story.append(Spacer(1, 20))
+
+        # Add grades table
+        story.extend(self._create_grades_table(bulletin, language, context['subjects']))
+        story.append(Spacer(1, 20))
+
+        # Add attendance information
+        story.extend(self._create_attendance_info(bulletin, language))
+        story.append(Spacer(1, 20))
+
+        # Add notes
+        story.extend(self._create_notes_section(bulletin, language))
+
+        return story
     
     def _create_student_info(self, student, bulletin, language):
         """
         Create student information section
         """
-        elements = []
-        
-        if language == 'fr':
-            title = "INFORMATIONS ÉLÈVE"
-            info_data = [
-                ["Nom complet:", student.user.get_full_name()],
-                ["Identifiant élève:", student.student_id],
-                ["Classe:", bulletin.class_name],
-                ["Année scolaire:", bulletin.academic_year],
-                ["Trimestre:", bulletin.trimester],
-            ]
-        else:
-            title = "معلومات التلميذ"
-            info_data = [
-                ["الاسم الكامل:", student.user.get_full_name()],
-                ["رقم التلميذ:", student.student_id],
-                ["الفصل:", bulletin.class_name],
-                ["السنة الدراسية:", bulletin.academic_year],
-                ["الثلث:", bulletin.trimester],
-            ]
-        
-        elements.append(Paragraph(title, self.styles['CustomSubtitle']))
-        
-        # Create student info table
-        table_data = [["", ""]] + info_data
-        table = Table(table_data, colWidths=[2*inch, 3*inch])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, -1), 'DejaVuSans' if language == 'fr' else 'NotoSansArabic'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        
-        elements.append(table)
-        return elements
+        return self._info_table(get_layout(language), 'student_title', 'student_rows', [
+            student.user.get_full_name(),
+            student.student_id,
+            bulletin.class_name,
+            bulletin.academic_year,
+            bulletin.trimester,
+        ])
     
     def _create_academic_info(self, bulletin, language):
         """
         Create academic performance section
         """
-        elements = []
-        
-        if language == 'fr':
-            title = "RÉSULTATS ACADÉMIQUES"
-            info_data = [
-                ["Moyenne générale:", f"{bulletin.total_average:.2f}/20" if bulletin.total_average else "N/A"],
-                ["Rang dans la classe:", f"{bulletin.class_rank}" if bulletin.class_rank else "N/A"],
-                ["Rang dans le niveau:", f"{bulletin.level_rank}" if bulletin.level_rank else "N/A"],
-            ]
-        else:
-            title = "النتائج الأكاديمية"
-            info_data = [
-                ["المعدل العام:", f"{bulletin.total_average:.2f}/20" if bulletin.total_average else "غير متوفر"],
-                ["الترتيب في الفصل:", f"{bulletin.class_rank}" if bulletin.class_rank else "غير متوفر"],
-                ["الترتيب في المستوى:", f"{bulletin.level_rank}" if bulletin.level_rank else "غير متوفر"],
-            ]
-        
-        elements.append(Paragraph(title, self.styles['CustomSubtitle']))
-        
-        # Create academic info table
-        table_data = [["", ""]] + info_data
-        table = Table(table_data, colWidths=[2*inch, 3*inch])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, -1), 'DejaVuSans' if language == 'fr' else 'NotoSansArabic'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        
-        elements.append(table)
-        return elements
+        layout = get_layout(language)
+        not_available = layout.raw_labels['not_available']
+        return self._info_table(layout, 'academic_title', 'academic_rows', [
+            f"{bulletin.total_average:.2f}/20" if bulletin.total_average else not_available,
+            f"{bulletin.class_rank}" if bulletin.class_rank else not_available,
+            f"{bulletin.level_rank}" if bulletin.level_rank else not_available,
+        ])
     
-    def _create_grades_table(self, bulletin, language):
+    def _create_grades_table(self, bulletin, language, subjects=None):
         """
         Create grades table
         """
-        elements = []
-        
-        if language == 'fr':
-            title = "DÉTAIL DES NOTES"
-            headers = ["Matière", "Coefficient", "Moyenne", "Enseignant", "Remarques"]
-        else:
-            title = "تفاصيل الدرجات"
-            headers = ["المادة", "المعامل", "المعدل", "المعلم", "ملاحظات"]
-        
-        elements.append(Paragraph(title, self.styles['CustomSubtitle']))
+        layout = get_layout(language)
+        elements = [Paragraph(layout.labels['grades_title'], layout.styles['CustomSubtitle'])]
         
         # Get bulletin subjects
-        subjects = BulletinSubject.objects.filter(bulletin=bulletin)
+        if subjects is None:
+            subjects = BulletinSubject.objects.filter(bulletin=bulletin)
         
         # Create table data
-        table_data = [headers]
+        table_data = [layout.row(layout.labels['grades_headers'])]
         for subject in subjects:
             subject_name = subject.subject_name_ar if language == 'ar' and subject.subject_name_ar else subject.subject_name
-            table_data.append([
-                subject_name,
+            table_data.append(layout.row([
+                layout.text(subject_name),
                 str(subject.coefficient),
                 f"{subject.average:.2f}",
-                subject.teacher_name,
-                subject.teacher_notes[:50] + "..." if len(subject.teacher_notes) > 50 else subject.teacher_notes
-            ])
+                layout.text(subject.teacher_name),
+                layout.text(subject.teacher_notes[:50] + "..." if len(subject.teacher_notes) > 50 else subject.teacher_notes)
+            ]))
         
         # Create table
-        table = Table(table_data, colWidths=[1.5*inch, 0.8*inch, 0.8*inch, 1.2*inch, 1.5*inch])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, -1), 'DejaVuSans' if language == 'fr' else 'NotoSansArabic'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
+        table = Table(table_data, colWidths=layout.grades_col_widths)
+        table.setStyle(layout.grades_table_style)
         
         elements.append(table)
         return elements
@@ -299,77 +297,49 @@ class BulletinPDFGenerator(PDFGenerator):
         """
         Create attendance information section
         """
-        elements = []
-        
-        if language == 'fr':
-            title = "ASSIDUITÉ"
-            info_data = [
-                ["Total des jours:", str(bulletin.total_days)],
-                ["Jours présents:", str(bulletin.present_days)],
-                ["Jours absents:", str(bulletin.absent_days)],
-                ["Taux d'assiduité:", f"{bulletin.attendance_rate:.1f}%" if bulletin.attendance_rate else "N/A"],
-            ]
-        else:
-            title = "الحضور"
-            info_data = [
-                ["إجمالي الأيام:", str(bulletin.total_days)],
-                ["أيام الحضور:", str(bulletin.present_days)],
-                ["أيام الغياب:", str(bulletin.absent_days)],
-                ["معدل الحضور:", f"{bulletin.attendance_rate:.1f}%" if bulletin.attendance_rate else "غير متوفر"],
-            ]
-        
-        elements.append(Paragraph(title, self.styles['CustomSubtitle']))
-        
-        # Create attendance table
-        table_data = [["", ""]] + info_data
-        table = Table(table_data, colWidths=[2*inch, 3*inch])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, -1), 'DejaVuSans' if language == 'fr' else 'NotoSansArabic'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        
-        elements.append(table)
-        return elements
+        layout = get_layout(language)
+        return self._info_table(layout, 'attendance_title', 'attendance_rows', [
+            str(bulletin.total_days),
+            str(bulletin.present_days),
+            str(bulletin.absent_days),
+            f"{bulletin.attendance_rate:.1f}%" if bulletin.attendance_rate else layout.raw_labels['not_available'],
+        ])
     
     def _create_notes_section(self, bulletin, language):
         """
         Create notes section
         """
+        layout = get_layout(language)
+        labels, styles = layout.labels, layout.styles
         elements = []
         
-        if language == 'fr':
-            title = "OBSERVATIONS"
-            teacher_title = "Remarques des enseignants:"
-            principal_title = "Remarques du directeur:"
-        else:
-            title = "الملاحظات"
-            teacher_title = "ملاحظات المعلمين:"
-            principal_title = "ملاحظات المدير:"
-        
-        elements.append(Paragraph(title, self.styles['CustomSubtitle']))
+        elements.append(Paragraph(labels['notes_title'], styles['CustomSubtitle']))
         
         # Teacher notes
-        elements.append(Paragraph(teacher_title, self.styles['CustomNormal']))
-        elements.append(Paragraph(bulletin.teacher_notes or "Aucune remarque", self.styles['CustomNormal']))
+        elements.append(Paragraph(labels['teacher_notes'], styles['CustomNormal']))
+        elements.append(self._notes_paragraph(layout, bulletin.teacher_notes))
         elements.append(Spacer(1, 10))
         
         # Principal notes
-        elements.append(Paragraph(principal_title, self.styles['CustomNormal']))
-        elements.append(Paragraph(bulletin.principal_notes or "Aucune remarque", self.styles['CustomNormal']))
+        elements.append(Paragraph(labels['principal_notes'], styles['CustomNormal']))
+        elements.append(self._notes_paragraph(layout, bulletin.principal_notes))
         
         return elements
+    
+    def _notes_paragraph(self, layout, notes):
+        if not notes:
+            return Paragraph(layout.labels['no_remark'], layout.styles['CustomNormal'])
+        return layout.paragraph(notes)
 
 
 class AttestationPDFGenerator(PDFGenerator):
     """
     Generate Attestation PDFs
     """
+    story_builders = {
+        'attestation_presence': '_presence_story',
+        'attestation_inscription': '_inscription_story',
+    }
     
     def generate_presence_attestation(self, attestation_id, language='fr'):
         """
@@ -378,41 +348,26 @@ class AttestationPDFGenerator(PDFGenerator):
         try:
             attestation = Attestation.objects.get(id=attestation_id)
             student = attestation.student
-            institution = Institution.objects.first()
-            
-            response = HttpResponse(content_type='application/pdf')
+
+            response = HttpResponse(self.build_presence_attestation(attestation, language), content_type='application/pdf')
             filename = f"attestation_presence_{student.student_id}_{language}.pdf"
             response['Content-Disposition'] = f'attachment; filename="{filename}"'
-            
-            doc = SimpleDocTemplate(response, pagesize=A4)
-            story = []
-            
-            # Institution header
-            if institution:
-                story.append(self._create_institution_header(institution, language))
-                story.append(Spacer(1, 30))
-            
-            # Title
-            if language == 'fr':
-                title = "ATTESTATION DE PRÉSENCE"
-            else:
-                title = "شهادة حضور"
-            
-            story.append(Paragraph(title, self.styles['CustomTitle']))
-            story.append(Spacer(1, 30))
-            
-            # Content
-            story.append(self._create_attestation_content(attestation, language))
-            
-            # Signature section
-            story.append(Spacer(1, 50))
-            story.append(self._create_signature_section(language))
-            
-            doc.build(story)
             return response
-            
+
         except Exception as e:
             return HttpResponse(f"Error generating attestation: {str(e)}", status=500)
+
+    def build_presence_attestation(self, attestation, language='fr', institution=None):
+        """
+        Render Attestation de Présence PDF and return its bytes
+        """
+        return self.render('attestation_presence', self.attestation_context(attestation, institution), language)
+    
+    def _presence_story(self, context, language):
+        return self._attestation_story(
+            context, language, 'presence_title',
+            self._create_attestation_content(context['attestation'], language)
+        )
     
     def generate_inscription_attestation(self, attestation_id, language='fr'):
         """
@@ -421,41 +376,55 @@ class AttestationPDFGenerator(PDFGenerator):
         try:
             attestation = Attestation.objects.get(id=attestation_id)
             student = attestation.student
-            institution = Institution.objects.first()
-            
-            response = HttpResponse(content_type='application/pdf')
+
+            response = HttpResponse(self.build_inscription_attestation(attestation, language), content_type='application/pdf')
             filename = f"attestation_inscription_{student.student_id}_{language}.pdf"
             response['Content-Disposition'] = f'attachment; filename="{filename}"'
-            
-            doc = SimpleDocTemplate(response, pagesize=A4)
-            story = []
-            
-            # Institution header
-            if institution:
-                story.append(self._create_institution_header(institution, language))
-                story.append(Spacer(1, 30))
-            
-            # Title
-            if language == 'fr':
-                title = "ATTESTATION D'INSCRIPTION"
-            else:
-                title = "شهادة التسجيل"
-            
-            story.append(Paragraph(title, self.styles['CustomTitle']))
-            story.append(Spacer(1, 30))
-            
-            # Content
-            story.append(self._create_inscription_content(attestation, language))
-            
-            # Signature section
-            story.append(Spacer(1, 50))
-            story.append(self._create_signature_section(language))
-            
-            doc.build(story)
             return response
-            
+
         except Exception as e:
             return HttpResponse(f"Error generating attestation: {str(e)}", status=500)
+
+    def build_inscription_attestation(self, attestation, language='fr', institution=None):
+        """
+        Render Attestation d'Inscription PDF and return its bytes
+        """
+        return self.render('attestation_inscription', self.attestation_context(attestation, institution), language)
+    
+    def _inscription_story(self, context, language):
+        return self._attestation_story(
+            context, language, 'inscription_title',
+            self._create_inscription_content(context['attestation'], language)
+        )
+    
+    def attestation_context(self, attestation, institution=None):
+        """
+        Data rendered into an attestation, dated from its creation
+        """
+        return {
+            'attestation': attestation,
+            'student': attestation.student,
+            'student_name': attestation.student.user.get_full_name(),
+            'institution': institution or current_institution(),
+            'issued_on': (attestation.created_at or datetime.now()).date(),
+        }
+    
+    def _attestation_story(self, context, language, title_key, content):
+        story = []
+
+        # Title
+        layout = get_layout(language)
+        story.append(Paragraph(layout.labels[title_key], layout.styles['CustomTitle']))
+        story.append(Spacer(1, 30))
+
+        # Content
+        story.extend(content)
+
+        # Signature section
+        story.append(Spacer(1, 50))
+        story.extend(self._create_signature_section(language, context['issued_on']))
+
+        return story
     
     def _create_institution_header(self, institution, language):
         """
@@ -463,15 +432,14 @@ class AttestationPDFGenerator(PDFGenerator):
         """
         elements = []
         
-        institution_name = institution.name_ar if language == 'ar' and institution.name_ar else institution.name
-        elements.append(Paragraph(institution_name, self.styles['CustomTitle']))
+        logo = institution_logo(institution)
+        if logo:
+            elements.append(logo.flowable())
         
-        if language == 'fr':
-            details = f"Adresse: {institution.address}<br/>Téléphone: {institution.phone}"
-        else:
-            details = f"العنوان: {institution.address}<br/>الهاتف: {institution.phone}"
-        
-        elements.append(Paragraph(details, self.styles['CustomNormal']))
+        layout = get_layout(language)
+        institution_name = institution.name_ar if language == 'ar' and institution.name_ar else institution.name
+        elements.append(layout.paragraph(institution_name, 'CustomTitle'))
+        elements.append(layout.paragraph(layout.institution_details(institution, include_email=False)))
         
         return elements
     
@@ -510,7 +478,7 @@ class AttestationPDFGenerator(PDFGenerator):
             هذه الشهادة صادرة للعمل بها حسب الأصول.
             """
         
-        elements.append(Paragraph(content, self.styles['CustomNormal']))
+        elements.append(get_layout(language).paragraph(content))
         return elements
     
     def _create_inscription_content(self, attestation, language):
@@ -550,18 +518,19 @@ class AttestationPDFGenerator(PDFGenerator):
             هذه الشهادة صادرة مرة واحدة فقط وتؤكد التسجيل الرسمي للتلميذ.
             """
         
-        elements.append(Paragraph(content, self.styles['CustomNormal']))
+        elements.append(get_layout(language).paragraph(content))
         return elements
     
-    def _create_signature_section(self, language):
+    def _create_signature_section(self, language, issued_on=None):
         """
         Create signature section
         """
         elements = []
+        issued_on = issued_on or datetime.now()
         
         if language == 'fr':
             content = f"""
-            Fait à Tunis, le {datetime.now().strftime('%d/%m/%Y')}<br/><br/>
+            Fait à Tunis, le {issued_on.strftime('%d/%m/%Y')}<br/><br/>
             
             Le Directeur/La Directrice<br/><br/>
             
@@ -569,12 +538,131 @@ class AttestationPDFGenerator(PDFGenerator):
             """
         else:
             content = f"""
-            حرر بتونس، في {datetime.now().strftime('%d/%m/%Y')}<br/><br/>
+            حرر بتونس، في {issued_on.strftime('%d/%m/%Y')}<br/><br/>
             
             المدير/المديرة<br/><br/>
             
             التوقيع: ____________________
             """
         
-        elements.append(Paragraph(content, self.styles['CustomNormal']))
+        elements.append(get_layout(language).paragraph(content))
         return elements
+
+
+class ReceiptPDFGenerator(PDFGenerator):
+    """
+    Generate payment receipt PDFs
+    """
+    story_builders = {'receipt': '_receipt_story'}
+    
+    def build_receipt(self, receipt, language='fr', institution=None):
+        """
+        Render a receipt PDF and return its bytes
+        """
+        return self.render('receipt', self.receipt_context(receipt, institution), language)
+    
+    def receipt_context(self, receipt, institution=None):
+        """
+        Data rendered into a receipt
+        """
+        payment = receipt.payment
+        student = payment.invoice.student
+        return {
+            'receipt': receipt,
+            'payment': payment,
+            'invoice': payment.invoice,
+            'student': student,
+            'student_name': student.user.get_full_name() if student else '',
+            'institution': institution or current_institution(),
+        }
+    
+    def _receipt_story(self, context, language):
+        receipt, payment, invoice = context['receipt'], context['payment'], context['invoice']
+        student = context['student']
+        layout = get_layout(language)
+        labels = layout.raw_labels
+        story = []
+
+        # Title
+        story.append(Paragraph(layout.labels['receipt_title'], layout.styles['CustomTitle']))
+        story.append(Spacer(1, 20))
+
+        # Payment details
+        description = invoice.description[:80] + "..." if len(invoice.description) > 80 else invoice.description
+        table = Table(layout.info_table_data('receipt_rows', [
+            receipt.receipt_number,
+            payment.payment_date.strftime('%d/%m/%Y %H:%M'),
+            f"{context['student_name']} ({student.student_id})" if student else labels['not_available'],
+            invoice.invoice_number,
+            description,
+            labels['payment_methods'].get(payment.payment_method, payment.payment_method),
+            payment.reference_number or labels['not_available'],
+            f"{payment.amount:.2f} {labels['currency']}",
+        ]), colWidths=layout.info_col_widths)
+        table.setStyle(layout.info_table_style)
+        story.append(table)
+
+        return story
+
+
+class FinancialReportPDFGenerator(PDFGenerator):
+    """
+    Generate financial report PDFs from a report's stored summary
+    """
+    story_builders = {'financial_report': '_report_story'}
+    
+    def build_report(self, report, language='fr', institution=None):
+        """
+        Render a financial report PDF and return its bytes
+        """
+        return self.render('financial_report', self.report_context(report, institution), language)
+    
+    def report_context(self, report, institution=None):
+        return {
+            'report': report,
+            'summary': report.summary,
+            'institution': institution or current_institution(),
+        }
+    
+    def _report_story(self, context, language):
+        report, summary = context['report'], context['summary']
+        layout = get_layout(language)
+        labels = layout.raw_labels
+        currency = labels['currency']
+        story = []
+
+        # Title
+        story.append(Paragraph(layout.labels['report_title'], layout.styles['CustomTitle']))
+        story.append(Spacer(1, 20))
+
+        # Totals
+        table = Table(layout.info_table_data('report_rows', [
+            report.title,
+            f"{report.start_date:%d/%m/%Y} - {report.end_date:%d/%m/%Y}",
+            f"{report.total_income:.2f} {currency}",
+            f"{report.total_expenses:.2f} {currency}",
+            f"{report.net_profit:.2f} {currency}",
+        ]), colWidths=layout.info_col_widths)
+        table.setStyle(layout.info_table_style)
+        story.append(table)
+        story.append(Spacer(1, 20))
+
+        # Breakdowns
+        income = summary.get('income', {}).get('by_payment_method', {})
+        expenses = dict(summary.get('expenses', {}).get('by_category', {}))
+        expenses['salaries'] = summary.get('expenses', {}).get('salaries', '0.00')
+        for title_key, names, values in (
+            ('income_title', labels['payment_methods'], income),
+            ('expenses_title', labels['expense_categories'], expenses),
+        ):
+            story.append(Paragraph(layout.labels[title_key], layout.styles['CustomSubtitle']))
+            rows = [['', '']] + [
+                layout.row([layout.text(names.get(key, key)), layout.text(f"{value} {currency}")])
+                for key, value in values.items()
+            ]
+            table = Table(rows, colWidths=layout.info_col_widths)
+            table.setStyle(layout.info_table_style)
+            story.append(table)
+            story.append(Spacer(1, 20))
+
+        return story
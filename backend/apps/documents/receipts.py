@@ -0,0 +1,159 @@
+"""
+Batch issuing of payment receipts.
+
+Every completed payment gets a receipt. The end-of-day run picks up all
+completed payments that have none yet, in chunks:
+
+- payments are locked with SKIP LOCKED, so two runs never issue the same receipt
+- PDFs are rendered in a pool of forked worker processes (ReportLab is pure
+  Python, threads would serialize on the GIL); fonts and layouts are compiled
+  before the fork and shared by every worker. The workers are forked up
+  front, before any chunk is claimed, with the database connections closed
+  so no child holds the parent's connection. Inside a transaction (the
+  connections cannot be closed then) or a Celery worker process, receipts
+  are rendered in-process instead
+- files are written, then the Receipt rows are recorded with one
+  bulk_create, leaving out payments a run that committed meanwhile issued
+"""
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import current_process, get_context
+
+from billiard.process import current_process as current_billiard_process
+from django.conf import settings
+from django.db import connection, connections, transaction
+
+from apps.finance.models import Payment, Receipt
+from .institution import current_institution
+from .layouts import LABELS, get_layout
+from .pdf_generator import ReceiptPDFGenerator
+from .storage import document_storage, save_generated_file
+
+RECEIPT_BATCH_SIZE = 200
+
+
+def pending_payments():
+    """
+    Completed payments that have no receipt yet
+    """
+    return Payment.objects.filter(status='completed', receipt__isnull=True)
+
+
+def receipt_path(receipt):
+    return f"receipts/{receipt.receipt_number}.pdf"
+
+
+def receipt_language(payment, language=None):
+    """
+    Explicit language, else the student's preferred one
+    """
+    if language:
+        return language
+    student = payment.invoice.student
+    preferred = student.user.preferred_language if student else None
+    return preferred if preferred in LABELS else 'fr'
+
+
+def render_receipt(job):
+    """
+    Render one (language, context) receipt job. Module level so it can run in a worker process.
+    """
+    language, context = job
+    return ReceiptPDFGenerator(language=language).render('receipt', context, language)
+
+
+def in_worker_process():
+    """
+    Whether this is a daemonic pool process: a multiprocessing one, or a
+    Celery prefork child (billiard, invisible to multiprocessing)
+    """
+    return current_process().daemon or current_billiard_process().daemon
+
+
+@contextmanager
+def render_pool(workers):
+    """
+    Process pool for rendering, or None to render in-process (single worker,
+    inside a transaction, or already inside a worker process)
+    """
+    if workers <= 1 or connection.in_atomic_block or in_worker_process():
+        yield None
+        return
+    # Fork every worker now, before the parent opens a connection: children
+    # must not inherit a live database connection
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('fork')) as pool:
+        pool.submit(int).result()
+        yield pool
+
+
+def issue_receipts(language=None, workers=None, batch_size=RECEIPT_BATCH_SIZE, payments=None):
+    """
+    Issue receipts for completed payments lacking one. Returns the number issued.
+    """
+    workers = settings.RECEIPT_RENDER_WORKERS if workers is None else workers
+    payments = pending_payments() if payments is None else payments.filter(status='completed', receipt__isnull=True)
+    institution = current_institution()
+    generator = ReceiptPDFGenerator()
+
+    # Compile fonts and layouts once, before the workers are forked
+    for code in LABELS:
+        get_layout(code)
+
+    issued = 0
+    with render_pool(workers) as pool:
+        while True:
+            with transaction.atomic():
+                batch = list(
+                    payments.select_related('invoice__student__user')
+                    .select_for_update(skip_locked=True, of=('self',))
+                    .order_by('id')[:batch_size]
+                )
+                if not batch:
+                    break
+
+                receipts = [
+                    Receipt(payment=payment, receipt_number=number)
+                    for payment, number in zip(batch, Receipt.generate_numbers(len(batch)))
+                ]
+                jobs = [
+                    (receipt_language(receipt.payment, language), generator.receipt_context(receipt, institution))
+                    for receipt in receipts
+                ]
+                if pool:
+                    contents = list(pool.map(render_receipt, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+                else:
+                    contents = [render_receipt(job) for job in jobs]
+
+                issued += store_receipts(receipts, contents)
+    return issued
+
+
+def store_receipts(receipts, contents):
+    """
+    Write the rendered receipts and record them, skipping the payments a run
+    that committed after they were claimed issued a receipt for. Returns the
+    number stored.
+    """
+    written = []
+    with transaction.atomic():
+        payment_ids = [receipt.payment_id for receipt in receipts]
+        taken = set(Receipt.objects.filter(payment_id__in=payment_ids).values_list('payment_id', flat=True))
+        stored = [
+            (receipt, content) for receipt, content in zip(receipts, contents) if receipt.payment_id not in taken
+        ]
+        try:
+            for receipt, content in stored:
+                receipt.file_path, size = save_generated_file(receipt_path(receipt), content)
+                written.append(receipt.file_path)
+            Receipt.objects.bulk_create([receipt for receipt, content in stored])
+        except Exception:
+            delete_receipt_files(written)
+            raise
+    return len(stored)
+
+
+def delete_receipt_files(file_paths):
+    storage = document_storage()
+    for file_path in file_paths:
+        storage.delete(file_path)
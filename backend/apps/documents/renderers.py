@@ -0,0 +1,252 @@
+"""
+PDF rendering engines.
+
+Generators collect the data of a document into a context and hand it to
+the engine configured for its document type (settings.DOCUMENT_RENDERERS):
+
+- reportlab: platypus story built by the generator from the precompiled layouts,
+  with the institution header and footer drawn once as shared form XObjects
+  (once per language in a bilingual document)
+- weasyprint: Django template `documents/pdf/<document_type>.html` rendered to
+  HTML and laid out by WeasyPrint, which shapes Arabic text natively
+"""
+import os
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from reportlab import rl_config
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import inch
+from reportlab.platypus import BaseDocTemplate, Frame, NextPageTemplate, PageBreak, PageTemplate, SimpleDocTemplate
+
+from .layouts import FALLBACK_FONT, FONT_FILES, LABELS, LANGUAGE_FONTS, RTL_LANGUAGES
+
+DEFAULT_ENGINE = 'reportlab'
+
+# Streams are Flate-compressed binary: ReportLab's default ASCII85 layer
+# on top only makes them a quarter larger
+rl_config.useA85 = 0
+
+
+PAGE_MARGIN = inch
+HEADER_TOP = 0.5 * inch
+FOOTER_BOTTOM = 0.4 * inch
+
+
+class StaticPage:
+    """
+    Institution header and footer shared by every page of a document or a
+    merged pack. They are drawn once into PDF form XObjects on the first
+    page; every page then only references them, instead of laying out and
+    writing the same text again (shared=False redraws them, for comparison).
+    Pages of different static content in one PDF need distinct form names.
+    """
+
+    def __init__(self, header=(), footer=(), shared=True, name='Static'):
+        self.shared = shared
+        self.header_form = f'{name}Header'
+        self.footer_form = f'{name}Footer'
+        width = A4[0] - 2 * PAGE_MARGIN
+        self.header = [(flowable, flowable.wrap(width, A4[1])[1]) for flowable in header]
+        self.footer = [(flowable, flowable.wrap(width, A4[1])[1]) for flowable in footer]
+        self.top_margin = max(PAGE_MARGIN, HEADER_TOP + self._height(self.header) + 12)
+        self.bottom_margin = max(PAGE_MARGIN, FOOTER_BOTTOM + self._height(self.footer) + 12)
+
+    def _height(self, flowables):
+        return sum(height for flowable, height in flowables) + sum(
+            flowable.getSpaceAfter() for flowable, height in flowables[:-1]
+        )
+
+    def _draw(self, canvas, flowables, top):
+        for flowable, height in flowables:
+            flowable.drawOn(canvas, PAGE_MARGIN, top - height)
+            top -= height + flowable.getSpaceAfter()
+
+    def __call__(self, canvas, doc):
+        """
+        onPage callback: define the forms on the first page, reference them on every page
+        """
+        for name, flowables, top in (
+            (self.header_form, self.header, A4[1] - HEADER_TOP),
+            (self.footer_form, self.footer, FOOTER_BOTTOM + self._height(self.footer)),
+        ):
+            if not flowables:
+                continue
+            if not self.shared:
+                self._draw(canvas, flowables, top)
+                continue
+            if not canvas.hasForm(name):
+                canvas.beginForm(name)
+                self._draw(canvas, flowables, top)
+                canvas.endForm()
+            canvas.doForm(name)
+
+
+class ReportLabRenderer:
+    """
+    Builds the generator's platypus story into an A4 document
+    """
+    name = 'reportlab'
+
+    def __init__(self, generator):
+        self.generator = generator
+
+    def render(self, document_type, context, language):
+        return self.build(
+            self.generator.build_story(document_type, context, language),
+            self.generator.static_page(context, language)
+        )
+
+    def render_pack(self, document_type, contexts, language, page=None):
+        """
+        Several documents merged into one PDF, each starting on a new page,
+        sharing the static page of the first one
+        """
+        story = []
+        for context in contexts:
+            if story:
+                story.append(PageBreak())
+            story.extend(self.generator.build_story(document_type, context, language))
+        return self.build(story, page or self.generator.static_page(contexts[0], language))
+
+    def render_sections(self, document_type, sections):
+        """
+        One PDF made of (context, language) sections, each starting on a new
+        page. Sections of the same language share a page template and its
+        static page, so a bilingual document draws each header once.
+        """
+        templates, story = {}, []
+        for context, language in sections:
+            if language not in templates:
+                page = self.generator.static_page(context, language, name=f'Static{language.upper()}')
+                templates[language] = PageTemplate(id=language, frames=[Frame(
+                    PAGE_MARGIN, page.bottom_margin,
+                    A4[0] - 2 * PAGE_MARGIN, A4[1] - page.top_margin - page.bottom_margin,
+                    id='normal'
+                )], onPage=page)
+            if story:
+                story.extend([NextPageTemplate(language), PageBreak()])
+            story.extend(self.generator.build_story(document_type, context, language))
+
+        buffer = BytesIO()
+        # The first section's template comes first: it lays out the first page
+        first = sections[0][1]
+        doc = BaseDocTemplate(buffer, pagesize=A4, pageTemplates=[templates[first]] + [
+            template for language, template in templates.items() if language != first
+        ])
+        doc.build(story)
+        return buffer.getvalue()
+
+    def build(self, story, page):
+        buffer = BytesIO()
+        doc = SimpleDocTemplate(
+            buffer, pagesize=A4, topMargin=page.top_margin, bottomMargin=page.bottom_margin
+        )
+        doc.build(story, onFirstPage=page, onLaterPages=page)
+        return buffer.getvalue()
+
+
+@lru_cache(maxsize=None)
+def font_config():
+    """
+    WeasyPrint font configuration, shared by every document of the process
+    """
+    from weasyprint.text.fonts import FontConfiguration
+    return FontConfiguration()
+
+
+@lru_cache(maxsize=None)
+def stylesheet(language):
+    """
+    Parsed stylesheet for a language. Parsing CSS and loading @font-face
+    rules is done once, not per document.
+    """
+    from weasyprint import CSS
+
+    font_path = os.path.join(settings.BASE_DIR, 'static', 'fonts')
+    fonts = [
+        {'name': name, 'url': f'file://{os.path.join(font_path, file_name)}'}
+        for name, file_name in FONT_FILES.items()
+        if os.path.exists(os.path.join(font_path, file_name))
+    ]
+    css = render_to_string('documents/pdf/document.css', {
+        'fonts': fonts,
+        'font_family': LANGUAGE_FONTS.get(language, FALLBACK_FONT),
+        'fallback_font': FALLBACK_FONT,
+        'rtl': language in RTL_LANGUAGES,
+    })
+    return CSS(string=css, font_config=font_config())
+
+
+class WeasyPrintRenderer:
+    """
+    Renders documents/pdf/<document_type>.html with WeasyPrint
+    """
+    name = 'weasyprint'
+
+    def __init__(self, generator=None):
+        self.generator = generator
+
+    def render_html(self, document_type, context, language):
+        return render_to_string(f'documents/pdf/{document_type}.html', {
+            **context,
+            'language': language,
+            'direction': 'rtl' if language in RTL_LANGUAGES else 'ltr',
+            'labels': LABELS.get(language, LABELS['fr']),
+        })
+
+    def render(self, document_type, context, language):
+        from weasyprint import HTML
+
+        html = self.render_html(document_type, context, language)
+        return HTML(string=html, base_url=str(settings.BASE_DIR)).write_pdf(
+            stylesheets=[stylesheet(language)], font_config=font_config()
+        )
+
+    def render_pack(self, document_type, contexts, language):
+        return self.render_sections(document_type, [(context, language) for context in contexts])
+
+    def render_sections(self, document_type, sections):
+        from weasyprint import HTML
+
+        documents = [
+            HTML(string=self.render_html(document_type, context, language), base_url=str(settings.BASE_DIR)).render(
+                stylesheets=[stylesheet(language)], font_config=font_config()
+            )
+            for context, language in sections
+        ]
+        pages = [page for document in documents for page in document.pages]
+        return documents[0].copy(pages).write_pdf()
+
+
+RENDERERS = {
+    ReportLabRenderer.name: ReportLabRenderer,
+    WeasyPrintRenderer.name: WeasyPrintRenderer,
+}
+
+
+def get_renderer(document_type, generator, engine=None):
+    """
+    Renderer for a document type, from settings.DOCUMENT_RENDERERS unless an engine is forced
+    """
+    engine = engine or settings.DOCUMENT_RENDERERS.get(document_type, DEFAULT_ENGINE)
+    try:
+        renderer_class = RENDERERS[engine]
+    except KeyError:
+        raise ValueError(f"Unknown PDF rendering engine: {engine}")
+    return renderer_class(generator)
+
+
+def engine_available(engine):
+    """
+    Whether an engine can run in this environment (WeasyPrint needs Pango)
+    """
+    if engine != WeasyPrintRenderer.name:
+        return engine in RENDERERS
+    try:
+        import weasyprint  # noqa: F401
+    except (ImportError, OSError):
+        return False
+    return True
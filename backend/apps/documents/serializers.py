@@ -1,5 +1,6 @@
+from django.urls import reverse
 from rest_framework import serializers
-from .models import Document, Bulletin, BulletinSubject, Attestation
+from .models import Document, Bulletin, BulletinSubject, Attestation, DocumentJob, BulletinDelivery
 
 
 class DocumentSerializer(serializers.ModelSerializer):
@@ -24,3 +25,25 @@ class AttestationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Attestation
         fields = '__all__'
+
+
+class DocumentJobSerializer(serializers.ModelSerializer):
+    download_url = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = DocumentJob
+        fields = '__all__'
+        read_only_fields = ['status', 'progress', 'error', 'task_id', 'requested_by', 'started_at', 'finished_at']
+    
+    def get_download_url(self, obj):
+        if obj.status != 'done':
+            return None
+        url = reverse('documentjob-download', kwargs={'pk': obj.pk})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
+class BulletinDeliverySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BulletinDelivery
+        fields = '__all__'
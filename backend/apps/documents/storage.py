@@ -0,0 +1,120 @@
+import os
+import re
+from urllib.parse import urljoin
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, storages
+from django.http import Http404, HttpResponse, HttpResponseNotModified, FileResponse, HttpResponseRedirect
+from django.utils.functional import cached_property
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class DocumentFileSystemStorage(FileSystemStorage):
+    """
+    Local storage for generated files, kept under MEDIA_ROOT/documents
+    so nginx can serve them from its /media/ location
+    """
+
+    @cached_property
+    def base_location(self):
+        return self._value_or_setting(self._location, os.path.join(settings.MEDIA_ROOT, 'documents'))
+
+    @cached_property
+    def base_url(self):
+        if self._base_url is not None and not self._base_url.endswith('/'):
+            self._base_url += '/'
+        return self._value_or_setting(self._base_url, urljoin(settings.MEDIA_URL, 'documents/'))
+
+
+def document_storage():
+    """
+    Storage backend configured for generated documents (STORAGES['documents'])
+    """
+    return storages['documents']
+
+
+def save_generated_file(name, content):
+    """
+    Persist generated bytes under `name`, replacing any previous version.
+    Returns the stored name and its size.
+    """
+    storage = document_storage()
+    if storage.exists(name):
+        storage.delete(name)
+    return storage.save(name, ContentFile(content)), len(content)
+
+
+def _etag(storage, name):
+    size = storage.size(name)
+    modified = storage.get_modified_time(name)
+    return f'"{size:x}-{int(modified.timestamp()):x}"', size
+
+
+def _parse_range(header, size):
+    """
+    Parse a single `bytes=start-end` range. Returns None when absent or
+    unsupported, raises ValueError when unsatisfiable.
+    """
+    match = RANGE_RE.match(header or '')
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if start == '':
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError('Unsatisfiable range')
+    return start, end
+
+
+def serve_generated_file(request, name, filename=None, content_type='application/pdf'):
+    """
+    Deliver a stored file without streaming it through Python where possible:
+    - local storage behind nginx: X-Accel-Redirect to the internal /media/ location
+    - S3-compatible storage: redirect to a short-lived signed URL
+    - development: FileResponse with ETag and single Range support
+    """
+    storage = document_storage()
+    filename = filename or os.path.basename(name)
+    disposition = f'attachment; filename="{filename}"'
+
+    if not isinstance(storage, FileSystemStorage):
+        return HttpResponseRedirect(storage.url(name, parameters={'ResponseContentDisposition': disposition}))
+
+    if not storage.exists(name):
+        raise Http404('Generated file is missing')
+
+    etag, size = _etag(storage, name)
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    if settings.DOCUMENTS_X_ACCEL_REDIRECT:
+        # nginx handles Range and conditional requests for the internal location
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = storage.url(name)
+    else:
+        try:
+            byte_range = _parse_range(request.headers.get('Range'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        if byte_range:
+            start, end = byte_range
+            with storage.open(name, 'rb') as f:
+                f.seek(start)
+                response = HttpResponse(f.read(end - start + 1), content_type=content_type, status=206)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        else:
+            response = FileResponse(storage.open(name, 'rb'), content_type=content_type)
+
+    response['Content-Disposition'] = disposition
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    return response
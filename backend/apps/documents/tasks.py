@@ -0,0 +1,219 @@
+import logging
+
+from celery import shared_task
+from django.db import transaction
+from django.utils import timezone
+
+from .archive import archive_academic_year
+from .blobs import collect_garbage, find_rendered_blob, store_blob
+from .distribution import next_retry_delay, send_deliveries
+from .institution import current_institution
+from .models import Bulletin, DocumentJob
+from .pdf_generator import BulletinPDFGenerator, AttestationPDFGenerator
+from .receipts import issue_receipts
+from .storage import save_generated_file
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_document_job(job):
+    """
+    Queue a document job once the surrounding transaction has committed
+    """
+    def _send():
+        result = generate_document.delay(job.id)
+        DocumentJob.objects.filter(id=job.id, task_id='').update(task_id=result.id or '')
+
+    transaction.on_commit(_send)
+    return job
+
+
+def enqueue_document_batch(jobs):
+    """
+    Queue many document jobs as one batch task once the transaction has committed
+    """
+    job_ids = [job.id for job in jobs]
+
+    def _send():
+        result = generate_document_batch.delay(job_ids)
+        DocumentJob.objects.filter(id__in=job_ids, task_id='').update(task_id=result.id or '')
+
+    transaction.on_commit(_send)
+    return jobs
+
+
+def job_context(job, institution=None, contexts=None):
+    """
+    Generator and render context for a job (job types are document types).
+    Contexts do not depend on the language: given a contexts dict, jobs
+    rendering the same bulletin or attestation in other languages reuse
+    the context loaded for the first one.
+    """
+    key = (job.job_type, job.bulletin_id, job.attestation_id)
+    if job.job_type == 'bulletin':
+        generator = BulletinPDFGenerator(language=job.language)
+
+        def load():
+            return generator.bulletin_context(job.bulletin, institution=institution)
+    else:
+        generator = AttestationPDFGenerator(language=job.language)
+
+        def load():
+            return generator.attestation_context(job.attestation, institution)
+
+    if contexts is None:
+        return generator, load()
+    if key not in contexts:
+        contexts[key] = load()
+    return generator, contexts[key]
+
+
+def document_jobs():
+    return DocumentJob.objects.select_related(
+        'document', 'bulletin__student__user', 'attestation__student__user'
+    )
+
+
+@shared_task(bind=True, ignore_result=True)
+def generate_document(self, job_id):
+    """
+    Render a queued document and store the file
+    """
+    return run_document_job(document_jobs().get(id=job_id))
+
+
+@shared_task(ignore_result=True)
+def generate_document_batch(job_ids):
+    """
+    Render a batch of queued documents in one task: jobs are loaded with one
+    query and share the institution and the compiled layouts, and the
+    language versions of one bulletin or attestation share its data
+    """
+    institution = current_institution()
+    contexts = {}
+    statuses = [
+        run_document_job(job, institution, contexts)
+        for job in document_jobs().filter(id__in=job_ids).order_by('id')
+    ]
+    logger.info("Document batch: %s of %s jobs done", statuses.count('done'), len(job_ids))
+
+
+def run_document_job(job, institution=None, contexts=None):
+    """
+    Run one queued job: render (or reuse) and store its file
+    """
+    if job.status != 'queued':
+        return job.status
+
+    job.status = 'running'
+    job.started_at = timezone.now()
+    job.progress = 10
+    job.save(update_fields=['status', 'started_at', 'progress'])
+
+    try:
+        if job.job_type == 'bulletin_pack':
+            store_bulletin_pack(job, institution)
+        else:
+            store_document(job, institution, contexts)
+        job.status = 'done'
+        job.progress = 100
+    except Exception as e:
+        logger.exception("Document job %s failed", job.id)
+        job.status = 'failed'
+        job.error = str(e)
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'progress', 'error', 'finished_at'])
+    return job.status
+
+
+def store_document(job, institution=None, contexts=None):
+    """
+    Reuse or render the job's document file and link it to the document
+    """
+    generator, context = job_context(job, institution, contexts)
+    render_key = generator.render_key(job.job_type, context, job.language)
+
+    # Unchanged data: reuse the stored file, no render and no write
+    blob = find_rendered_blob(render_key)
+    if blob is None:
+        content = generator.render(job.job_type, context, job.language)
+        job.progress = 80
+        job.save(update_fields=['progress'])
+        blob, created = store_blob(content)
+
+    document = job.document
+    document.blob = blob
+    document.render_key = render_key
+    document.file_path, document.file_size = blob.file_path, blob.size
+    # A fresh rendering supersedes the archived copy
+    document.archive = None
+    document.archive_offset = document.archive_length = None
+    document.is_archived = False
+    document.archived_at = None
+    document.save(update_fields=[
+        'blob', 'render_key', 'file_path', 'file_size',
+        'archive', 'archive_offset', 'archive_length', 'is_archived', 'archived_at'
+    ])
+
+
+def store_bulletin_pack(job, institution=None):
+    """
+    Render the job's bulletins merged into one PDF (each followed by its
+    translations when several languages) and store it under the job's file path
+    """
+    ids = job.parameters['bulletins']
+    languages = job.parameters['languages']
+    bulletins = Bulletin.objects.filter(id__in=ids).select_related('student__user').prefetch_related('subjects')
+    position = {bulletin_id: index for index, bulletin_id in enumerate(ids)}
+    bulletins = sorted(bulletins, key=lambda bulletin: position[bulletin.id])
+
+    content = BulletinPDFGenerator(language=languages[0]).build_class_pack(
+        bulletins, languages if len(languages) > 1 else languages[0], institution
+    )
+    job.progress = 80
+    job.file_path, size = save_generated_file(job.file_path, content)
+    job.save(update_fields=['progress', 'file_path'])
+
+
+@shared_task(ignore_result=True)
+def archive_documents(academic_year):
+    """
+    Pack a closed academic year's documents into its archive file
+    """
+    archive = archive_academic_year(academic_year)
+    if archive:
+        logger.info("Archived %s documents of %s into %s", archive.document_count, academic_year, archive.file_path)
+
+
+@shared_task(ignore_result=True)
+def collect_document_blobs():
+    """
+    Remove stored files no document references any more
+    """
+    count, reclaimed = collect_garbage()
+    if count:
+        logger.info("Collected %s unreferenced document blobs (%s bytes)", count, reclaimed)
+
+
+@shared_task(ignore_result=True)
+def issue_pending_receipts(language=None):
+    """
+    Issue receipts for every completed payment that has none yet
+    """
+    issued = issue_receipts(language=language)
+    if issued:
+        logger.info("Issued %s payment receipts", issued)
+
+
+@shared_task(ignore_result=True)
+def send_bulletin_mails():
+    """
+    Mail the due bulletin deliveries; runs again when the earliest retry is due
+    """
+    counts = send_deliveries()
+    logger.info(
+        "Bulletin mails: %s sent, %s failed, %s to retry", counts['sent'], counts['failed'], counts['retrying']
+    )
+    if counts['retrying']:
+        send_bulletin_mails.apply_async(countdown=next_retry_delay() or 0)
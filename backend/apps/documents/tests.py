@@ -1,3 +1,972 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import smtplib
+import tempfile
+import unittest
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core import mail
+from django.core.files.base import ContentFile
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, RequestFactory, override_settings
+from rest_framework.test import APITestCase, APITransactionTestCase
+from rest_framework import status
+
+from django.core.management import call_command, CommandError
+from django.utils import timezone
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+
+from apps.documents.blobs import store_blob, collect_garbage
+from apps.documents.distribution import RateLimiter, queue_deliveries, send_deliveries
+from apps.documents.archive import archive_academic_year, read_archived_document, read_index
+from apps.documents.arabic import shape_text, shape_markup, ARABIC_TEXT_CACHE_SIZE
+from apps.documents.benchmarks import (
+    benchmark_bulletins, benchmark_class_pack, count_pages, sample_sizes, synthetic_bulletin, synthetic_institution,
+    run_suite, check_regressions, load_baseline
+)
+from apps.documents.fonts import embedding_font
+from apps.documents.institution import institution_profile, invalidate_institution_profile
+from apps.documents.layouts import get_layout, LABELS
+from apps.documents.models import Bulletin, BulletinDelivery, Document, DocumentJob, DocumentBlob
+from apps.documents.pdf_generator import BulletinPDFGenerator, AttestationPDFGenerator, ReceiptPDFGenerator
+from apps.documents.receipts import issue_receipts, render_pool, store_receipts
+from apps.documents.renderers import get_renderer, engine_available, ReportLabRenderer, WeasyPrintRenderer
+from apps.documents.storage import document_storage, save_generated_file, serve_generated_file
+from apps.finance.models import Receipt
+from factories import (
+    UserFactory, InstitutionFactory, StudentFactory, StudentClassFactory, ClassSubjectFactory, AcademicYearFactory, ClassFactory,
+    ParentStudentFactory, BulletinFactory, BulletinSubjectFactory, AttestationFactory, PaymentFactory, ReceiptFactory, DocumentFactory
+)
+
+
+class EagerCeleryMixin:
+    """
+    Run Celery tasks in-process and write generated files to a temporary MEDIA_ROOT
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root, CELERY_TASK_ALWAYS_EAGER=True)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+        super().tearDown()
+
+
+class GeneratedFileStorageTest(EagerCeleryMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.factory = RequestFactory()
+        self.name, self.size = save_generated_file('receipts/test.pdf', b'%PDF-' + b'x' * 95)
+
+    def test_files_are_stored_under_media_documents(self):
+        self.assertEqual(self.size, 100)
+        self.assertTrue(document_storage().path(self.name).startswith(self.media_root))
+        self.assertEqual(document_storage().url(self.name), '/media/documents/receipts/test.pdf')
+
+    def test_saving_again_replaces_file(self):
+        name, size = save_generated_file('receipts/test.pdf', b'%PDF-new')
+        self.assertEqual(name, self.name)
+        self.assertEqual(document_storage().size(name), size)
+
+    @override_settings(DOCUMENTS_X_ACCEL_REDIRECT=True)
+    def test_x_accel_redirect_offloads_delivery(self):
+        response = serve_generated_file(self.factory.get('/'), self.name)
+        self.assertEqual(response['X-Accel-Redirect'], '/media/documents/receipts/test.pdf')
+        self.assertEqual(response.content, b'')
+        self.assertIn('ETag', response)
+
+    def test_range_request_returns_partial_content(self):
+        response = serve_generated_file(self.factory.get('/', HTTP_RANGE='bytes=0-4'), self.name)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, b'%PDF-')
+        self.assertEqual(response['Content-Range'], 'bytes 0-4/100')
+
+        response = serve_generated_file(self.factory.get('/', HTTP_RANGE='bytes=500-'), self.name)
+        self.assertEqual(response.status_code, 416)
+
+    def test_matching_etag_returns_not_modified(self):
+        etag = serve_generated_file(self.factory.get('/'), self.name)['ETag']
+        response = serve_generated_file(self.factory.get('/', HTTP_IF_NONE_MATCH=etag), self.name)
+        self.assertEqual(response.status_code, 304)
+
+
+class PDFGeneratorTest(TestCase):
+    def setUp(self):
+        InstitutionFactory()
+        self.bulletin = BulletinFactory(language='fr')
+        BulletinSubjectFactory.create_batch(3, bulletin=self.bulletin)
+
+    def test_build_bulletin_returns_pdf_bytes(self):
+        for language in ('fr', 'ar'):
+            content = BulletinPDFGenerator(language=language).build_bulletin(self.bulletin, language)
+            self.assertTrue(content.startswith(b'%PDF'))
+
+    def test_build_presence_attestation_returns_pdf_bytes(self):
+        attestation = AttestationFactory(attestation_type='presence')
+        content = AttestationPDFGenerator(language='fr').build_presence_attestation(attestation, 'fr')
+        self.assertTrue(content.startswith(b'%PDF'))
+
+    def test_layout_is_compiled_once_per_language(self):
+        self.assertIs(BulletinPDFGenerator(language='ar').layout, BulletinPDFGenerator(language='ar').layout)
+        self.assertIsNot(get_layout('fr'), get_layout('ar'))
+        self.assertEqual(get_layout('fr').labels['no_remark'], LABELS['fr']['no_remark'])
+
+    def test_build_bulletin_with_preloaded_data_runs_no_queries(self):
+        bulletin, subjects = synthetic_bulletin(1, subject_count=5)
+        with self.assertNumQueries(0):
+            content = BulletinPDFGenerator().build_bulletin(bulletin, 'fr', subjects=subjects, institution=synthetic_institution())
+        self.assertTrue(content.startswith(b'%PDF'))
+
+    def test_benchmark_reports_throughput(self):
+        result = benchmark_bulletins(count=2, language='ar', subject_count=5)
+        self.assertEqual(result['documents'], 2)
+        self.assertGreater(result['docs_per_sec'], 0)
+
+    def test_embedded_fonts_are_stripped_and_streams_not_ascii85(self):
+        source = os.path.join(settings.BASE_DIR, 'static', 'fonts', 'DejaVuSans.ttf')
+        if not os.path.exists(source):
+            self.skipTest('DejaVuSans.ttf is not installed')
+        optimized = embedding_font(source)
+        self.assertNotEqual(optimized, source)
+        self.assertEqual(embedding_font(source), optimized)
+        self.assertLess(os.path.getsize(optimized), os.path.getsize(source))
+
+        bulletin, subjects = synthetic_bulletin(1)
+        content = BulletinPDFGenerator().build_bulletin(bulletin, 'fr', subjects=subjects, institution=synthetic_institution())
+        self.assertNotIn(b'ASCII85Decode', content)
+
+    def test_size_report_covers_every_document_type(self):
+        report = sample_sizes(languages=('fr',), pack_count=2)
+        self.assertEqual(
+            [row['document_type'] for row in report],
+            ['bulletin', 'attestation_presence', 'attestation_inscription', 'receipt', 'bulletin pack /2']
+        )
+        for row in report:
+            self.assertGreater(row['bytes'], 0)
+        # Full hinted fonts and ASCII85 streams made a bulletin about 27 KB
+        self.assertLess(report[0]['bytes'], 16 * 1024)
+
+        DocumentFactory(file_size=1000, document_type='bulletin', language='fr')
+        out = StringIO()
+        call_command('document_sizes', stdout=out)
+        self.assertIn('bulletin', out.getvalue())
+
+    def test_class_pack_draws_header_and_footer_once(self):
+        for language in ('fr', 'ar'):
+            shared = benchmark_class_pack(count=10, language=language, repeat=1)
+            redrawn = benchmark_class_pack(count=10, language=language, shared_header=False, repeat=1)
+            self.assertGreaterEqual(shared['pages'], 10)
+            self.assertEqual(shared['pages'], redrawn['pages'])
+            self.assertLess(shared['bytes'], redrawn['bytes'])
+
+        generator = BulletinPDFGenerator()
+        contexts = [
+            generator.bulletin_context(*synthetic_bulletin(i), institution=synthetic_institution()) for i in range(3)
+        ]
+        content = generator.render_pack('bulletin', contexts, 'fr')
+        self.assertEqual(content.count(b'/Subtype /Form'), 2)
+
+    def test_bilingual_rendering_loads_bulletin_data_once(self):
+        institution_profile()
+        with CaptureQueriesContext(connection) as single:
+            BulletinPDFGenerator().build_bulletin(self.bulletin, 'fr')
+        with CaptureQueriesContext(connection) as bilingual:
+            files = BulletinPDFGenerator().build_bilingual(self.bulletin)
+        self.assertEqual(len(bilingual), len(single))
+        self.assertEqual(set(files), {'fr', 'ar'})
+        self.assertNotEqual(files['fr'], files['ar'])
+
+        combined = BulletinPDFGenerator().build_bilingual(self.bulletin, combined=True)
+        self.assertEqual(count_pages(combined), count_pages(files['fr']) + count_pages(files['ar']))
+        # One header and one footer form per language
+        self.assertEqual(combined.count(b'/Subtype /Form'), 4)
+
+
+class InstitutionProfileTest(EagerCeleryMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.institution = InstitutionFactory()
+        logo = BytesIO()
+        Image.new('RGBA', (1200, 600), (200, 30, 30, 255)).save(logo, 'PNG')
+        self.institution.logo.save('logo.png', ContentFile(logo.getvalue()))
+
+    def tearDown(self):
+        # The rolled-back institution must not outlive the test
+        invalidate_institution_profile()
+        super().tearDown()
+
+    def test_rendering_reads_no_institution_data_after_warmup(self):
+        bulletin, subjects = synthetic_bulletin(1)
+        profile = institution_profile()
+        self.assertEqual(profile.institution, self.institution)
+        # Scaled down to the size it is drawn at
+        self.assertLessEqual(profile.logo.reader.getSize()[1], 200)
+
+        with mock.patch('apps.documents.institution.PILImage.open') as decode:
+            with self.assertNumQueries(0):
+                content = BulletinPDFGenerator().build_bulletin(bulletin, 'fr', subjects=subjects)
+        decode.assert_not_called()
+        self.assertIn(b'/Subtype /Image', content)
+
+    def test_profile_is_invalidated_on_save(self):
+        profile = institution_profile()
+        self.assertIs(institution_profile(), profile)
+
+        self.institution.name = 'Lycée Pilote'
+        self.institution.save()
+        self.assertIsNot(institution_profile(), profile)
+        self.assertEqual(institution_profile().institution.name, 'Lycée Pilote')
+
+        self.institution.delete()
+        self.assertIsNone(institution_profile().institution)
+
+
+class ArabicShapingTest(TestCase):
+    """
+    Visual regression: the fixtures hold the exact visual-order strings drawn into Arabic PDFs
+    """
+    fixtures_path = os.path.join(os.path.dirname(__file__), 'testdata', 'arabic_visual.json')
+
+    @classmethod
+    def setUpTestData(cls):
+        with open(cls.fixtures_path, encoding='utf-8') as f:
+            cls.cases = json.load(f)
+
+    def test_text_matches_visual_fixtures(self):
+        for case in self.cases['text']:
+            self.assertEqual(shape_text(case['input']), case['visual'])
+
+    def test_markup_matches_visual_fixtures(self):
+        for case in self.cases['markup']:
+            visual = shape_markup(case['input'], 'Helvetica', case['font_size'], case['width'])
+            self.assertEqual(visual, case['visual'])
+
+    def test_long_arabic_text_is_wrapped_in_reading_order(self):
+        text = ' '.join(['كلمة%d' % i for i in range(40)])
+        lines = shape_markup(text, 'Helvetica', 10, 150).split('<br/>')
+        self.assertGreater(len(lines), 1)
+        self.assertEqual(lines[0], shape_text(' '.join(text.split()[:len(lines[0].split())])))
+
+    def test_static_labels_are_shaped_once_in_layout(self):
+        layout = get_layout('ar')
+        self.assertEqual(layout.labels['student_title'], shape_text(LABELS['ar']['student_title']))
+        self.assertEqual(get_layout('fr').labels['student_title'], LABELS['fr']['student_title'])
+
+    def test_name_cache_is_bounded(self):
+        self.assertEqual(shape_text.cache_info().maxsize, ARABIC_TEXT_CACHE_SIZE)
+
+    def test_arabic_tables_are_mirrored_and_shaped(self):
+        bulletin, subjects = synthetic_bulletin(1, subject_count=2, language='ar')
+        bulletin.student.user.first_name = 'محمد'
+        bulletin.student.user.last_name = 'بن علي'
+        generator = BulletinPDFGenerator(language='ar')
+
+        title, table = generator._create_student_info(bulletin.student, bulletin, 'ar')
+        value_cell, label_cell = table._cellvalues[1]
+        self.assertEqual(label_cell, shape_text('الاسم الكامل:'))
+        self.assertEqual(value_cell, shape_text('محمد بن علي'))
+
+        title, table = generator._create_grades_table(bulletin, 'ar', subjects)
+        self.assertEqual(table._cellvalues[1][-1], shape_text(subjects[0].subject_name_ar))
+
+
+class RendererTest(TestCase):
+    def setUp(self):
+        self.bulletin, self.subjects = synthetic_bulletin(1, subject_count=3, language='ar')
+        self.context = {
+            'bulletin': self.bulletin,
+            'student': self.bulletin.student,
+            'subjects': self.subjects,
+            'institution': synthetic_institution(),
+        }
+
+    def test_engine_is_selected_per_document_type(self):
+        with self.settings(DOCUMENT_RENDERERS={'bulletin': 'weasyprint'}):
+            self.assertIsInstance(get_renderer('bulletin', None), WeasyPrintRenderer)
+            self.assertIsInstance(get_renderer('attestation_presence', None), ReportLabRenderer)
+        self.assertIsInstance(get_renderer('bulletin', None, engine='reportlab'), ReportLabRenderer)
+
+        with self.assertRaises(ValueError):
+            get_renderer('bulletin', None, engine='unknown')
+
+    def test_bulletin_template_renders_html(self):
+        html = WeasyPrintRenderer().render_html('bulletin', self.context, 'ar')
+        self.assertIn('dir="rtl"', html)
+        self.assertIn(LABELS['ar']['grades_title'], html)
+        self.assertIn(self.subjects[0].subject_name_ar, html)
+        self.assertIn(self.bulletin.student.student_id, html)
+
+    def test_attestation_template_renders_html(self):
+        attestation = AttestationFactory.build(attestation_type='presence')
+        html = WeasyPrintRenderer().render_html('attestation_presence', {
+            'attestation': attestation,
+            'student': attestation.student,
+            'institution': None,
+            'issued_on': attestation.valid_from,
+        }, 'fr')
+        self.assertIn(LABELS['fr']['presence_title'], html)
+        self.assertIn(attestation.class_name, html)
+
+    @unittest.skipUnless(engine_available('weasyprint'), 'WeasyPrint system libraries are not installed')
+    def test_weasyprint_renders_bulletin(self):
+        generator = BulletinPDFGenerator(language='ar', engine='weasyprint')
+        content = generator.build_bulletin(self.bulletin, 'ar', subjects=self.subjects, institution=self.context['institution'])
+        self.assertTrue(content.startswith(b'%PDF'))
+
+
+class PDFBenchmarkTest(TestCase):
+    def test_suite_reports_all_metrics(self):
+        results = run_suite(count=2, cases=[('bulletin', 'ar', 5), ('attestation_presence', 'fr', 0)])
+        self.assertEqual(set(results), {'bulletin:ar:5', 'attestation_presence:fr:0'})
+        for metrics in results.values():
+            for metric in ('docs_per_sec', 'p50_ms', 'p95_ms', 'alloc_kib_per_doc', 'avg_bytes', 'peak_rss_mib'):
+                self.assertGreater(metrics[metric], 0)
+
+    def test_regressions_are_detected_past_tolerance(self):
+        baseline = {'bulletin:fr:5': {'docs_per_sec': 100, 'p95_ms': 10, 'avg_bytes': 1000}}
+        within = {'bulletin:fr:5': {'docs_per_sec': 90, 'p95_ms': 12, 'avg_bytes': 1050}}
+        slower = {'bulletin:fr:5': {'docs_per_sec': 50, 'p95_ms': 30, 'avg_bytes': 1000}}
+
+        self.assertEqual(check_regressions(within, baseline), [])
+        regressions = check_regressions(slower, baseline)
+        self.assertEqual(len(regressions), 2)
+        self.assertIn('docs_per_sec', regressions[0])
+
+
+@unittest.skipUnless(os.environ.get('PDF_BENCHMARK'), 'set PDF_BENCHMARK=1 to run the PDF benchmark suite')
+class PDFBenchmarkSuiteTest(TestCase):
+    """
+    Full suite against the stored baseline: PDF_BENCHMARK=1 pytest apps/documents/tests.py -k Suite
+    """
+
+    def test_no_regression_against_baseline(self):
+        regressions = check_regressions(run_suite(count=100), load_baseline())
+        self.assertEqual(regressions, [], '\n'.join(regressions))
+
+
+class DocumentJobAPITest(EagerCeleryMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        InstitutionFactory()
+        self.manager = UserFactory(role='manager')
+        self.client.force_authenticate(user=self.manager)
+
+    def test_class_pack_merges_the_class_bulletins(self):
+        bulletins = BulletinFactory.create_batch(2, class_name='1A', academic_year='2024-2025', trimester='T1')
+        for bulletin in bulletins:
+            BulletinSubjectFactory.create_batch(2, bulletin=bulletin)
+        BulletinFactory(class_name='1B', academic_year='2024-2025', trimester='T1')
+
+        params = {'class_name': '1A', 'academic_year': '2024-2025', 'trimester': 'T1', 'language': 'ar'}
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get('/api/documents/bulletins/pack/', params)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job = DocumentJob.objects.get(id=response.data['id'])
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(job.parameters['languages'], ['ar'])
+
+        # Stored once rendered: served without queueing again
+        response = self.client.get('/api/documents/bulletins/pack/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertGreaterEqual(count_pages(b''.join(response.streaming_content)), 2)
+        self.assertEqual(DocumentJob.objects.filter(job_type='bulletin_pack').count(), 1)
+
+        response = self.client.get(f'/api/documents/jobs/{job.id}/download/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # A changed bulletin makes the stored pack stale
+        bulletins[0].save()
+        response = self.client.get('/api/documents/bulletins/pack/', params)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertNotEqual(response.data['id'], job.id)
+
+        response = self.client.get('/api/documents/bulletins/pack/', {'class_name': '1A'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/documents/bulletins/pack/', {
+            'class_name': '9Z', 'academic_year': '2024-2025', 'trimester': 'T1'
+        })
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_bilingual_bulletin_combined_or_queued_as_one_batch(self):
+        bulletin = BulletinFactory(language='fr', document__language='fr')
+        BulletinSubjectFactory.create_batch(2, bulletin=bulletin)
+        url = f'/api/documents/bulletins/{bulletin.id}/bilingual/'
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(DocumentJob.objects.get(id=response.data['id']).status, 'done')
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertGreaterEqual(count_pages(b''.join(response.streaming_content)), 2)
+
+        bulletin_context = BulletinPDFGenerator.bulletin_context
+        with mock.patch.object(
+            BulletinPDFGenerator, 'bulletin_context', autospec=True, side_effect=bulletin_context
+        ) as load:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(load.call_count, 1)
+
+        jobs = DocumentJob.objects.filter(bulletin=bulletin).select_related('document')
+        self.assertEqual({job.language for job in jobs}, {'fr', 'ar'})
+        self.assertEqual(len({job.task_id for job in jobs}), 1)
+        for job in jobs:
+            self.assertEqual(job.status, 'done')
+            self.assertEqual(job.document.language, job.language)
+
+        # Both files up to date: nothing is queued again
+        response = self.client.post(url)
+        self.assertEqual(DocumentJob.objects.filter(bulletin=bulletin).count(), 2)
+        response = self.client.get(f'/api/documents/bulletin/{bulletin.id}/download/?language=ar')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # A bilingual pack of this one bulletin is the combined file already stored
+        pack = self.client.get('/api/documents/bulletins/pack/', {
+            'class_name': bulletin.class_name, 'academic_year': bulletin.academic_year,
+            'trimester': bulletin.trimester, 'language': 'bilingual'
+        })
+        self.assertEqual(pack.status_code, status.HTTP_200_OK)
+        self.assertGreaterEqual(count_pages(b''.join(pack.streaming_content)), 2)
+
+    def test_presence_attestation_is_generated_in_background(self):
+        enrollment = StudentClassFactory()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/documents/attestation-presence/', {
+                'student_id': enrollment.student.id,
+                'language': 'fr',
+            })
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job = DocumentJob.objects.get(id=response.data['id'])
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(job.progress, 100)
+        self.assertGreater(job.document.file_size, 0)
+
+        response = self.client.get(f'/api/documents/jobs/{job.id}/')
+        self.assertEqual(response.data['status'], 'done')
+        self.assertIsNotNone(response.data['download_url'])
+
+        response = self.client.get(f'/api/documents/jobs/{job.id}/download/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+    def test_bulletin_download_queues_then_serves_file(self):
+        bulletin = BulletinFactory(language='fr', document__language='fr')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(f'/api/documents/bulletin/{bulletin.id}/download/?language=fr')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+        response = self.client.get(f'/api/documents/bulletin/{bulletin.id}/download/?language=fr')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(DocumentJob.objects.filter(bulletin=bulletin).count(), 1)
+
+    def test_bulletin_download_in_other_language_gets_own_document(self):
+        bulletin = BulletinFactory(language='fr', document__language='fr')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(f'/api/documents/bulletin/{bulletin.id}/download/?language=ar')
+
+        job = DocumentJob.objects.get(bulletin=bulletin)
+        self.assertEqual(job.document.language, 'ar')
+        self.assertNotEqual(job.document, bulletin.document)
+
+    def test_failed_job_records_error(self):
+        bulletin = BulletinFactory()
+        job = DocumentJob.objects.create(
+            job_type='attestation_presence', language='fr', document=bulletin.document
+        )
+
+        from apps.documents.tasks import generate_document
+        generate_document.delay(job.id)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertTrue(job.error)
+
+    def test_jobs_are_private_to_requester(self):
+        bulletin = BulletinFactory()
+        DocumentJob.objects.create(
+            job_type='bulletin', language='fr', document=bulletin.document,
+            bulletin=bulletin, requested_by=self.manager
+        )
+
+        parent = UserFactory(role='parent')
+        self.client.force_authenticate(user=parent)
+        response = self.client.get('/api/documents/jobs/')
+        self.assertEqual(response.data['count'], 0)
+
+    def test_shared_bulletin_job_is_visible_to_other_parents(self):
+        bulletin = BulletinFactory(language='fr', document__language='fr')
+        first, second = ParentStudentFactory.create_batch(2, student=bulletin.student)
+
+        self.client.force_authenticate(user=first.parent.user)
+        response = self.client.get(f'/api/documents/bulletin/{bulletin.id}/download/?language=fr')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job_id = response.data['id']
+
+        # The second parent is handed the same in-flight job and can poll it
+        self.client.force_authenticate(user=second.parent.user)
+        response = self.client.get(f'/api/documents/bulletin/{bulletin.id}/download/?language=fr')
+        self.assertEqual(response.data['id'], job_id)
+        response = self.client.get(f'/api/documents/jobs/{job_id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.client.force_authenticate(user=bulletin.student.user)
+        response = self.client.get(f'/api/documents/jobs/{job_id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.client.force_authenticate(user=ParentStudentFactory().parent.user)
+        response = self.client.get(f'/api/documents/jobs/{job_id}/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+    def test_teachers_see_the_bulletin_jobs_of_their_classes_only(self):
+        enrollment = StudentClassFactory()
+        class_obj = enrollment.class_obj
+        teacher = ClassSubjectFactory(class_obj=class_obj).teacher
+        taught = BulletinFactory(
+            student=enrollment.student, class_name=class_obj.name, academic_year=class_obj.academic_year.name
+        )
+        elsewhere = BulletinFactory(student=enrollment.student, class_name=f'{class_obj.name} bis')
+        other_student = BulletinFactory(class_name=class_obj.name, academic_year=class_obj.academic_year.name)
+        jobs = [
+            DocumentJob.objects.create(
+                job_type='bulletin', language='fr', document=bulletin.document,
+                bulletin=bulletin, requested_by=self.manager
+            )
+            for bulletin in (taught, elsewhere, other_student)
+        ]
+
+        self.client.force_authenticate(user=teacher.user)
+        response = self.client.get('/api/documents/jobs/')
+        self.assertEqual([job['id'] for job in response.data['results']], [jobs[0].id])
+
+    def test_unsupported_language_is_rejected(self):
+        bulletin = BulletinFactory(class_name='1A', academic_year='2024-2025', trimester='T1')
+        response = self.client.get(f'/api/documents/bulletin/{bulletin.id}/download/?language=xx')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/documents/bulletins/pack/', {
+            'class_name': '1A', 'academic_year': '2024-2025', 'trimester': 'T1', 'language': 'xx'
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(DocumentJob.objects.exists())
+
+
+class DocumentArchiveTest(EagerCeleryMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.bulletins = BulletinFactory.create_batch(3, academic_year='2020-2021')
+        self.contents = {}
+        for i, bulletin in enumerate(self.bulletins):
+            document = bulletin.document
+            self.contents[document.id] = b'%PDF-' + bytes([i]) * 2000
+            document.file_path, document.file_size = save_generated_file(document.file_path, self.contents[document.id])
+            document.save()
+        self.other = AttestationFactory(academic_year='2024-2025')
+        save_generated_file(self.other.document.file_path, b'%PDF-current')
+
+    def archive(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return archive_academic_year('2020-2021')
+
+    def test_year_is_packed_and_files_reclaimed(self):
+        archive = self.archive()
+
+        self.assertEqual(archive.document_count, 3)
+        self.assertLess(archive.packed_size, archive.original_size)
+        storage = document_storage()
+        for bulletin in self.bulletins:
+            document = Document.objects.get(id=bulletin.document.id)
+            self.assertTrue(document.is_archived)
+            self.assertIsNotNone(document.archived_at)
+            self.assertFalse(storage.exists(document.file_path))
+            self.assertEqual(read_archived_document(document), self.contents[document.id])
+
+        self.assertTrue(storage.exists(self.other.document.file_path))
+        self.assertIsNone(Document.objects.get(id=self.other.document.id).archive)
+        self.assertIsNone(self.archive())
+
+    def test_pack_index_matches_rows(self):
+        archive = self.archive()
+        with document_storage().open(archive.file_path, 'rb') as f:
+            index = read_index(f)
+        for document in archive.documents.all():
+            self.assertEqual(index[document.id][:2], (document.archive_offset, document.archive_length))
+
+    def test_shared_blob_is_packed_once(self):
+        blob, created = store_blob(b'%PDF-shared' * 200)
+        documents = [bulletin.document for bulletin in BulletinFactory.create_batch(2, academic_year='2020-2021')]
+        for document in documents:
+            document.blob, document.file_path, document.file_size = blob, blob.file_path, blob.size
+            document.save()
+
+        archive = self.archive()
+        first, second = Document.objects.filter(id__in=[document.id for document in documents])
+        self.assertEqual(archive.document_count, 5)
+        self.assertEqual((first.archive_offset, first.archive_length), (second.archive_offset, second.archive_length))
+        self.assertEqual(read_archived_document(second), b'%PDF-shared' * 200)
+        with document_storage().open(archive.file_path, 'rb') as f:
+            index = read_index(f)
+        # 5 index entries over 4 members
+        self.assertEqual(len(index), 5)
+        self.assertEqual(len({offset for offset, length, size in index.values()}), 4)
+
+    def test_new_run_never_overwrites_earlier_pack(self):
+        first = self.archive()
+        document = BulletinFactory(academic_year='2020-2021').document
+        document.file_path, document.file_size = save_generated_file(document.file_path, b'%PDF-late')
+        document.save()
+
+        second = self.archive()
+        self.assertNotEqual(first.file_path, second.file_path)
+        archived = Document.objects.get(id=self.bulletins[0].document.id)
+        self.assertEqual(read_archived_document(archived), self.contents[archived.id])
+        self.assertEqual(read_archived_document(Document.objects.get(id=document.id)), b'%PDF-late')
+
+    def test_archived_document_download(self):
+        self.archive()
+        self.client.force_authenticate(user=UserFactory(role='manager'))
+        document = self.bulletins[0].document
+
+        response = self.client.get(f'/api/documents/documents/{document.id}/download/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, self.contents[document.id])
+
+    def test_command_refuses_open_year(self):
+        AcademicYearFactory(name='2020-2021', is_current=True)
+        with self.assertRaises(CommandError):
+            call_command('archive_documents', '2020-2021')
+        self.assertFalse(Document.objects.filter(is_archived=True).exists())
+
+
+class DocumentBlobTest(EagerCeleryMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        InstitutionFactory()
+        self.client.force_authenticate(user=UserFactory(role='manager'))
+        self.enrollment = StudentClassFactory()
+
+    def generate_presence(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/documents/attestation-presence/', {
+                'student_id': self.enrollment.student.id,
+                'language': 'fr',
+            })
+        return DocumentJob.objects.get(id=response.data['id']).document
+
+    def test_identical_content_is_stored_once(self):
+        first, created = store_blob(b'%PDF-same')
+        second, created_again = store_blob(b'%PDF-same')
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(first, second)
+        self.assertTrue(first.file_path.startswith(f'blobs/{first.sha256[:2]}/'))
+
+    def test_unchanged_regeneration_skips_render_and_write(self):
+        first = self.generate_presence()
+
+        with mock.patch.object(AttestationPDFGenerator, 'render', autospec=True) as render, \
+                mock.patch('apps.documents.tasks.store_blob') as store:
+            second = self.generate_presence()
+            render.assert_not_called()
+            store.assert_not_called()
+
+        self.assertNotEqual(first, second)
+        self.assertEqual(first.blob, second.blob)
+        self.assertEqual(second.file_path, first.blob.file_path)
+        self.assertEqual(DocumentBlob.objects.count(), 1)
+
+    def test_changed_bulletin_gets_new_blob_and_old_one_is_collected(self):
+        bulletin = BulletinFactory(language='fr', document__language='fr')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(f'/api/documents/bulletin/{bulletin.id}/download/?language=fr')
+        old_blob = Document.objects.get(id=bulletin.document.id).blob
+
+        bulletin.teacher_notes = 'Excellent trimestre.'
+        bulletin.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(f'/api/documents/bulletin/{bulletin.id}/download/?language=fr')
+
+        document = Document.objects.get(id=bulletin.document.id)
+        self.assertNotEqual(document.blob, old_blob)
+        self.assertEqual(Document.objects.filter(bulletin=bulletin).count(), 1)
+
+        self.assertEqual(collect_garbage(grace_period=timedelta(0)), (1, old_blob.size))
+        self.assertFalse(DocumentBlob.objects.filter(id=old_blob.id).exists())
+        self.assertFalse(document_storage().exists(old_blob.file_path))
+        self.assertTrue(document_storage().exists(document.blob.file_path))
+
+
+class ReceiptIssuingTest(EagerCeleryMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        InstitutionFactory()
+        self.client.force_authenticate(user=UserFactory(role='manager'))
+        self.completed = PaymentFactory.create_batch(3, status='completed')
+        self.pending = PaymentFactory(status='pending')
+        self.already_issued = ReceiptFactory(payment__status='completed')
+
+    def assert_issued(self):
+        for payment in self.completed:
+            receipt = Receipt.objects.get(payment=payment)
+            with document_storage().open(receipt.file_path, 'rb') as f:
+                self.assertTrue(f.read().startswith(b'%PDF'))
+        self.assertFalse(Receipt.objects.filter(payment=self.pending).exists())
+        self.assertEqual(Receipt.objects.count(), 4)
+
+    def test_batch_renders_in_process_with_one_worker(self):
+        self.assertEqual(issue_receipts(language='ar', workers=1), 3)
+        self.assert_issued()
+
+    def test_batch_renders_in_process_inside_a_transaction(self):
+        with render_pool(2) as pool:
+            self.assertIsNone(pool)
+        self.assertEqual(issue_receipts(workers=2, batch_size=2), 3)
+        self.assert_issued()
+
+    def test_receipts_issued_meanwhile_by_another_run_are_skipped(self):
+        receipts = [Receipt(payment=payment, receipt_number=f'RCP-T-{payment.id}') for payment in self.completed]
+        ReceiptFactory(payment=self.completed[0])
+
+        self.assertEqual(store_receipts(receipts, [b'%PDF-1'] * 3), 2)
+        self.assertEqual(Receipt.objects.filter(payment__in=self.completed).count(), 3)
+        self.assertFalse(Receipt.objects.filter(receipt_number=f'RCP-T-{self.completed[0].id}').exists())
+
+    def test_receipt_generator_renders_arabic(self):
+        receipt = ReceiptFactory.build(payment=self.completed[0])
+        content = ReceiptPDFGenerator(language='ar').build_receipt(receipt, 'ar')
+        self.assertTrue(content.startswith(b'%PDF'))
+
+    def test_issue_endpoint_queues_pending_receipts(self):
+        response = self.client.post('/api/finance/receipts/issue/', {'language': 'fr'})
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['pending'], 3)
+        self.assert_issued()
+
+        response = self.client.post('/api/finance/receipts/issue/', {'language': 'xx'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ReceiptRenderPoolTest(EagerCeleryMixin, APITransactionTestCase):
+    """
+    Transactional: the pool is only forked outside a transaction
+    """
+
+    def setUp(self):
+        super().setUp()
+        InstitutionFactory()
+        self.completed = PaymentFactory.create_batch(3, status='completed')
+
+    def test_batch_issues_missing_receipts_in_parallel(self):
+        self.assertEqual(issue_receipts(workers=2, batch_size=2), 3)
+        for payment in self.completed:
+            receipt = Receipt.objects.get(payment=payment)
+            with document_storage().open(receipt.file_path, 'rb') as f:
+                self.assertTrue(f.read().startswith(b'%PDF'))
+        self.assertEqual(issue_receipts(workers=2), 0)
+
+    def test_celery_worker_renders_in_process(self):
+        with mock.patch('apps.documents.receipts.current_billiard_process') as billiard_process:
+            billiard_process.return_value.daemon = True
+            with render_pool(2) as pool:
+                self.assertIsNone(pool)
+
+
+class BulkPresenceAttestationTest(EagerCeleryMixin, APITestCase):
+    url = '/api/documents/attestation-presence/bulk/'
+
+    def setUp(self):
+        super().setUp()
+        InstitutionFactory()
+        self.client.force_authenticate(user=UserFactory(role='manager'))
+        self.class_obj = ClassFactory()
+        self.enrollments = StudentClassFactory.create_batch(3, class_obj=self.class_obj, is_active=True)
+        StudentClassFactory(class_obj=self.class_obj, is_active=False)
+
+    def test_issues_and_renders_attestations_for_the_class(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, {'class_id': self.class_obj.id, 'language': 'fr'})
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['count'], 3)
+
+        jobs = DocumentJob.objects.filter(id__in=response.data['jobs']).select_related('document', 'attestation')
+        self.assertEqual({job.attestation.student_id for job in jobs}, {e.student_id for e in self.enrollments})
+        for job in jobs:
+            self.assertEqual(job.status, 'done')
+            self.assertEqual(job.attestation.class_name, self.class_obj.name)
+            self.assertEqual(job.attestation.document, job.document)
+            self.assertTrue(document_storage().exists(job.document.file_path))
+        self.assertEqual(len({job.task_id for job in jobs}), 1)
+
+    def test_query_count_does_not_grow_with_class_size(self):
+        def queries_for(class_obj):
+            with self.captureOnCommitCallbacks(execute=False):
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.post(self.url, {'class_id': class_obj.id})
+            return len(queries)
+
+        larger = ClassFactory()
+        StudentClassFactory.create_batch(8, class_obj=larger, is_active=True)
+        self.assertEqual(queries_for(self.class_obj), queries_for(larger))
+
+    def test_student_subset_and_errors(self):
+        subset = [self.enrollments[0].student_id]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, {'class_id': self.class_obj.id, 'student_ids': subset}, format='json')
+        self.assertEqual(response.data['count'], 1)
+
+        self.assertEqual(self.client.post(self.url, {}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post(self.url, {'class_id': 0}).status_code, status.HTTP_404_NOT_FOUND)
+        empty = ClassFactory()
+        self.assertEqual(self.client.post(self.url, {'class_id': empty.id}).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RefusingEmailBackend(EmailBackend):
+    """
+    locmem backend refusing some recipients, and counting opened connections
+    """
+    refused = set()
+    opened = 0
+
+    def open(self):
+        RefusingEmailBackend.opened += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        for message in messages:
+            if set(message.to) & self.refused:
+                raise smtplib.SMTPRecipientsRefused({message.to[0]: (550, b'Mailbox unavailable')})
+        return super().send_messages(messages)
+
+
+@override_settings(BULLETIN_MAIL_RATE=0)
+class BulletinDistributionTest(EagerCeleryMixin, APITestCase):
+    url = '/api/documents/bulletins/distribute/'
+
+    def setUp(self):
+        super().setUp()
+        InstitutionFactory()
+        self.client.force_authenticate(user=UserFactory(role='manager'))
+        self.bulletins = BulletinFactory.create_batch(
+            3, class_name='1A', academic_year='2024-2025', trimester='T1', language='fr'
+        )
+        for bulletin in self.bulletins:
+            BulletinSubjectFactory.create_batch(2, bulletin=bulletin)
+        ParentStudentFactory.create_batch(2, student=self.bulletins[0].student)
+        ParentStudentFactory(student=self.bulletins[1].student)
+        ParentStudentFactory(student=self.bulletins[2].student, parent__user__email='')
+        self.params = {'academic_year': '2024-2025', 'trimester': 'T1', 'class_name': '1A', 'language': 'fr'}
+
+    def test_parents_are_mailed_once_with_the_stored_pdf(self):
+        # Bulletin 0 is already rendered: its stored file is attached, bulletin 1 is rendered for the mail
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(f'/api/documents/bulletin/{self.bulletins[0].id}/download/?language=fr')
+        stored = DocumentJob.objects.get(bulletin=self.bulletins[0]).document
+
+        build_bulletin = BulletinPDFGenerator.build_bulletin
+        with mock.patch.object(
+            BulletinPDFGenerator, 'build_bulletin', autospec=True, side_effect=build_bulletin
+        ) as render:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(self.url, self.params)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['queued'], 3)
+        self.assertEqual(render.call_count, 1)
+
+        self.assertEqual(len(mail.outbox), 3)
+        with document_storage().open(stored.file_path, 'rb') as f:
+            stored_content = f.read()
+        for message in mail.outbox:
+            filename, content, mimetype = message.attachments[0]
+            self.assertEqual(mimetype, 'application/pdf')
+            self.assertTrue(content.startswith(b'%PDF'))
+        self.assertEqual(
+            sum(message.attachments[0][1] == stored_content for message in mail.outbox), 2
+        )
+        self.assertEqual(set(BulletinDelivery.objects.values_list('status', flat=True)), {'sent'})
+
+        # Already mailed parents are not queued again
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, self.params)
+        self.assertEqual(response.data['queued'], 0)
+        self.assertEqual(len(mail.outbox), 3)
+
+        response = self.client.get('/api/documents/deliveries/', {'bulletin': self.bulletins[0].id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+
+    def test_parents_are_resolved_in_constant_queries(self):
+        def queries_for(bulletins):
+            with CaptureQueriesContext(connection) as queries:
+                queue_deliveries(bulletins)
+            return len(queries)
+
+        others = BulletinFactory.create_batch(6, academic_year='2024-2025', trimester='T2')
+        for bulletin in others:
+            ParentStudentFactory(student=bulletin.student)
+        small = queries_for(Bulletin.objects.filter(trimester='T1'))
+        self.assertEqual(queries_for(Bulletin.objects.filter(trimester='T2')), small)
+        self.assertEqual(BulletinDelivery.objects.filter(bulletin__trimester='T2').count(), 6)
+
+    def test_refused_recipient_is_retried_then_failed(self):
+        queue_deliveries(Bulletin.objects.all(), 'ar')
+        refused = BulletinDelivery.objects.filter(bulletin=self.bulletins[1]).get()
+        RefusingEmailBackend.refused = {refused.email}
+        RefusingEmailBackend.opened = 0
+        backend = RefusingEmailBackend()
+
+        counts = send_deliveries(batch_size=2, max_attempts=2, connection=backend)
+        self.assertEqual(counts, {'sent': 2, 'failed': 0, 'retrying': 1})
+        # One connection for the whole run, across batches
+        self.assertEqual(RefusingEmailBackend.opened, 1)
+        refused.refresh_from_db()
+        self.assertEqual((refused.status, refused.attempts), ('pending', 1))
+        self.assertIn('Mailbox unavailable', refused.error)
+
+        # Not due yet
+        self.assertEqual(send_deliveries(max_attempts=2, connection=backend)['retrying'], 0)
+
+        BulletinDelivery.objects.filter(id=refused.id).update(next_attempt_at=timezone.now())
+        counts = send_deliveries(max_attempts=2, connection=backend)
+        self.assertEqual(counts, {'sent': 0, 'failed': 1, 'retrying': 0})
+        refused.refresh_from_db()
+        self.assertEqual((refused.status, refused.attempts), ('failed', 2))
+
+        out = StringIO()
+        call_command('distribute_bulletins', '2024-2025', 'T1', '--queue-only', stdout=out)
+        self.assertIn('1 deliveries queued', out.getvalue())
+
+    def test_crashed_run_keeps_sent_statuses_and_releases_its_claim(self):
+        queue_deliveries(Bulletin.objects.all(), 'fr')
+
+        class WorkerLost(BaseException):
+            pass
+
+        with mock.patch.object(RateLimiter, 'wait', side_effect=[None, WorkerLost()]):
+            with self.assertRaises(WorkerLost):
+                send_deliveries(batch_size=3, connection=EmailBackend())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(BulletinDelivery.objects.filter(status='sent').count(), 1)
+
+        # The rest of the claimed batch is skipped by other runs until the claim expires
+        self.assertEqual(send_deliveries(connection=EmailBackend())['sent'], 0)
+        BulletinDelivery.objects.filter(status='pending').update(next_attempt_at=timezone.now())
+        self.assertEqual(send_deliveries(connection=EmailBackend())['sent'], 2)
+        self.assertEqual(len(mail.outbox), 3)
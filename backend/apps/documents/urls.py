@@ -6,10 +6,13 @@ router = DefaultRouter()
 router.register(r'documents', views.DocumentViewSet)
 router.register(r'bulletins', views.BulletinViewSet)
 router.register(r'attestations', views.AttestationViewSet)
+router.register(r'jobs', views.DocumentJobViewSet)
+router.register(r'deliveries', views.BulletinDeliveryViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
     path('attestation-presence/', views.GeneratePresenceAttestationView.as_view(), name='attestation-presence'),
+    path('attestation-presence/bulk/', views.BulkPresenceAttestationView.as_view(), name='attestation-presence-bulk'),
     path('attestation-inscription/', views.GenerateInscriptionAttestationView.as_view(), name='attestation-inscription'),
     path('bulletin/<int:bulletin_id>/download/', views.DownloadBulletinView.as_view(), name='download-bulletin'),
 ]
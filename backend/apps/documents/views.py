@@ -2,16 +2,146 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from django.http import HttpResponse
-from django.utils.translation import gettext_lazy as _
-from django.db.models import Q
+from django.db import transaction
+from django.utils.text import slugify
+from django.db.models import F, Q
 
-from .models import Document, Bulletin, BulletinSubject, Attestation
-from .serializers import DocumentSerializer, BulletinSerializer, BulletinSubjectSerializer, AttestationSerializer
-from .pdf_generator import BulletinPDFGenerator, AttestationPDFGenerator
+from .models import Document, Bulletin, BulletinSubject, Attestation, DocumentJob, BulletinDelivery
+from .serializers import (
+    DocumentSerializer, BulletinSerializer, BulletinSubjectSerializer,
+    AttestationSerializer, DocumentJobSerializer, BulletinDeliverySerializer
+)
+from .archive import serve_archived_document
+from .distribution import queue_deliveries
+from .pdf_generator import BILINGUAL_LANGUAGES
+from .storage import serve_generated_file
+from .tasks import enqueue_document_job, enqueue_document_batch, send_bulletin_mails
 from apps.accounts.permissions import IsManagerOrAdministrator, CanViewStudentData
 from apps.accounts.models import Student
-from apps.academics.models import Grade, Attendance, ClassSubject
+from apps.academics.models import Class, StudentClass
+
+
+def serve_document_file(request, document):
+    """
+    Deliver a generated document file from storage, or from its archive pack
+    """
+    if document.archive_id:
+        return serve_archived_document(request, document)
+    return serve_generated_file(request, document.file_path)
+
+
+def serve_job_file(request, job):
+    """
+    Deliver the file a done job produced: its document, or its merged pack
+    """
+    if job.document_id is None:
+        return serve_generated_file(request, job.file_path)
+    return serve_document_file(request, job.document)
+
+
+def queue_document_job(request, job_type, language, document, bulletin=None, attestation=None):
+    """
+    Create a document job and queue it for the background worker
+    """
+    job = DocumentJob.objects.create(
+        job_type=job_type,
+        language=language,
+        document=document,
+        bulletin=bulletin,
+        attestation=attestation,
+        requested_by=request.user
+    )
+    enqueue_document_job(job)
+    return job
+
+
+def job_accepted_response(request, job):
+    """
+    202 response pointing the client at the job resource to poll
+    """
+    serializer = DocumentJobSerializer(job, context={'request': request})
+    return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+
+def current_bulletin_job(bulletin, language):
+    """
+    Latest usable job rendering a bulletin in a language, and whether its file is up to date
+    """
+    job = DocumentJob.objects.filter(
+        bulletin=bulletin, language=language
+    ).exclude(status='failed').select_related('document').first()
+    return job, bool(job and job.status == 'done' and job.finished_at >= bulletin.updated_at)
+
+
+def new_bulletin_job(request, bulletin, language, job=None):
+    """
+    Create (without queueing) the job rendering a bulletin in a language,
+    reusing the document of the previous rendering when there is one
+    """
+    if job is not None:
+        document = job.document
+    elif bulletin.document.language == language:
+        document = bulletin.document
+    else:
+        document = Document.objects.create(
+            student=bulletin.student,
+            document_type='bulletin',
+            language=language,
+            title=bulletin.document.title,
+            file_path=f"bulletins/bulletin_{bulletin.id}_{language}.pdf"
+        )
+    return DocumentJob.objects.create(
+        job_type='bulletin',
+        language=language,
+        document=document,
+        bulletin=bulletin,
+        requested_by=request.user
+    )
+
+
+def bulletin_document_response(request, bulletin, language):
+    """
+    Serve the stored bulletin PDF, or queue its generation and return the job
+    """
+    if language not in dict(Document.LANGUAGE_CHOICES):
+        return Response({'error': f'Unsupported language: {language}'}, status=status.HTTP_400_BAD_REQUEST)
+    job, up_to_date = current_bulletin_job(bulletin, language)
+    
+    if up_to_date:
+        return serve_document_file(request, job.document)
+    
+    if job is None or job.status == 'done':
+        # Nothing rendered yet, or the bulletin changed since the last rendering
+        with transaction.atomic():
+            job = enqueue_document_job(new_bulletin_job(request, bulletin, language, job))
+    
+    return job_accepted_response(request, job)
+
+
+def bulletin_pack_response(request, bulletins, languages, file_path, filename):
+    """
+    Serve the stored PDF merging these bulletins, or queue its rendering and
+    return the job. A pack is reused until one of its bulletins changes.
+    """
+    parameters = {'bulletins': [bulletin.id for bulletin in bulletins], 'languages': list(languages)}
+    job = DocumentJob.objects.filter(
+        job_type='bulletin_pack', parameters=parameters
+    ).exclude(status='failed').first()
+    
+    if job and job.status == 'done' and job.finished_at >= max(bulletin.updated_at for bulletin in bulletins):
+        return serve_generated_file(request, job.file_path, filename)
+    
+    if job is None or job.status == 'done':
+        with transaction.atomic():
+            job = enqueue_document_job(DocumentJob.objects.create(
+                job_type='bulletin_pack',
+                language=parameters['languages'][0],
+                parameters=parameters,
+                file_path=file_path,
+                requested_by=request.user
+            ))
+    
+    return job_accepted_response(request, job)
 
 
 class DocumentViewSet(viewsets.ModelViewSet):
@@ -21,6 +151,16 @@ class DocumentViewSet(viewsets.ModelViewSet):
     filter_backends = []
     search_fields = ['title', 'student__user__first_name', 'student__user__last_name']
     ordering = ['-generated_at']
+    
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """
+        Download the stored document file
+        """
+        document = self.get_object()
+        if not document.file_size:
+            return Response({'error': 'Document has not been generated yet'}, status=status.HTTP_404_NOT_FOUND)
+        return serve_document_file(request, document)
 
 
 class BulletinViewSet(viewsets.ModelViewSet):
@@ -39,8 +179,91 @@ class BulletinViewSet(viewsets.ModelViewSet):
         bulletin = self.get_object()
         language = request.query_params.get('language', 'fr')
         
-        generator = BulletinPDFGenerator(language=language)
-        return generator.generate_bulletin(bulletin.id, language)
+        return bulletin_document_response(request, bulletin, language)
+    
+    @action(detail=False, methods=['get'])
+    def pack(self, request):
+        """
+        Download the bulletins of a class and trimester merged into one PDF,
+        rendered in the background: 202 with the job to poll until it is stored
+        """
+        params = request.query_params
+        language = params.get('language', 'fr')
+        if language != 'bilingual' and language not in dict(Document.LANGUAGE_CHOICES):
+            return Response({'error': f'Unsupported language: {language}'}, status=status.HTTP_400_BAD_REQUEST)
+        # language=bilingual: each bulletin in French followed by Arabic
+        languages = BILINGUAL_LANGUAGES if language == 'bilingual' else (language,)
+        missing = [name for name in ('class_name', 'academic_year', 'trimester') if not params.get(name)]
+        if missing:
+            return Response({'error': f"{', '.join(missing)} required"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        bulletins = list(Bulletin.objects.filter(
+            class_name=params['class_name'],
+            academic_year=params['academic_year'],
+            trimester=params['trimester']
+        ).only('id', 'updated_at').order_by(
+            'student__user__last_name', 'student__user__first_name', 'id'
+        ))
+        if not bulletins:
+            return Response({'error': 'No bulletin found for this class'}, status=status.HTTP_404_NOT_FOUND)
+        
+        name = f"bulletins_{params['class_name']}_{params['academic_year']}_{params['trimester']}_{language}"
+        return bulletin_pack_response(
+            request, bulletins, languages, f"packs/{slugify(name, allow_unicode=True)}.pdf", f"{name}.pdf"
+        )
+    
+    @action(detail=True, methods=['get', 'post'])
+    def bilingual(self, request, pk=None):
+        """
+        French and Arabic versions of a bulletin from one load of its data,
+        rendered in the background. GET serves them combined into one PDF
+        once stored (202 with the job until then); POST queues the two files
+        in a single batch job and returns the jobs to poll.
+        """
+        bulletin = self.get_object()
+        
+        if request.method == 'GET':
+            student_id = bulletin.student.student_id
+            filename = f"bulletin_{student_id}_{bulletin.academic_year}_{bulletin.trimester}_bilingual.pdf"
+            return bulletin_pack_response(
+                request, [bulletin], BILINGUAL_LANGUAGES, f"bulletins/bulletin_{bulletin.id}_bilingual.pdf", filename
+            )
+        
+        jobs, queued = [], []
+        with transaction.atomic():
+            for language in BILINGUAL_LANGUAGES:
+                job, up_to_date = current_bulletin_job(bulletin, language)
+                if not up_to_date and (job is None or job.status == 'done'):
+                    job = new_bulletin_job(request, bulletin, language, job)
+                    queued.append(job)
+                jobs.append(job)
+            if queued:
+                enqueue_document_batch(queued)
+        
+        serializer = DocumentJobSerializer(jobs, many=True, context={'request': request})
+        return Response({'jobs': serializer.data}, status=status.HTTP_202_ACCEPTED)
+    
+    @action(detail=False, methods=['post'])
+    def distribute(self, request):
+        """
+        Mail the bulletins of a trimester (optionally of one class) to the
+        students' parents, in the background
+        """
+        data = request.data
+        missing = [name for name in ('academic_year', 'trimester') if not data.get(name)]
+        if missing:
+            return Response({'error': f"{', '.join(missing)} required"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        bulletins = Bulletin.objects.filter(academic_year=data['academic_year'], trimester=data['trimester'])
+        if data.get('class_name'):
+            bulletins = bulletins.filter(class_name=data['class_name'])
+        
+        with transaction.atomic():
+            queued = queue_deliveries(bulletins, data.get('language') or None)
+            if queued:
+                transaction.on_commit(send_bulletin_mails.delay)
+        
+        return Response({'queued': queued}, status=status.HTTP_202_ACCEPTED)
 
 
 class BulletinSubjectViewSet(viewsets.ModelViewSet):
@@ -63,16 +286,81 @@ class AttestationViewSet(viewsets.ModelViewSet):
         Download attestation PDF
         """
         attestation = self.get_object()
-        language = request.query_params.get('language', 'fr')
         
-        generator = AttestationPDFGenerator(language=language)
+        if attestation.attestation_type not in ('presence', 'inscription'):
+            return Response({'error': 'Invalid attestation type'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        job = attestation.jobs.exclude(status='failed').select_related('document').first()
+        if job and job.status == 'done':
+            return serve_document_file(request, job.document)
         
-        if attestation.attestation_type == 'presence':
-            return generator.generate_presence_attestation(attestation.id, language)
-        elif attestation.attestation_type == 'inscription':
-            return generator.generate_inscription_attestation(attestation.id, language)
+        if job is None:
+            with transaction.atomic():
+                job = queue_document_job(
+                    request, attestation.document.document_type, attestation.language,
+                    attestation.document, attestation=attestation
+                )
+        return job_accepted_response(request, job)
+
+
+class BulletinDeliveryViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Delivery status of mailed bulletins, per parent
+    """
+    queryset = BulletinDelivery.objects.all()
+    serializer_class = BulletinDeliverySerializer
+    permission_classes = [permissions.IsAuthenticated, IsManagerOrAdministrator]
+    filter_backends = []
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        for name in ('bulletin', 'status'):
+            value = self.request.query_params.get(name)
+            if value:
+                queryset = queryset.filter(**{name: value})
+        return queryset
+
+
+class DocumentJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Document generation jobs: poll status and download the result
+    """
+    queryset = DocumentJob.objects.select_related('document')
+    serializer_class = DocumentJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = []
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if user.is_administrator or user.is_manager:
+            return queryset
         
-        return Response({'error': 'Invalid attestation type'}, status=status.HTTP_400_BAD_REQUEST)
+        # Jobs are shared by everyone downloading the same document: besides
+        # their own, users see the jobs of the bulletins they may download
+        visible = Q(requested_by=user)
+        if user.is_teacher:
+            # Bulletins of the classes they teach: the student's enrollment in that class and year
+            visible |= Q(
+                bulletin__student__enrollments__class_obj__subjects__teacher__user=user,
+                bulletin__student__enrollments__class_obj__name=F('bulletin__class_name'),
+                bulletin__student__enrollments__class_obj__academic_year__name=F('bulletin__academic_year'),
+            )
+        elif user.is_parent:
+            visible |= Q(bulletin__student__parents__parent__user=user)
+        elif user.is_student:
+            visible |= Q(bulletin__student__user=user)
+        return queryset.filter(visible).distinct()
+    
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """
+        Download the generated PDF once the job is done
+        """
+        job = self.get_object()
+        if job.status != 'done':
+            return Response({'error': 'Document is not ready', 'status': job.status}, status=status.HTTP_409_CONFLICT)
+        return serve_job_file(request, job)
 
 
 class GeneratePresenceAttestationView(APIView):
@@ -96,33 +384,33 @@ class GeneratePresenceAttestationView(APIView):
             if not current_enrollment:
                 return Response({'error': 'Student is not currently enrolled'}, status=status.HTTP_400_BAD_REQUEST)
             
-            # Create attestation
-            attestation = Attestation.objects.create(
-                student=student,
-                attestation_type='presence',
-                language=language,
-                academic_year=current_enrollment.class_obj.academic_year.name,
-                class_name=current_enrollment.class_obj.name,
-                level_name=current_enrollment.class_obj.level.name,
-                valid_from=request.data.get('valid_from'),
-                valid_until=request.data.get('valid_until')
-            )
-            
-            # Create document record
-            document = Document.objects.create(
-                student=student,
-                document_type='attestation_presence',
-                language=language,
-                title=f"Attestation de Présence - {student.user.get_full_name()}",
-                file_path=f"attestations/presence_{student.student_id}_{language}.pdf"
-            )
-            
-            attestation.document = document
-            attestation.save()
+            with transaction.atomic():
+                # Create document record
+                document = Document.objects.create(
+                    student=student,
+                    document_type='attestation_presence',
+                    language=language,
+                    title=f"Attestation de Présence - {student.user.get_full_name()}",
+                    file_path=f"attestations/presence_{student.student_id}_{language}.pdf"
+                )
+                
+                # Create attestation
+                attestation = Attestation.objects.create(
+                    student=student,
+                    attestation_type='presence',
+                    language=language,
+                    academic_year=current_enrollment.class_obj.academic_year.name,
+                    class_name=current_enrollment.class_obj.name,
+                    level_name=current_enrollment.class_obj.level.name,
+                    valid_from=request.data.get('valid_from'),
+                    valid_until=request.data.get('valid_until'),
+                    document=document
+                )
+                
+                # Generate PDF in the background
+                job = queue_document_job(request, 'attestation_presence', language, document, attestation=attestation)
             
-            # Generate PDF
-            generator = AttestationPDFGenerator(language=language)
-            return generator.generate_presence_attestation(attestation.id, language)
+            return job_accepted_response(request, job)
             
         except Student.DoesNotExist:
             return Response({'error': 'Student not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -130,6 +418,85 @@ class GeneratePresenceAttestationView(APIView):
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class BulkPresenceAttestationView(APIView):
+    """
+    Issue Attestations de Présence for a whole class in one request
+    """
+    permission_classes = [permissions.IsAuthenticated, IsManagerOrAdministrator]
+    
+    def post(self, request):
+        class_id = request.data.get('class_id')
+        student_ids = request.data.get('student_ids')
+        language = request.data.get('language', 'fr')
+        
+        if not class_id:
+            return Response({'error': 'class_id is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if language not in dict(Document.LANGUAGE_CHOICES):
+            return Response({'error': f'Unsupported language: {language}'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            class_obj = Class.objects.select_related('academic_year', 'level').get(id=class_id)
+        except Class.DoesNotExist:
+            return Response({'error': 'Class not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        # All active enrollments of the class and their students in one query
+        enrollments = StudentClass.objects.filter(
+            class_obj=class_obj, is_active=True
+        ).select_related('student__user').order_by('student__student_id')
+        if student_ids:
+            enrollments = enrollments.filter(student_id__in=student_ids)
+        students = [enrollment.student for enrollment in enrollments]
+        if not students:
+            return Response({'error': 'No student is currently enrolled in this class'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            with transaction.atomic():
+                documents = Document.objects.bulk_create([
+                    Document(
+                        student=student,
+                        document_type='attestation_presence',
+                        language=language,
+                        title=f"Attestation de Présence - {student.user.get_full_name()}",
+                        file_path=f"attestations/presence_{student.student_id}_{language}.pdf"
+                    )
+                    for student in students
+                ])
+                attestations = Attestation.objects.bulk_create([
+                    Attestation(
+                        student=student,
+                        attestation_type='presence',
+                        language=language,
+                        academic_year=class_obj.academic_year.name,
+                        class_name=class_obj.name,
+                        level_name=class_obj.level.name,
+                        valid_from=request.data.get('valid_from'),
+                        valid_until=request.data.get('valid_until'),
+                        document=document
+                    )
+                    for student, document in zip(students, documents)
+                ])
+                jobs = DocumentJob.objects.bulk_create([
+                    DocumentJob(
+                        job_type='attestation_presence',
+                        language=language,
+                        document=document,
+                        attestation=attestation,
+                        requested_by=request.user
+                    )
+                    for document, attestation in zip(documents, attestations)
+                ])
+                
+                # Render all PDFs in one background batch
+                enqueue_document_batch(jobs)
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        return Response({
+            'count': len(jobs),
+            'jobs': [job.id for job in jobs],
+        }, status=status.HTTP_202_ACCEPTED)
+
+
 class GenerateInscriptionAttestationView(APIView):
     """
     Generate Attestation d'Inscription
@@ -160,35 +527,35 @@ class GenerateInscriptionAttestationView(APIView):
             if existing_attestation:
                 return Response({'error': 'Inscription attestation already exists for this student'}, status=status.HTTP_400_BAD_REQUEST)
             
-            # Create attestation
-            attestation = Attestation.objects.create(
-                student=student,
-                attestation_type='inscription',
-                language=language,
-                academic_year=current_enrollment.class_obj.academic_year.name,
-                class_name=current_enrollment.class_obj.name,
-                level_name=current_enrollment.class_obj.level.name
-            )
-            
-            # Create document record
-            document = Document.objects.create(
-                student=student,
-                document_type='attestation_inscription',
-                language=language,
-                title=f"Attestation d'Inscription - {student.user.get_full_name()}",
-                file_path=f"attestations/inscription_{student.student_id}_{language}.pdf"
-            )
-            
-            attestation.document = document
-            attestation.save()
-            
-            # Archive student (mark as archived)
-            student.is_archived = True
-            student.save()
+            with transaction.atomic():
+                # Create document record
+                document = Document.objects.create(
+                    student=student,
+                    document_type='attestation_inscription',
+                    language=language,
+                    title=f"Attestation d'Inscription - {student.user.get_full_name()}",
+                    file_path=f"attestations/inscription_{student.student_id}_{language}.pdf"
+                )
+                
+                # Create attestation
+                attestation = Attestation.objects.create(
+                    student=student,
+                    attestation_type='inscription',
+                    language=language,
+                    academic_year=current_enrollment.class_obj.academic_year.name,
+                    class_name=current_enrollment.class_obj.name,
+                    level_name=current_enrollment.class_obj.level.name,
+                    document=document
+                )
+                
+                # Archive student (mark as archived)
+                student.is_archived = True
+                student.save()
+                
+                # Generate PDF in the background
+                job = queue_document_job(request, 'attestation_inscription', language, document, attestation=attestation)
             
-            # Generate PDF
-            generator = AttestationPDFGenerator(language=language)
-            return generator.generate_inscription_attestation(attestation.id, language)
+            return job_accepted_response(request, job)
             
         except Student.DoesNotExist:
             return Response({'error': 'Student not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -220,8 +587,7 @@ class DownloadBulletinView(APIView):
                     if bulletin.student.user != request.user:
                         return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
             
-            generator = BulletinPDFGenerator(language=language)
-            return generator.generate_bulletin(bulletin.id, language)
+            return bulletin_document_response(request, bulletin, language)
             
         except Bulletin.DoesNotExist:
             return Response({'error': 'Bulletin not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -1,24 +1,24 @@
 from django.contrib import admin
 from django.utils.translation import gettext_lazy as _
-from .models import Invoice, Payment, Receipt, Expense, FinancialReport
+from .models import Invoice, Payment, Receipt, Expense, FinancialReport, LedgerDay
 
 
 @admin.register(Invoice)
 class InvoiceAdmin(admin.ModelAdmin):
-    list_display = ('invoice_number', 'invoice_type', 'student', 'amount', 'due_date', 'status', 'manager')
+    list_display = ('invoice_number', 'invoice_type', 'student', 'amount', 'balance_due', 'due_date', 'status', 'manager')
     list_filter = ('invoice_type', 'status', 'due_date', 'created_at')
     search_fields = ('invoice_number', 'student__user__first_name', 'student__user__last_name', 'description')
     ordering = ('-created_at',)
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('amount_paid', 'balance_due', 'created_at', 'updated_at')
 
 
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
-    list_display = ('invoice', 'amount', 'payment_method', 'payment_date', 'status')
-    list_filter = ('payment_method', 'status', 'payment_date')
-    search_fields = ('invoice__invoice_number', 'reference_number')
+    list_display = ('invoice', 'amount', 'payment_method', 'payment_date', 'status', 'reconciled_at')
+    list_filter = ('payment_method', 'status', 'payment_date', 'reconciled_at')
+    search_fields = ('invoice__invoice_number', 'reference_number', 'statement_reference')
     ordering = ('-payment_date',)
-    readonly_fields = ('created_at',)
+    readonly_fields = ('reconciled_at', 'statement_reference', 'created_at')
 
 
 @admin.register(Receipt)
@@ -44,4 +44,12 @@ class FinancialReportAdmin(admin.ModelAdmin):
     list_filter = ('report_type', 'generated_at')
     search_fields = ('title',)
     ordering = ('-generated_at',)
-    readonly_fields = ('generated_at', 'net_profit')
\ No newline at end of file
+    readonly_fields = ('generated_at', 'net_profit')
+
+
+@admin.register(LedgerDay)
+class LedgerDayAdmin(admin.ModelAdmin):
+    list_display = ('date', 'entry_type', 'category', 'payment_method', 'total', 'count')
+    list_filter = ('entry_type', 'category', 'payment_method')
+    date_hierarchy = 'date'
+    ordering = ('-date',)
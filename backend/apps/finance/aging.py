@@ -0,0 +1,157 @@
+"""
+Accounts-receivable aging.
+
+Open tuition invoices (pending or overdue with a balance left) are bucketed
+by days past their due date: current, 1-30, 31-60, 61-90 and 90+. All
+buckets of all classes come from one query: each invoice is tagged with its
+student's current class by a correlated subquery, and every bucket is a
+filtered SUM over the indexed balance and due date columns. Levels
+are summed from their classes.
+
+The report is cached for FINANCE_AGING_CACHE_SECONDS; the same bucket and
+class filters drill down to the invoices (aging_invoices).
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+from apps.academics.models import Class, StudentClass
+
+from .models import Invoice
+
+ZERO = Decimal('0.00')
+
+# (key, first day overdue, last day overdue)
+BUCKETS = [
+    ('current', None, 0),
+    ('1_30', 1, 30),
+    ('31_60', 31, 60),
+    ('61_90', 61, 90),
+    ('90_plus', 91, None),
+]
+
+AGING_CACHE_KEY = 'finance:aging:{date}'
+
+
+def bucket_filter(key, today):
+    """
+    Q of the invoices that are in an aging bucket on the given day
+    """
+    for bucket, first, last in BUCKETS:
+        if bucket == key:
+            q = Q()
+            if first is not None:
+                q &= Q(due_date__lte=today - timedelta(days=first))
+            if last is not None:
+                q &= Q(due_date__gte=today - timedelta(days=last))
+            return q
+    raise ValueError(f'Unknown aging bucket: {key}')
+
+
+def open_receivables(queryset=None):
+    """
+    Open tuition invoices, tagged with their student's current class (class_id, None if not enrolled)
+    """
+    current_class = StudentClass.objects.filter(
+        student=OuterRef('student'), is_active=True
+    ).order_by('-enrollment_date', '-id').values('class_obj')[:1]
+    queryset = Invoice.objects.all() if queryset is None else queryset
+    return queryset.filter(
+        invoice_type='tuition', status__in=('pending', 'overdue'), balance_due__gt=0
+    ).annotate(class_id=Subquery(current_class))
+
+
+def bucket_totals(row):
+    return {key: f"{row[key] or ZERO:.2f}" for key, first, last in BUCKETS}
+
+
+def aging_report(today=None):
+    """
+    Receivables by aging bucket: overall, by class and by level, JSON-ready
+    """
+    today = today or timezone.localdate()
+    aggregates = {'total': Sum('balance_due'), 'invoice_count': Count('id')}
+    for key, first, last in BUCKETS:
+        aggregates[key] = Sum('balance_due', filter=bucket_filter(key, today))
+
+    rows = list(open_receivables().values('class_id').annotate(**aggregates).order_by())
+    classes = Class.objects.select_related('level').in_bulk([row['class_id'] for row in rows if row['class_id']])
+
+    by_class, by_level = [], {}
+    totals = dict.fromkeys([key for key, first, last in BUCKETS] + ['total'], ZERO)
+    invoice_count = 0
+    for row in rows:
+        class_obj = classes.get(row['class_id'])
+        level = class_obj.level if class_obj else None
+        by_class.append({
+            'class_id': row['class_id'],
+            'class_name': class_obj.name if class_obj else None,
+            'level_id': level.id if level else None,
+            'buckets': bucket_totals(row),
+            'total': f"{row['total']:.2f}",
+            'invoice_count': row['invoice_count'],
+        })
+
+        level_row = by_level.setdefault(level.id if level else None, {
+            'level_id': level.id if level else None,
+            'level_name': level.name if level else None,
+            'invoice_count': 0,
+            **dict.fromkeys(totals, ZERO),
+        })
+        for key in totals:
+            totals[key] += row[key] or ZERO
+            level_row[key] += row[key] or ZERO
+        level_row['invoice_count'] += row['invoice_count']
+        invoice_count += row['invoice_count']
+
+    by_class.sort(key=lambda row: (row['class_name'] is None, row['class_name'] or ''))
+    return {
+        'as_of': today.isoformat(),
+        'buckets': [key for key, first, last in BUCKETS],
+        'totals': {**bucket_totals(totals), 'total': f"{totals['total']:.2f}", 'invoice_count': invoice_count},
+        'levels': [
+            {
+                'level_id': row['level_id'],
+                'level_name': row['level_name'],
+                'buckets': bucket_totals(row),
+                'total': f"{row['total']:.2f}",
+                'invoice_count': row['invoice_count'],
+            }
+            for row in sorted(by_level.values(), key=lambda row: (row['level_name'] is None, row['level_name'] or ''))
+        ],
+        'classes': by_class,
+    }
+
+
+def cached_aging_report():
+    """
+    Today's aging report, recomputed at most every FINANCE_AGING_CACHE_SECONDS
+    """
+    today = timezone.localdate()
+    key = AGING_CACHE_KEY.format(date=today.isoformat())
+    report = cache.get(key)
+    if report is None:
+        report = aging_report(today)
+        cache.set(key, report, settings.FINANCE_AGING_CACHE_SECONDS)
+    return report
+
+
+def aging_invoices(queryset, bucket=None, class_id=None, level_id=None, today=None):
+    """
+    Drill-down: the open receivables of a bucket and/or class or level
+    """
+    today = today or timezone.localdate()
+    queryset = open_receivables(queryset)
+    if bucket:
+        queryset = queryset.filter(bucket_filter(bucket, today))
+    if class_id == 'none':
+        queryset = queryset.filter(class_id__isnull=True)
+    elif class_id:
+        queryset = queryset.filter(class_id=class_id)
+    if level_id:
+        queryset = queryset.filter(class_id__in=Class.objects.filter(level_id=level_id).values('id'))
+    return queryset
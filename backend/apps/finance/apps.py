@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class FinanceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.finance'
+
+    def ready(self):
+        # Daily ledger, invoice balances and dashboard cache follow payment, expense and invoice changes
+        from . import balances, dashboard, ledger  # noqa: F401
@@ -0,0 +1,98 @@
+"""
+Invoice balances.
+
+Invoice.amount_paid is the sum of the invoice's completed payments and
+Invoice.balance_due what remains owed, so invoices can be filtered and
+sorted by balance without aggregating their payments.
+
+Every change to a payment recomputes its invoice's total in the same
+transaction, with the invoice row locked (SELECT ... FOR UPDATE): two
+payments posted at once are serialized on the invoice instead of both
+reading the old total. The status follows the balance: a settled invoice
+becomes paid, and a paid one whose payment is refunded becomes pending
+(overdue past its due date) again. Cancelled invoices keep their status.
+"""
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Invoice, Payment
+
+OPEN_STATUSES = ('pending', 'overdue')
+
+
+class PaymentRejected(ValueError):
+    pass
+
+
+def settled_status(invoice):
+    """
+    Status an invoice should have for its current balance
+    """
+    if invoice.status in OPEN_STATUSES and invoice.balance_due <= 0:
+        return 'paid'
+    if invoice.status == 'paid' and invoice.balance_due > 0:
+        return 'overdue' if invoice.due_date < timezone.localdate() else 'pending'
+    return invoice.status
+
+
+@transaction.atomic
+def refresh_balance(invoice_id):
+    """
+    Recompute an invoice's amount paid, balance and status under its row lock
+    """
+    invoice = Invoice.objects.select_for_update().filter(pk=invoice_id).first()
+    if invoice is None:
+        return None
+    amount_paid = invoice.payments.filter(status='completed').aggregate(total=Sum('amount'))['total'] or 0
+    if amount_paid == invoice.amount_paid and invoice.balance_due == invoice.amount - amount_paid:
+        return invoice
+    invoice.amount_paid = amount_paid
+    invoice.balance_due = invoice.amount - amount_paid
+    invoice.status = settled_status(invoice)
+    # save() rather than update(): the ledger follows salary invoices turning paid
+    invoice.save(update_fields=['amount_paid', 'balance_due', 'status', 'updated_at'])
+    return invoice
+
+
+@transaction.atomic
+def post_payment(invoice_id, amount, payment_method, payment_date=None, **fields):
+    """
+    Record a completed payment of an open invoice. Raises PaymentRejected when
+    the invoice is not open or the amount exceeds its balance.
+    """
+    invoice = Invoice.objects.select_for_update().get(pk=invoice_id)
+    if invoice.status not in OPEN_STATUSES:
+        raise PaymentRejected(f'Invoice {invoice.invoice_number} is {invoice.status}')
+    if amount <= 0 or amount > invoice.balance_due:
+        raise PaymentRejected(f'Amount must be between 0 and the balance due ({invoice.balance_due})')
+    return Payment.objects.create(
+        invoice=invoice,
+        amount=amount,
+        payment_method=payment_method,
+        payment_date=payment_date or timezone.now(),
+        status='completed',
+        **fields
+    )
+
+
+@receiver(pre_save, sender=Payment)
+def payment_invoice_before_save(sender, instance, **kwargs):
+    old = Payment.objects.filter(pk=instance.pk).values('invoice_id', 'amount', 'status').first() if instance.pk else None
+    instance._balance_before = old
+
+
+@receiver(post_save, sender=Payment)
+def payment_posted(sender, instance, **kwargs):
+    old = getattr(instance, '_balance_before', None)
+    if old and old['invoice_id'] != instance.invoice_id:
+        refresh_balance(old['invoice_id'])
+    if old is None or old != {'invoice_id': instance.invoice_id, 'amount': instance.amount, 'status': instance.status}:
+        refresh_balance(instance.invoice_id)
+
+
+@receiver(post_delete, sender=Payment)
+def payment_removed(sender, instance, **kwargs):
+    refresh_balance(instance.invoice_id)
@@ -0,0 +1,129 @@
+"""
+Finance dashboard KPIs.
+
+The manager's home screen reads one small document instead of the
+invoice, payment and expense lists: collections of this month and the
+last one, expenses by category and collections by payment method come
+from the daily ledger, the outstanding and overdue tuition from one
+aggregate over the invoices' balance column.
+
+The document is cached for FINANCE_DASHBOARD_CACHE_SECONDS in the cache
+shared by the web and Celery processes (CACHE_URL, else the broker's
+Redis), so writes made in a worker - the nightly overdue sweep, a ledger
+rebuild - drop the copy the web processes serve. It is dropped once an
+invoice, payment or expense saved or deleted is committed (dropping it
+earlier would let a concurrent request cache the old figures again). Bulk
+writes that bypass the signals call invalidate_dashboard() themselves.
+Dropping is best effort: a cache outage is logged and never fails the
+write, the document then expires on its own.
+"""
+import logging
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .ledger import period_totals
+from .models import Expense, Invoice, Payment
+
+ZERO = Decimal('0.00')
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_CACHE_KEY = 'finance:dashboard'
+
+
+def amount(value):
+    return f"{(value or ZERO):.2f}"
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def dashboard_kpis(today=None):
+    """
+    KPIs of the current month, JSON-ready (amounts as strings)
+    """
+    today = today or timezone.localdate()
+    this_month = month_start(today)
+    last_month = month_start(this_month - timedelta(days=1))
+
+    collected = {this_month: ZERO, last_month: ZERO}
+    by_method, by_category = {}, {}
+    for month, end in ((this_month, today), (last_month, this_month - timedelta(days=1))):
+        for (entry_type, category, payment_method), (total, count) in period_totals(month, end).items():
+            if entry_type == 'income':
+                collected[month] += total
+                if month == this_month:
+                    by_method[payment_method] = by_method.get(payment_method, ZERO) + total
+            elif entry_type == 'expense' and month == this_month:
+                by_category[category] = by_category.get(category, ZERO) + total
+
+    receivables = Invoice.objects.filter(
+        invoice_type='tuition', status__in=('pending', 'overdue'), balance_due__gt=0
+    ).aggregate(
+        outstanding=Sum('balance_due'),
+        open_count=Count('id'),
+        overdue=Sum('balance_due', filter=Q(status='overdue')),
+        overdue_count=Count('id', filter=Q(status='overdue')),
+    )
+
+    previous = collected[last_month]
+    change = None
+    if previous:
+        change = f"{(collected[this_month] - previous) / previous * 100:.1f}"
+    return {
+        'as_of': today.isoformat(),
+        'collected': {
+            'this_month': amount(collected[this_month]),
+            'last_month': amount(previous),
+            'change_percent': change,
+        },
+        'outstanding_tuition': amount(receivables['outstanding']),
+        'open_invoice_count': receivables['open_count'],
+        'overdue_tuition': amount(receivables['overdue']),
+        'overdue_count': receivables['overdue_count'],
+        'expenses_by_category': {key: amount(value) for key, value in sorted(by_category.items())},
+        'collected_by_payment_method': {key: amount(value) for key, value in sorted(by_method.items())},
+    }
+
+
+def cached_dashboard_kpis():
+    today = timezone.localdate()
+    kpis = cache.get(DASHBOARD_CACHE_KEY)
+    # A cached document of another day is stale whatever its age
+    if kpis is None or kpis['as_of'] != today.isoformat():
+        kpis = dashboard_kpis(today)
+        cache.set(DASHBOARD_CACHE_KEY, kpis, settings.FINANCE_DASHBOARD_CACHE_SECONDS)
+    return kpis
+
+
+def drop_dashboard():
+    try:
+        cache.delete(DASHBOARD_CACHE_KEY)
+    except Exception:
+        logger.warning("Could not drop the cached finance dashboard", exc_info=True)
+
+
+def invalidate_dashboard():
+    """
+    Drop the cached KPIs once the current transaction commits (at once outside one)
+    """
+    transaction.on_commit(drop_dashboard)
+
+
+@receiver(post_save, sender=Invoice)
+@receiver(post_save, sender=Payment)
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Invoice)
+@receiver(post_delete, sender=Payment)
+@receiver(post_delete, sender=Expense)
+def finance_changed(sender, **kwargs):
+    invalidate_dashboard()
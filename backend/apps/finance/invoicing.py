@@ -0,0 +1,95 @@
+"""
+Bulk tuition invoicing.
+
+A fee schedule (one or more installments: description, amount, due date)
+is invoiced to every student actively enrolled in a target: a class, a
+level and its sublevels, or a whole academic year. The students come from
+StudentClass in one query and the invoices are written with bulk_create in
+chunks, in one transaction. Installments a student was already invoiced
+(same description and due date) are skipped, so a schedule can be run
+again after late enrollments. Preview computes the same counts without
+writing anything.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+
+from apps.academics.models import Level, StudentClass
+
+from .dashboard import invalidate_dashboard
+from .models import Invoice
+
+BULK_INVOICE_BATCH_SIZE = 500
+
+
+def level_subtree(level_id):
+    """
+    Ids of a level and all its sublevels (the levels tree is small: one query)
+    """
+    children = {}
+    for pk, parent_id in Level.objects.values_list('id', 'parent_level_id'):
+        children.setdefault(parent_id, []).append(pk)
+    ids, stack = [], [int(level_id)]
+    while stack:
+        pk = stack.pop()
+        ids.append(pk)
+        stack.extend(children.get(pk, []))
+    return ids
+
+
+def target_students(class_id=None, level_id=None, academic_year_id=None):
+    """
+    Ids of the students actively enrolled in the target, in one query
+    """
+    enrollments = StudentClass.objects.filter(is_active=True)
+    if class_id:
+        enrollments = enrollments.filter(class_obj_id=class_id)
+    if level_id:
+        enrollments = enrollments.filter(class_obj__level_id__in=level_subtree(level_id))
+    if academic_year_id:
+        enrollments = enrollments.filter(class_obj__academic_year_id=academic_year_id)
+    return list(enrollments.order_by('student_id').values_list('student_id', flat=True).distinct())
+
+
+def invoice_fee_schedule(fees, manager, class_id=None, level_id=None, academic_year_id=None,
+                         invoice_type='tuition', preview=False):
+    """
+    Invoice each fee to the target's students. Returns the counts; with
+    preview=True nothing is written.
+    """
+    students = target_students(class_id, level_id, academic_year_id)
+    existing = set(Invoice.objects.filter(
+        student_id__in=students,
+        invoice_type=invoice_type,
+        description__in={fee['description'] for fee in fees},
+        due_date__in={fee['due_date'] for fee in fees},
+    ).values_list('student_id', 'description', 'due_date'))
+
+    invoices = [
+        Invoice(
+            invoice_type=invoice_type,
+            student_id=student_id,
+            amount=fee['amount'],
+            balance_due=fee['amount'],
+            description=fee['description'],
+            due_date=fee['due_date'],
+            manager=manager,
+        )
+        for student_id in students
+        for fee in fees
+        if (student_id, fee['description'], fee['due_date']) not in existing
+    ]
+    if not preview:
+        for invoice, number in zip(invoices, Invoice.generate_numbers(len(invoices))):
+            invoice.invoice_number = number
+        with transaction.atomic():
+            Invoice.objects.bulk_create(invoices, batch_size=BULK_INVOICE_BATCH_SIZE)
+        invalidate_dashboard()
+
+    return {
+        'preview': preview,
+        'students': len(students),
+        'invoices': len(invoices),
+        'skipped': len(students) * len(fees) - len(invoices),
+        'total_amount': f"{sum((invoice.amount for invoice in invoices), Decimal('0.00')):.2f}",
+    }
@@ -0,0 +1,239 @@
+"""
+Daily ledger rollup.
+
+LedgerDay holds one row per date x entry type x category x payment method,
+so a period report sums a few rows per day instead of scanning every
+payment and expense:
+
+- income: completed payments of non-salary invoices, on the local date of
+  payment, by invoice type and payment method
+- expense: Expense rows on their expense date, by category
+- salary: paid teacher salary invoices, on their due date
+
+Rows are kept up to date incrementally: saving or deleting a Payment,
+Expense or Invoice removes its previous contribution and adds the new one
+with F() updates, inside the same transaction. Bulk operations
+(QuerySet.update, bulk_create) bypass this and must call
+apply_entries() themselves; ledger_drift() compares the table with the
+transactions and rebuild_ledger() recomputes it.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Expense, Invoice, LedgerDay, Payment
+
+ZERO = Decimal('0.00')
+
+
+def day_bounds(start, end):
+    """
+    Aware datetime range [start 00:00, day after end 00:00) - a range on the
+    column itself keeps the payment_date index usable, unlike __date lookups
+    """
+    tz = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(start, time.min), tz),
+        timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min), tz),
+    )
+
+
+def payment_entries(payment, invoice_type=None):
+    """
+    Ledger contribution of a payment: [(key, amount)], key = (date, entry type, category, payment method)
+    """
+    if payment.status != 'completed' or payment.payment_date is None:
+        return []
+    invoice_type = invoice_type or payment.invoice.invoice_type
+    if invoice_type == 'salary':
+        return []
+    paid_at = payment.payment_date
+    # A naive value is stored as local time
+    day = (timezone.localtime(paid_at) if timezone.is_aware(paid_at) else paid_at).date()
+    return [((day, 'income', invoice_type, payment.payment_method), payment.amount)]
+
+
+def expense_entries(expense):
+    return [((expense.expense_date, 'expense', expense.category, ''), expense.amount)]
+
+
+def invoice_entries(invoice):
+    if invoice.invoice_type != 'salary' or invoice.status != 'paid':
+        return []
+    return [((invoice.due_date, 'salary', 'salary', ''), invoice.amount)]
+
+
+def apply_entries(entries, sign=1):
+    """
+    Add (sign=1) or remove (sign=-1) contributions from the daily rows
+    """
+    for (day, entry_type, category, payment_method), amount in entries:
+        key = {'date': day, 'entry_type': entry_type, 'category': category, 'payment_method': payment_method}
+        delta = {'total': F('total') + sign * amount, 'count': F('count') + sign}
+        if LedgerDay.objects.filter(**key).update(**delta):
+            continue
+        try:
+            with transaction.atomic():
+                LedgerDay.objects.create(**key, total=sign * amount, count=sign)
+        except IntegrityError:
+            # Created concurrently since the update
+            LedgerDay.objects.filter(**key).update(**delta)
+
+
+def replace_entries(before, after):
+    if before == after:
+        return
+    apply_entries(before, -1)
+    apply_entries(after, 1)
+
+
+@receiver(pre_save, sender=Payment)
+def payment_before_save(sender, instance, **kwargs):
+    old = Payment.objects.select_related('invoice').filter(pk=instance.pk).first() if instance.pk else None
+    instance._ledger_before = payment_entries(old) if old else []
+
+
+@receiver(pre_save, sender=Expense)
+def expense_before_save(sender, instance, **kwargs):
+    old = Expense.objects.filter(pk=instance.pk).first() if instance.pk else None
+    instance._ledger_before = expense_entries(old) if old else []
+
+
+@receiver(pre_save, sender=Invoice)
+def invoice_before_save(sender, instance, **kwargs):
+    old = Invoice.objects.filter(pk=instance.pk).first() if instance.pk else None
+    instance._ledger_before = invoice_entries(old) if old else []
+    instance._ledger_invoice_type = old.invoice_type if old else instance.invoice_type
+
+
+@receiver(post_save, sender=Payment)
+def payment_saved(sender, instance, **kwargs):
+    replace_entries(getattr(instance, '_ledger_before', []), payment_entries(instance))
+
+
+@receiver(post_save, sender=Expense)
+def expense_saved(sender, instance, **kwargs):
+    replace_entries(getattr(instance, '_ledger_before', []), expense_entries(instance))
+
+
+@receiver(post_save, sender=Invoice)
+def invoice_saved(sender, instance, **kwargs):
+    replace_entries(getattr(instance, '_ledger_before', []), invoice_entries(instance))
+
+    # Income is split by invoice type: re-file the payments of a retyped invoice
+    old_type = getattr(instance, '_ledger_invoice_type', instance.invoice_type)
+    if old_type != instance.invoice_type:
+        for payment in instance.payments.filter(status='completed'):
+            replace_entries(
+                payment_entries(payment, old_type), payment_entries(payment, instance.invoice_type)
+            )
+
+
+@receiver(pre_delete, sender=Payment)
+def payment_before_delete(sender, instance, **kwargs):
+    instance._ledger_before = payment_entries(instance)
+
+
+@receiver(post_delete, sender=Payment)
+@receiver(post_delete, sender=Expense)
+@receiver(post_delete, sender=Invoice)
+def transaction_deleted(sender, instance, **kwargs):
+    if sender is Payment:
+        entries = getattr(instance, '_ledger_before', [])
+    elif sender is Expense:
+        entries = expense_entries(instance)
+    else:
+        entries = invoice_entries(instance)
+    apply_entries(entries, -1)
+
+
+def transaction_totals(start=None, end=None):
+    """
+    Ledger rows computed from the transactions themselves: {key: (total, count)}
+    """
+    payments = Payment.objects.filter(status='completed').exclude(invoice__invoice_type='salary')
+    expenses = Expense.objects.all()
+    salaries = Invoice.objects.filter(invoice_type='salary', status='paid')
+    if start is not None and end is not None:
+        since, until = day_bounds(start, end)
+        payments = payments.filter(payment_date__gte=since, payment_date__lt=until)
+        expenses = expenses.filter(expense_date__range=(start, end))
+        salaries = salaries.filter(due_date__range=(start, end))
+
+    totals = {}
+    for row in payments.annotate(day=TruncDate('payment_date')).values(
+        'day', 'invoice__invoice_type', 'payment_method'
+    ).annotate(total=Sum('amount'), count=Count('id')).order_by():
+        key = (row['day'], 'income', row['invoice__invoice_type'], row['payment_method'])
+        totals[key] = (row['total'], row['count'])
+    for row in expenses.values('expense_date', 'category').annotate(
+        total=Sum('amount'), count=Count('id')
+    ).order_by():
+        totals[(row['expense_date'], 'expense', row['category'], '')] = (row['total'], row['count'])
+    for row in salaries.values('due_date').annotate(total=Sum('amount'), count=Count('id')).order_by():
+        totals[(row['due_date'], 'salary', 'salary', '')] = (row['total'], row['count'])
+    return totals
+
+
+def ledger_rows(start=None, end=None):
+    rows = LedgerDay.objects.all()
+    if start is not None and end is not None:
+        rows = rows.filter(date__range=(start, end))
+    return rows
+
+
+def stored_totals(start=None, end=None):
+    """
+    Non-empty ledger rows: {key: (total, count)}
+    """
+    return {
+        (row.date, row.entry_type, row.category, row.payment_method): (row.total, row.count)
+        for row in ledger_rows(start, end).exclude(count=0, total=0)
+    }
+
+
+def ledger_drift(start=None, end=None):
+    """
+    Ledger rows that disagree with the transactions: [(key, stored, expected)],
+    where stored and expected are (total, count) or None
+    """
+    stored = stored_totals(start, end)
+    expected = transaction_totals(start, end)
+    return sorted(
+        (key, stored.get(key), expected.get(key))
+        for key in stored.keys() | expected.keys()
+        if stored.get(key) != expected.get(key)
+    )
+
+
+@transaction.atomic
+def rebuild_ledger(start=None, end=None):
+    """
+    Recompute the ledger rows of a period (everything by default). Returns the number of rows written.
+    """
+    ledger_rows(start, end).delete()
+    rows = [
+        LedgerDay(date=day, entry_type=entry_type, category=category, payment_method=payment_method,
+                  total=total, count=count)
+        for (day, entry_type, category, payment_method), (total, count) in transaction_totals(start, end).items()
+    ]
+    LedgerDay.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def period_totals(start, end):
+    """
+    Sums of the ledger rows of a period, by (entry type, category, payment method)
+    """
+    return {
+        (row['entry_type'], row['category'], row['payment_method']): (row['total'], row['count'])
+        for row in ledger_rows(start, end).values('entry_type', 'category', 'payment_method').annotate(
+            total=Sum('total'), count=Sum('count')
+        ).order_by()
+    }
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.finance.ledger import ledger_drift, rebuild_ledger
+from apps.finance.management.commands.rebuild_ledger import period, period_arguments
+
+
+class Command(BaseCommand):
+    help = 'Compare the daily ledger rows with the transactions they sum'
+
+    def add_arguments(self, parser):
+        period_arguments(parser)
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Rebuild the period when the ledger has drifted'
+        )
+
+    def handle(self, *args, **options):
+        start, end = period(options)
+        drift = ledger_drift(start, end)
+        for (day, entry_type, category, payment_method), stored, expected in drift:
+            self.stdout.write(
+                f"{day} {entry_type} {category} {payment_method or '-'}: ledger {stored}, transactions {expected}"
+            )
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('Ledger matches the transactions'))
+            return
+        if options['fix']:
+            count = rebuild_ledger(start, end)
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} ledger rows"))
+            return
+        raise CommandError(f"{len(drift)} ledger rows have drifted")
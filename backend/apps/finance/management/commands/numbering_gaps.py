@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.finance.models import Invoice, Receipt
+from apps.finance.numbering import format_number, number_gaps
+
+
+class Command(BaseCommand):
+    help = "List the invoice and receipt numbers of a year that were reserved but never used"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, help='Numbering year (default: the current year)')
+
+    def handle(self, *args, **options):
+        year = options['year'] or timezone.localdate().year
+        for kind, queryset, field in (
+            ('invoice', Invoice.objects.all(), 'invoice_number'),
+            ('receipt', Receipt.objects.all(), 'receipt_number'),
+        ):
+            gaps = number_gaps(queryset, field, kind, year)
+            if not gaps:
+                self.stdout.write(f"{kind}: no gaps")
+            for first, last in gaps:
+                missing = format_number(kind, year, first)
+                if last != first:
+                    missing += f" .. {format_number(kind, year, last)}"
+                self.stdout.write(f"{kind}: {missing}")
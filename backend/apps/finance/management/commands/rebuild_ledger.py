@@ -0,0 +1,32 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.finance.dashboard import invalidate_dashboard
+from apps.finance.ledger import rebuild_ledger
+
+
+def period_arguments(parser):
+    parser.add_argument('--start', type=date.fromisoformat, help='First day, YYYY-MM-DD (default: all time)')
+    parser.add_argument('--end', type=date.fromisoformat, help='Last day, YYYY-MM-DD')
+
+
+def period(options):
+    start, end = options['start'], options['end']
+    if (start is None) != (end is None):
+        raise CommandError('--start and --end go together')
+    if start and start > end:
+        raise CommandError('--start must not be after --end')
+    return start, end
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily ledger rows from the payments, expenses and salary invoices'
+
+    def add_arguments(self, parser):
+        period_arguments(parser)
+
+    def handle(self, *args, **options):
+        count = rebuild_ledger(*period(options))
+        invalidate_dashboard()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} ledger rows"))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.finance.reconciliation import StatementError, reconcile_statement
+
+
+class Command(BaseCommand):
+    help = 'Match a bank statement CSV against the unreconciled bank transfer and cheque payments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('statement', help='Path of the statement CSV')
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report the matches, without marking the payments'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['statement'], 'rb') as statement:
+                report = reconcile_statement(statement, dry_run=options['dry_run'])
+        except (OSError, StatementError) as e:
+            raise CommandError(str(e))
+
+        for line in report['unmatched_lines']:
+            self.stdout.write(f"Unmatched line {line['line']}: {line['date']} {line['amount']} {line['reference']} {line['label']}")
+        for payment in report['unmatched_payments']:
+            self.stdout.write(
+                f"Unreconciled payment {payment['payment_id']}: {payment['date']} {payment['amount']} "
+                f"{payment['reference_number']} ({payment['invoice_number']})"
+            )
+        verb = 'Would reconcile' if options['dry_run'] else 'Reconciled'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {len(report['matched'])} payments, {len(report['unmatched_lines'])} lines unmatched"
+        ))
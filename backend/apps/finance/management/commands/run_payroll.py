@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.accounts.models import User
+from apps.finance.payroll import run_payroll
+
+
+class Command(BaseCommand):
+    help = "Issue a month's salary invoices for all active teachers (safe to run again)"
+
+    def add_arguments(self, parser):
+        today = timezone.localdate()
+        parser.add_argument('--year', type=int, default=today.year, help='Payroll year (default: current)')
+        parser.add_argument('--month', type=int, default=today.month, help='Payroll month (default: current)')
+        parser.add_argument(
+            '--manager',
+            help='E-mail of the user the invoices are issued by (default: the first active administrator or manager)'
+        )
+        parser.add_argument(
+            '--preview',
+            action='store_true',
+            help='Only report what would be issued'
+        )
+
+    def handle(self, *args, **options):
+        managers = User.objects.filter(is_active=True, role__in=('administrator', 'manager')).order_by('id')
+        if options['manager']:
+            managers = managers.filter(email=options['manager'])
+        manager = managers.first()
+        if manager is None:
+            raise CommandError('No active administrator or manager to issue the invoices')
+
+        try:
+            summary = run_payroll(options['year'], options['month'], manager, preview=options['preview'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        verb = 'Would issue' if options['preview'] else 'Issued'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {summary['issued']} salary invoices for {summary['period']} ({summary['total_amount']}), "
+            f"{summary['prorated']} pro rata, {summary['already_issued']} already issued, "
+            f"{summary['without_salary']} teachers without salary"
+        ))
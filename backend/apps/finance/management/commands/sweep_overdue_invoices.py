@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from apps.finance.overdue import send_overdue_reminders, sweep_overdue
+
+
+class Command(BaseCommand):
+    help = 'Mark pending invoices past their due date as overdue (what the nightly beat task does)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--remind',
+            action='store_true',
+            help="Mail the reminders to the students' parents"
+        )
+
+    def handle(self, *args, **options):
+        invoice_ids = sweep_overdue()
+        self.stdout.write(self.style.SUCCESS(f"Marked {len(invoice_ids)} invoices overdue"))
+        if invoice_ids and options['remind']:
+            sent = send_overdue_reminders(invoice_ids)
+            self.stdout.write(f"Sent {sent} reminders")
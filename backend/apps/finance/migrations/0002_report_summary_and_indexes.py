@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='financialreport',
+            name='summary',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Summary'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['expense_date', 'category'], name='finance_exp_expense_be3fd2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['invoice_type', 'status', 'due_date'], name='finance_inv_invoice_f508ce_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['status', 'payment_date'], name='finance_pay_status_549635_idx'),
+        ),
+    ]
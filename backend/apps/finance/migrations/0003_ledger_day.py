@@ -0,0 +1,66 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:20
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def fill_ledger(apps, schema_editor):
+    Payment = apps.get_model('finance', 'Payment')
+    Expense = apps.get_model('finance', 'Expense')
+    Invoice = apps.get_model('finance', 'Invoice')
+    LedgerDay = apps.get_model('finance', 'LedgerDay')
+
+    rows = [
+        LedgerDay(date=row['day'], entry_type='income', category=row['invoice__invoice_type'],
+                  payment_method=row['payment_method'], total=row['total'], count=row['count'])
+        for row in Payment.objects.filter(status='completed').exclude(invoice__invoice_type='salary').annotate(
+            day=TruncDate('payment_date')
+        ).values('day', 'invoice__invoice_type', 'payment_method').annotate(
+            total=Sum('amount'), count=Count('id')
+        ).order_by()
+    ]
+    rows += [
+        LedgerDay(date=row['expense_date'], entry_type='expense', category=row['category'],
+                  total=row['total'], count=row['count'])
+        for row in Expense.objects.values('expense_date', 'category').annotate(
+            total=Sum('amount'), count=Count('id')
+        ).order_by()
+    ]
+    rows += [
+        LedgerDay(date=row['due_date'], entry_type='salary', category='salary',
+                  total=row['total'], count=row['count'])
+        for row in Invoice.objects.filter(invoice_type='salary', status='paid').values('due_date').annotate(
+            total=Sum('amount'), count=Count('id')
+        ).order_by()
+    ]
+    LedgerDay.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0002_report_summary_and_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('entry_type', models.CharField(choices=[('income', 'Income'), ('expense', 'Expense'), ('salary', 'Salary')], max_length=10, verbose_name='Entry Type')),
+                ('category', models.CharField(max_length=20, verbose_name='Category')),
+                ('payment_method', models.CharField(blank=True, max_length=20, verbose_name='Payment Method')),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Total')),
+                ('count', models.IntegerField(default=0, verbose_name='Count')),
+            ],
+            options={
+                'verbose_name': 'Ledger Day',
+                'verbose_name_plural': 'Ledger Days',
+                'ordering': ['-date'],
+                'unique_together': {('date', 'entry_type', 'category', 'payment_method')},
+            },
+        ),
+        migrations.RunPython(fill_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:23
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_balances(apps, schema_editor):
+    Invoice = apps.get_model('finance', 'Invoice')
+    Payment = apps.get_model('finance', 'Payment')
+
+    paid = Payment.objects.filter(invoice=OuterRef('pk'), status='completed').values('invoice').annotate(
+        total=Sum('amount')
+    ).values('total')
+    Invoice.objects.update(
+        amount_paid=Coalesce(Subquery(paid), Value(Decimal('0.00')), output_field=models.DecimalField())
+    )
+    Invoice.objects.update(balance_due=F('amount') - F('amount_paid'))
+    # Open invoices already paid in full are settled (cancelled ones stay cancelled)
+    Invoice.objects.filter(status__in=('pending', 'overdue'), balance_due__lte=0).update(status='paid')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0003_ledger_day'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='amount_paid',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Amount Paid'),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='balance_due',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, max_digits=10, verbose_name='Balance Due'),
+        ),
+        migrations.RunPython(fill_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0005_invoice_pending_due_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='reconciled_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Reconciled at'),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='statement_reference',
+            field=models.CharField(blank=True, max_length=100, verbose_name='Statement Reference'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0006_payment_reconciliation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='period',
+            field=models.DateField(blank=True, null=True, verbose_name='Period'),
+        ),
+        migrations.AddConstraint(
+            model_name='invoice',
+            constraint=models.UniqueConstraint(condition=models.Q(('invoice_type', 'salary')), fields=('teacher', 'period'), name='invoice_salary_period_unique'),
+        ),
+    ]
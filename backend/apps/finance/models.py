@@ -1,6 +1,7 @@
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from apps.accounts.models import Student, Teacher, User
+from .numbering import next_number, reserve_numbers
 
 
 class Invoice(models.Model):
@@ -26,8 +27,13 @@ class Invoice(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE, null=True, blank=True, related_name='invoices')
     teacher = models.ForeignKey(Teacher, on_delete=models.CASCADE, null=True, blank=True, related_name='salary_invoices')
     amount = models.DecimalField(_('Amount'), max_digits=10, decimal_places=2)
+    # Maintained from the completed payments (see finance.balances)
+    amount_paid = models.DecimalField(_('Amount Paid'), max_digits=10, decimal_places=2, default=0)
+    balance_due = models.DecimalField(_('Balance Due'), max_digits=10, decimal_places=2, default=0, db_index=True)
     description = models.TextField(_('Description'))
     due_date = models.DateField(_('Due Date'))
+    # Month a salary invoice pays (first day), set by the payroll run
+    period = models.DateField(_('Period'), null=True, blank=True)
     status = models.CharField(_('Status'), max_length=20, choices=STATUS_CHOICES, default='pending')
     manager = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_invoices')
     created_at = models.DateTimeField(_('Created at'), auto_now_add=True)
@@ -37,16 +43,45 @@ class Invoice(models.Model):
         verbose_name = _('Invoice')
         verbose_name_plural = _('Invoices')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['invoice_type', 'status', 'due_date']),
+            # Overdue sweep: only the pending invoices, by due date
+            models.Index(fields=['due_date'], condition=models.Q(status='pending'), name='invoice_pending_due_idx'),
+        ]
+        constraints = [
+            # One payroll salary invoice per teacher and month
+            models.UniqueConstraint(
+                fields=['teacher', 'period'],
+                condition=models.Q(invoice_type='salary'),
+                name='invoice_salary_period_unique'
+            ),
+        ]
     
     def __str__(self):
         return f"Invoice {self.invoice_number} - {self.get_invoice_type_display()}"
     
     def save(self, *args, **kwargs):
         if not self.invoice_number:
-            # Generate invoice number
-            import uuid
-            self.invoice_number = f"INV-{uuid.uuid4().hex[:8].upper()}"
+            self.invoice_number = self.generate_number()
+        self.balance_due = self.amount - self.amount_paid
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and ('amount' in update_fields or 'amount_paid' in update_fields):
+            kwargs['update_fields'] = {*update_fields, 'balance_due'}
         super().save(*args, **kwargs)
+    
+    @staticmethod
+    def generate_number():
+        """
+        Next invoice number, e.g. INV-2025-000042
+        """
+        return next_number('invoice')
+    
+    @staticmethod
+    def generate_numbers(count):
+        """
+        `count` invoice numbers reserved at once, for bulk creation (which bypasses save())
+        """
+        return reserve_numbers('invoice', count)
 
 
 class Payment(models.Model):
@@ -74,12 +109,18 @@ class Payment(models.Model):
     reference_number = models.CharField(_('Reference Number'), max_length=100, blank=True)
     status = models.CharField(_('Status'), max_length=20, choices=STATUS_CHOICES, default='completed')
     notes = models.TextField(_('Notes'), blank=True)
+    # Set when a bank statement line is matched to the payment (see finance.reconciliation)
+    reconciled_at = models.DateTimeField(_('Reconciled at'), null=True, blank=True)
+    statement_reference = models.CharField(_('Statement Reference'), max_length=100, blank=True)
     created_at = models.DateTimeField(_('Created at'), auto_now_add=True)
     
     class Meta:
         verbose_name = _('Payment')
         verbose_name_plural = _('Payments')
         ordering = ['-payment_date']
+        indexes = [
+            models.Index(fields=['status', 'payment_date']),
+        ]
     
     def __str__(self):
         return f"Payment {self.amount} - {self.get_payment_method_display()}"
@@ -104,10 +145,22 @@ class Receipt(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.receipt_number:
-            # Generate receipt number
-            import uuid
-            self.receipt_number = f"RCP-{uuid.uuid4().hex[:8].upper()}"
+            self.receipt_number = self.generate_number()
         super().save(*args, **kwargs)
+    
+    @staticmethod
+    def generate_number():
+        """
+        Next receipt number, e.g. RCP-2025-000042
+        """
+        return next_number('receipt')
+    
+    @staticmethod
+    def generate_numbers(count):
+        """
+        `count` receipt numbers reserved at once, for bulk issuing (which bypasses save())
+        """
+        return reserve_numbers('receipt', count)
 
 
 class Expense(models.Model):
@@ -136,6 +189,9 @@ class Expense(models.Model):
         verbose_name = _('Expense')
         verbose_name_plural = _('Expenses')
         ordering = ['-expense_date']
+        indexes = [
+            models.Index(fields=['expense_date', 'category']),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.amount}"
@@ -158,6 +214,8 @@ class FinancialReport(models.Model):
     total_income = models.DecimalField(_('Total Income'), max_digits=12, decimal_places=2, default=0)
     total_expenses = models.DecimalField(_('Total Expenses'), max_digits=12, decimal_places=2, default=0)
     net_profit = models.DecimalField(_('Net Profit'), max_digits=12, decimal_places=2, default=0)
+    # Breakdowns by payment method, invoice type and expense category (see finance.reports)
+    summary = models.JSONField(_('Summary'), default=dict, blank=True)
     file_path = models.CharField(_('File Path'), max_length=500, blank=True)
     generated_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='generated_reports')
     generated_at = models.DateTimeField(_('Generated at'), auto_now_add=True)
@@ -172,4 +230,33 @@ class FinancialReport(models.Model):
     
     def save(self, *args, **kwargs):
         self.net_profit = self.total_income - self.total_expenses
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+
+class LedgerDay(models.Model):
+    """
+    Daily finance totals by entry type, category and payment method,
+    maintained from payments, expenses and salary invoices (see finance.ledger)
+    """
+    ENTRY_TYPE_CHOICES = [
+        ('income', _('Income')),
+        ('expense', _('Expense')),
+        ('salary', _('Salary')),
+    ]
+    
+    date = models.DateField(_('Date'))
+    entry_type = models.CharField(_('Entry Type'), max_length=10, choices=ENTRY_TYPE_CHOICES)
+    # Invoice type for income, expense category for expenses, 'salary' for salaries
+    category = models.CharField(_('Category'), max_length=20)
+    payment_method = models.CharField(_('Payment Method'), max_length=20, blank=True)
+    total = models.DecimalField(_('Total'), max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(_('Count'), default=0)
+    
+    class Meta:
+        verbose_name = _('Ledger Day')
+        verbose_name_plural = _('Ledger Days')
+        ordering = ['-date']
+        unique_together = ['date', 'entry_type', 'category', 'payment_method']
+    
+    def __str__(self):
+        return f"{self.date} {self.entry_type}/{self.category} {self.payment_method}: {self.total}"
@@ -0,0 +1,93 @@
+"""
+Invoice and receipt numbering.
+
+Numbers come from PostgreSQL sequences, one per kind and year
+(finance_invoice_2025_seq, ...), formatted as INV-2025-000042. nextval()
+never hands the same value out twice, so numbers cannot collide however
+many processes create invoices, and they increase in creation order.
+
+A range of numbers is reserved in one round trip (nextval over
+generate_series), which lets bulk paths number their rows before
+bulk_create instead of saving rows one at a time. The first allocation
+of a kind and year in a process also creates the sequence if needed, in the
+same round trip (under a savepoint); once that is committed the process
+remembers the sequence and later allocations only run nextval(). Two
+transactions creating the same sequence at once make the second one fail
+with a unique violation; it then knows the sequence exists and just runs
+nextval().
+
+Sequences are not transactional: a rolled-back transaction leaves a gap.
+number_gaps() lists the missing numbers of a year so they can be
+accounted for.
+"""
+from django.db import IntegrityError, ProgrammingError, connection, transaction
+from django.utils import timezone
+
+PREFIXES = {
+    'invoice': 'INV',
+    'receipt': 'RCP',
+}
+
+# Sequences known to exist, filled once their creation is committed
+created_sequences = set()
+
+
+def sequence_name(kind, year):
+    return f"finance_{kind}_{int(year)}_seq"
+
+
+def format_number(kind, year, value):
+    return f"{PREFIXES[kind]}-{year}-{value:06d}"
+
+
+def reserve_numbers(kind, count, year=None):
+    """
+    `count` new numbers of a kind, in increasing order
+    """
+    if count <= 0:
+        return []
+    year = year or timezone.localdate().year
+    name = sequence_name(kind, year)
+    statement = f"SELECT nextval('{name}') FROM generate_series(1, %s)"
+    values = None
+    if name not in created_sequences:
+        try:
+            with transaction.atomic():
+                values = allocate(f"CREATE SEQUENCE IF NOT EXISTS {name}; {statement}", count)
+        except (IntegrityError, ProgrammingError):
+            # Created by a concurrent transaction, which has committed it
+            created_sequences.add(name)
+        else:
+            transaction.on_commit(lambda: created_sequences.add(name))
+    if values is None:
+        values = allocate(statement, count)
+    return [format_number(kind, year, value) for value in values]
+
+
+def allocate(statement, count):
+    with connection.cursor() as cursor:
+        cursor.execute(statement, [count])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def next_number(kind, year=None):
+    return reserve_numbers(kind, 1, year)[0]
+
+
+def number_gaps(queryset, field, kind, year):
+    """
+    Missing numbers of a year, as (first, last) ranges, up to the highest number issued
+    """
+    prefix = f"{PREFIXES[kind]}-{year}-"
+    issued = sorted(
+        int(number[len(prefix):])
+        for number in queryset.filter(**{f'{field}__startswith': prefix}).values_list(field, flat=True)
+        if number[len(prefix):].isdigit()
+    )
+    gaps = []
+    expected = 1
+    for value in issued:
+        if value > expected:
+            gaps.append((expected, value - 1))
+        expected = value + 1
+    return gaps
@@ -0,0 +1,116 @@
+"""
+Overdue invoice sweep.
+
+sweep_overdue() moves the pending invoices past their due date to overdue
+with a single UPDATE ... RETURNING id, served by the partial index on
+pending invoices' due dates, so its cost follows the number of invoices
+due rather than the size of the table. It returns the ids it swept, which
+is what send_overdue_reminders() is given afterwards: exactly those
+invoices are reminded, their students' parents resolved in one query and
+mailed over one connection.
+"""
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection
+from django.utils import timezone
+
+from apps.accounts.models import ParentStudent
+from apps.documents.layouts import LABELS
+
+from .dashboard import invalidate_dashboard
+from .models import Invoice
+
+logger = logging.getLogger(__name__)
+
+REMINDER_TEXTS = {
+    'fr': {
+        'subject': "Facture {invoice_number} en retard de paiement",
+        'body': (
+            "Bonjour {parent},\n\n"
+            "La facture {invoice_number} de {student} ({description}), échue le {due_date:%d/%m/%Y}, "
+            "reste impayée : {balance_due} {currency} restent dus.\n\n"
+            "Cordialement,\nL'administration"
+        ),
+    },
+    'ar': {
+        'subject': "الفاتورة {invoice_number} متأخرة الدفع",
+        'body': (
+            "السلام عليكم {parent}،\n\n"
+            "الفاتورة {invoice_number} الخاصة بـ {student} ({description}) المستحقة بتاريخ {due_date:%d/%m/%Y} "
+            "لم تسدد بعد: المبلغ المتبقي {balance_due} {currency}.\n\n"
+            "مع التحية،\nالإدارة"
+        ),
+    },
+}
+
+
+def sweep_overdue(today=None):
+    """
+    Mark the pending invoices due before today as overdue. Returns the ids of the invoices swept.
+    """
+    today = today or timezone.localdate()
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {quote(Invoice._meta.db_table)} SET status = 'overdue', updated_at = %s "
+            f"WHERE status = 'pending' AND due_date < %s RETURNING id",
+            [timezone.now(), today]
+        )
+        invoice_ids = sorted(row[0] for row in cursor.fetchall())
+    logger.info("Marked %s invoices overdue", len(invoice_ids))
+    if invoice_ids:
+        invalidate_dashboard()
+    return invoice_ids
+
+
+def reminder_messages(invoices):
+    """
+    One reminder per invoice and parent with an e-mail address
+    """
+    invoices = list(invoices.select_related('student__user'))
+    parents = defaultdict(list)
+    for student_id, name, email, language in ParentStudent.objects.filter(
+        student_id__in={invoice.student_id for invoice in invoices}
+    ).exclude(parent__user__email='').values_list(
+        'student_id', 'parent__user__first_name', 'parent__user__email', 'parent__user__preferred_language'
+    ):
+        parents[student_id].append((name, email, language if language in REMINDER_TEXTS else 'fr'))
+
+    messages = []
+    for invoice in invoices:
+        for name, email, language in parents[invoice.student_id]:
+            context = {
+                'parent': name,
+                'student': invoice.student.user.get_full_name(),
+                'invoice_number': invoice.invoice_number,
+                'description': invoice.description,
+                'due_date': invoice.due_date,
+                'balance_due': invoice.balance_due,
+                'currency': LABELS[language]['currency'],
+            }
+            texts = REMINDER_TEXTS[language]
+            messages.append(EmailMessage(
+                subject=texts['subject'].format(**context),
+                body=texts['body'].format(**context),
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                to=[email],
+            ))
+    return messages
+
+
+def send_overdue_reminders(invoice_ids, connection=None):
+    """
+    Mail the parents of the students whose invoices a sweep turned overdue
+    (those still unpaid). Returns the number of mails sent.
+    """
+    invoices = Invoice.objects.filter(id__in=invoice_ids, status='overdue', student__isnull=False)
+    messages = reminder_messages(invoices)
+    if not messages:
+        return 0
+    connection = connection or get_connection()
+    sent = connection.send_messages(messages) or 0
+    logger.info("Sent %s overdue reminders", sent)
+    return sent
@@ -0,0 +1,95 @@
+"""
+Monthly payroll.
+
+run_payroll() issues the salary invoices of a month for every active
+teacher with a salary, in one bulk insert. The invoices carry the month in
+Invoice.period, unique per teacher for salary invoices, so running the
+payroll of a month again only adds the teachers who were missing (hired
+or given a salary since). A teacher hired during the month is paid pro
+rata of the days from the hire date to the end of the month.
+"""
+import calendar
+from datetime import date
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+
+from apps.accounts.models import Teacher
+
+from .models import Invoice
+
+PAYROLL_DESCRIPTION = "Salaire {period:%m/%Y}"
+
+
+def payroll_month(year, month):
+    """
+    (first day, last day) of a payroll month
+    """
+    year, month = int(year), int(month)
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def prorated_salary(salary, hire_date, first_day, last_day):
+    """
+    Salary of the month, pro rata of the days worked when hired during it
+    """
+    if hire_date <= first_day:
+        return salary
+    days = (last_day - first_day).days + 1
+    worked = (last_day - hire_date).days + 1
+    return (salary * worked / days).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def run_payroll(year, month, manager, preview=False):
+    """
+    Issue the month's salary invoices. Returns a summary; with preview=True nothing is written.
+    """
+    first_day, last_day = payroll_month(year, month)
+    teachers = Teacher.objects.filter(is_active=True, hire_date__lte=last_day).values_list(
+        'id', 'salary', 'hire_date'
+    )
+    already_paid = set(Invoice.objects.filter(invoice_type='salary', period=first_day).values_list(
+        'teacher_id', flat=True
+    ))
+
+    invoices, without_salary, prorated = [], 0, 0
+    for teacher_id, salary, hire_date in teachers:
+        if teacher_id in already_paid:
+            continue
+        if not salary:
+            without_salary += 1
+            continue
+        amount = prorated_salary(salary, hire_date, first_day, last_day)
+        prorated += amount != salary
+        invoices.append(Invoice(
+            invoice_type='salary',
+            teacher_id=teacher_id,
+            amount=amount,
+            balance_due=amount,
+            description=PAYROLL_DESCRIPTION.format(period=first_day),
+            due_date=last_day,
+            period=first_day,
+            manager=manager,
+        ))
+
+    if invoices and not preview:
+        for invoice, number in zip(invoices, Invoice.generate_numbers(len(invoices))):
+            invoice.invoice_number = number
+        with transaction.atomic():
+            # A concurrent run of the same month may have issued some meanwhile
+            Invoice.objects.bulk_create(invoices, batch_size=500, ignore_conflicts=True)
+        issued = Invoice.objects.filter(
+            invoice_type='salary', period=first_day, invoice_number__in=[invoice.invoice_number for invoice in invoices]
+        ).count()
+    else:
+        issued = len(invoices)
+
+    return {
+        'preview': preview,
+        'period': first_day.isoformat(),
+        'issued': issued,
+        'already_issued': len(already_paid),
+        'prorated': prorated,
+        'without_salary': without_salary,
+        'total_amount': f"{sum((invoice.amount for invoice in invoices), Decimal('0.00')):.2f}",
+    }
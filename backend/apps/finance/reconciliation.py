@@ -0,0 +1,244 @@
+"""
+Bank statement reconciliation.
+
+A statement CSV (date, amount, reference, label columns; comma or
+semicolon separated, decimal comma accepted) is read line by line and
+matched against the completed, not yet reconciled bank transfer and
+cheque payments. Those are loaded once into in-memory indexes by
+reference number, invoice number and amount, so each line costs a few
+dict lookups whatever the length of the statement. Rules, first match
+wins, each payment matched at most once:
+
+- reference: the line's reference is the payment's reference number, same amount
+- invoice: the line's reference or label holds the invoice number, same amount
+- label: a word of the label is the payment's reference number, same amount
+- amount: the only payment of that amount within RECONCILE_DATE_WINDOW days
+
+The matched payments are marked reconciled with bulk_update; the result
+lists the statement lines left unmatched and the payments of the
+statement's period still unreconciled.
+"""
+import codecs
+import csv
+import re
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Payment
+
+RECONCILE_DATE_WINDOW = timedelta(days=5)
+RECONCILE_METHODS = ('bank_transfer', 'cheque')
+RECONCILE_BATCH_SIZE = 1000
+
+# Accepted header names of each column, lowercased
+COLUMNS = {
+    'date': ('date', 'date operation', 'date opération', 'value date', 'date valeur'),
+    'amount': ('amount', 'montant', 'credit', 'crédit'),
+    'reference': ('reference', 'référence', 'ref', 'reference number'),
+    'label': ('label', 'libellé', 'libelle', 'description'),
+}
+
+WORD = re.compile(r'[A-Za-z0-9-]+')
+
+
+class StatementError(ValueError):
+    pass
+
+
+def normalize(reference):
+    return re.sub(r'[^A-Z0-9]', '', (reference or '').upper())
+
+
+def parse_amount(value):
+    """
+    Decimal amount of '1 234,50', '1234.50' or '1,234.50'; None for a blank
+    cell (a debit line of a statement with separate debit and credit columns)
+    """
+    value = (value or '').replace('\xa0', '').replace(' ', '')
+    if not value:
+        return None
+    if ',' in value and '.' in value:
+        value = value.replace(',', '')
+    else:
+        value = value.replace(',', '.')
+    try:
+        return Decimal(value).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise StatementError(f'Invalid amount: {value!r}')
+
+
+def parse_date(value):
+    for fmt in ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y'):
+        try:
+            return datetime.strptime(value.strip(), fmt).date()
+        except ValueError:
+            continue
+    raise StatementError(f'Invalid date: {value!r}')
+
+
+def statement_lines(stream):
+    """
+    Iterate a statement CSV (binary or text stream): (line number, date, amount, reference, label)
+    """
+    if isinstance(stream.read(0), bytes):
+        stream = codecs.getreader('utf-8-sig')(stream)
+    first = stream.readline()
+    delimiter = ';' if first.count(';') > first.count(',') else ','
+    header = [name.strip().lower() for name in next(csv.reader([first], delimiter=delimiter))]
+    positions = {}
+    for column, names in COLUMNS.items():
+        for index, name in enumerate(header):
+            if name in names:
+                positions[column] = index
+                break
+    missing = {'date', 'amount'} - positions.keys()
+    if missing:
+        raise StatementError(f"Missing statement columns: {', '.join(sorted(missing))}")
+
+    def cell(row, column):
+        index = positions.get(column)
+        return row[index].strip() if index is not None and index < len(row) else ''
+
+    for number, row in enumerate(csv.reader(stream, delimiter=delimiter), start=2):
+        if not any(row):
+            continue
+        yield (
+            number,
+            parse_date(cell(row, 'date')),
+            parse_amount(cell(row, 'amount')),
+            cell(row, 'reference'),
+            cell(row, 'label'),
+        )
+
+
+class PaymentIndex:
+    """
+    Unreconciled payments by reference number, invoice number and (amount, day)
+    """
+
+    def __init__(self, payments):
+        self.payments = {}
+        self.by_reference = defaultdict(list)
+        self.by_invoice = defaultdict(list)
+        self.by_amount = defaultdict(list)
+        for payment in payments:
+            self.payments[payment['id']] = payment
+            if normalize(payment['reference_number']):
+                self.by_reference[normalize(payment['reference_number'])].append(payment['id'])
+            self.by_invoice[normalize(payment['invoice__invoice_number'])].append(payment['id'])
+            self.by_amount[payment['amount'], payment['day']].append(payment['id'])
+
+    def take(self, candidates, amount):
+        """
+        First candidate still unmatched with this amount; removes it
+        """
+        for payment_id in candidates:
+            payment = self.payments.get(payment_id)
+            if payment is not None and payment['amount'] == amount:
+                return self.payments.pop(payment_id)
+        return None
+
+    def match(self, day, amount, reference, label):
+        """
+        (payment, rule) of a statement line, or (None, None)
+        """
+        key = normalize(reference)
+        if key:
+            payment = self.take(self.by_reference.get(key, ()), amount)
+            if payment:
+                return payment, 'reference'
+        words = [normalize(word) for word in WORD.findall(f'{reference} {label}')]
+        for word in words:
+            payment = self.take(self.by_invoice.get(word, ()), amount)
+            if payment:
+                return payment, 'invoice'
+        for word in words:
+            payment = self.take(self.by_reference.get(word, ()), amount)
+            if payment:
+                return payment, 'label'
+        candidates = [
+            payment_id
+            for offset in range(-RECONCILE_DATE_WINDOW.days, RECONCILE_DATE_WINDOW.days + 1)
+            for payment_id in self.by_amount.get((amount, day + timedelta(days=offset)), ())
+            if payment_id in self.payments
+        ]
+        if len(candidates) == 1:
+            return self.payments.pop(candidates[0]), 'amount'
+        return None, None
+
+
+def unreconciled_payments():
+    return Payment.objects.filter(
+        status='completed', payment_method__in=RECONCILE_METHODS, reconciled_at__isnull=True
+    )
+
+
+def payment_day(payment_date):
+    return (timezone.localtime(payment_date) if timezone.is_aware(payment_date) else payment_date).date()
+
+
+def reconcile_statement(stream, dry_run=False):
+    """
+    Match a statement against the unreconciled payments and mark the matches. Returns the report.
+    """
+    payments = list(unreconciled_payments().values(
+        'id', 'amount', 'reference_number', 'payment_date', 'payment_method', 'invoice__invoice_number'
+    ))
+    for payment in payments:
+        payment['day'] = payment_day(payment['payment_date'])
+    index = PaymentIndex(payments)
+
+    matched, unmatched_lines = [], []
+    first_day = last_day = None
+    for number, day, amount, reference, label in statement_lines(stream):
+        first_day = min(first_day or day, day)
+        last_day = max(last_day or day, day)
+        if amount is None or amount <= 0:
+            continue
+        payment, rule = index.match(day, amount, reference, label)
+        if payment:
+            matched.append({
+                'line': number, 'payment_id': payment['id'], 'rule': rule,
+                'amount': f"{amount:.2f}", 'statement_reference': reference or label[:100],
+            })
+        else:
+            unmatched_lines.append({
+                'line': number, 'date': day.isoformat(), 'amount': f"{amount:.2f}",
+                'reference': reference, 'label': label,
+            })
+
+    if matched and not dry_run:
+        now = timezone.now()
+        with transaction.atomic():
+            Payment.objects.bulk_update(
+                [
+                    Payment(id=row['payment_id'], reconciled_at=now, statement_reference=row['statement_reference'][:100])
+                    for row in matched
+                ],
+                ['reconciled_at', 'statement_reference'],
+                batch_size=RECONCILE_BATCH_SIZE
+            )
+
+    unmatched_payments = []
+    if first_day:
+        unmatched_payments = [
+            {
+                'payment_id': payment['id'], 'date': payment['day'].isoformat(), 'amount': f"{payment['amount']:.2f}",
+                'reference_number': payment['reference_number'], 'invoice_number': payment['invoice__invoice_number'],
+            }
+            for payment in sorted(index.payments.values(), key=lambda payment: (payment['day'], payment['id']))
+            if first_day <= payment['day'] <= last_day
+        ]
+
+    return {
+        'dry_run': dry_run,
+        'start_date': first_day.isoformat() if first_day else None,
+        'end_date': last_day.isoformat() if last_day else None,
+        'matched': matched,
+        'unmatched_lines': unmatched_lines,
+        'unmatched_payments': unmatched_payments,
+    }
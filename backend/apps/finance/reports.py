@@ -0,0 +1,104 @@
+"""
+Financial report generation.
+
+Totals of a period are read from the daily ledger rollup (see ledger.py)
+with one grouped query, at most a few rows per day of the period, never by
+loading transactions:
+
+- income: completed payments of non-salary invoices, by payment method and invoice type
+- expenses: Expense rows by category, plus paid teacher salary invoices
+"""
+import calendar
+from datetime import date
+from decimal import Decimal
+
+from .ledger import ZERO, period_totals
+from .models import FinancialReport
+
+REPORT_TITLES = {
+    'monthly': "Rapport financier {start:%m/%Y}",
+    'yearly': "Rapport financier {start:%Y}",
+    'custom': "Rapport financier du {start:%d/%m/%Y} au {end:%d/%m/%Y}",
+}
+
+
+def report_period(report_type, year=None, month=None, start_date=None, end_date=None):
+    """
+    (start, end) dates, both included, of a monthly, yearly or custom report.
+    Raises ValueError on a missing or invalid period.
+    """
+    if report_type == 'monthly':
+        year, month = int(year), int(month)
+        return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+    if report_type == 'yearly':
+        year = int(year)
+        return date(year, 1, 1), date(year, 12, 31)
+    if report_type == 'custom':
+        start, end = date.fromisoformat(str(start_date)), date.fromisoformat(str(end_date))
+        if start > end:
+            raise ValueError('start_date must not be after end_date')
+        return start, end
+    raise ValueError(f'Unknown report type: {report_type}')
+
+
+def amount(value):
+    return f"{(value or ZERO):.2f}"
+
+
+def compute_report(start, end):
+    """
+    Summary of the period's income and expenses, JSON-ready (amounts as strings)
+    """
+    by_method, by_invoice_type, by_category = {}, {}, {}
+    income = expenses = salaries = ZERO
+    payment_count = expense_count = salary_count = 0
+    for (entry_type, category, payment_method), (total, count) in period_totals(start, end).items():
+        if entry_type == 'income':
+            by_method[payment_method] = by_method.get(payment_method, ZERO) + total
+            by_invoice_type[category] = by_invoice_type.get(category, ZERO) + total
+            income += total
+            payment_count += count
+        elif entry_type == 'expense':
+            by_category[category] = by_category.get(category, ZERO) + total
+            expenses += total
+            expense_count += count
+        else:
+            salaries += total
+            salary_count += count
+    expenses += salaries
+
+    return {
+        'start_date': start.isoformat(),
+        'end_date': end.isoformat(),
+        'income': {
+            'total': amount(income),
+            'payment_count': payment_count,
+            'by_payment_method': {key: amount(value) for key, value in sorted(by_method.items())},
+            'by_invoice_type': {key: amount(value) for key, value in sorted(by_invoice_type.items())},
+        },
+        'expenses': {
+            'total': amount(expenses),
+            'expense_count': expense_count,
+            'by_category': {key: amount(value) for key, value in sorted(by_category.items())},
+            'salaries': amount(salaries),
+            'salary_invoice_count': salary_count,
+        },
+        'net_profit': amount(income - expenses),
+    }
+
+
+def generate_report(report_type, start, end, user, title=''):
+    """
+    Compute and store a FinancialReport for the period
+    """
+    summary = compute_report(start, end)
+    return FinancialReport.objects.create(
+        title=title or REPORT_TITLES[report_type].format(start=start, end=end),
+        report_type=report_type,
+        start_date=start,
+        end_date=end,
+        total_income=Decimal(summary['income']['total']),
+        total_expenses=Decimal(summary['expenses']['total']),
+        summary=summary,
+        generated_by=user
+    )
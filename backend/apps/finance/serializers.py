@@ -6,12 +6,42 @@ class InvoiceSerializer(serializers.ModelSerializer):
     class Meta:
         model = Invoice
         fields = '__all__'
+        read_only_fields = ['amount_paid', 'balance_due']
 
 
 class PaymentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Payment
         fields = '__all__'
+        read_only_fields = ['reconciled_at', 'statement_reference']
+
+
+class PaymentPostingSerializer(serializers.Serializer):
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    payment_method = serializers.ChoiceField(choices=Payment.PAYMENT_METHOD_CHOICES)
+    payment_date = serializers.DateTimeField(required=False)
+    reference_number = serializers.CharField(max_length=100, required=False, allow_blank=True)
+    notes = serializers.CharField(required=False, allow_blank=True)
+
+
+class FeeSerializer(serializers.Serializer):
+    description = serializers.CharField()
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+    due_date = serializers.DateField()
+
+
+class BulkInvoiceSerializer(serializers.Serializer):
+    fees = FeeSerializer(many=True, allow_empty=False)
+    class_id = serializers.IntegerField(required=False)
+    level_id = serializers.IntegerField(required=False)
+    academic_year_id = serializers.IntegerField(required=False)
+    invoice_type = serializers.ChoiceField(choices=Invoice.INVOICE_TYPE_CHOICES, default='tuition')
+    preview = serializers.BooleanField(default=False)
+    
+    def validate(self, data):
+        if not any(data.get(key) for key in ('class_id', 'level_id', 'academic_year_id')):
+            raise serializers.ValidationError('A class_id, level_id or academic_year_id target is required')
+        return data
 
 
 class ReceiptSerializer(serializers.ModelSerializer):
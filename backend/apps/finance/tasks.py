@@ -0,0 +1,43 @@
+import logging
+
+from celery import shared_task
+
+from .dashboard import invalidate_dashboard
+from .ledger import ledger_drift, rebuild_ledger
+from .overdue import send_overdue_reminders, sweep_overdue
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def check_ledger_drift(fix=True):
+    """
+    Compare the daily ledger with the transactions, and rebuild it when they disagree
+    """
+    drift = ledger_drift()
+    if not drift:
+        return
+    logger.warning("Daily ledger has drifted on %s rows: %s", len(drift), drift[:10])
+    if fix:
+        rebuild_ledger()
+        invalidate_dashboard()
+
+
+@shared_task
+def sweep_overdue_invoices(remind=False):
+    """
+    Mark pending invoices past their due date overdue, and optionally queue
+    the parents' reminders. The result is the number of invoices swept.
+    """
+    invoice_ids = sweep_overdue()
+    if invoice_ids and remind:
+        send_invoice_reminders.delay(invoice_ids)
+    return len(invoice_ids)
+
+
+@shared_task
+def send_invoice_reminders(invoice_ids):
+    """
+    Mail the parents of the invoices a sweep turned overdue. The result is the number of mails sent.
+    """
+    return send_overdue_reminders(invoice_ids)
@@ -1,3 +1,628 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from importlib import import_module
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apps.documents.storage import document_storage
+from apps.finance.aging import aging_report
+from apps.finance.dashboard import cached_dashboard_kpis
+from apps.finance.ledger import ledger_drift, rebuild_ledger, stored_totals
+from apps.finance.models import Expense, FinancialReport, Invoice, LedgerDay, Payment, Receipt
+from apps.finance import numbering
+from apps.finance.numbering import created_sequences, number_gaps, reserve_numbers, sequence_name
+from apps.finance.overdue import send_overdue_reminders, sweep_overdue
+from apps.finance.reports import compute_report, report_period
+from apps.finance.tasks import check_ledger_drift, sweep_overdue_invoices
+from factories import (
+    UserFactory, InstitutionFactory, InvoiceFactory, PaymentFactory, ExpenseFactory, ClassFactory, LevelFactory,
+    StudentClassFactory, ParentStudentFactory, AcademicYearFactory, TeacherFactory
+)
+
+
+def paid_at(year, month, day, hour=10):
+    return timezone.make_aware(datetime(year, month, day, hour))
+
+
+class FinancialReportTest(APITestCase):
+    url = '/api/finance/financial-reports/generate/'
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        InstitutionFactory()
+        self.client.force_authenticate(user=UserFactory(role='manager'))
+
+        tuition = InvoiceFactory(invoice_type='tuition', amount=Decimal('500.00'), status='paid')
+        PaymentFactory(invoice=tuition, amount=Decimal('300.00'), payment_method='cash',
+                       status='completed', payment_date=paid_at(2024, 3, 1, 0))
+        PaymentFactory(invoice=tuition, amount=Decimal('200.00'), payment_method='card',
+                       status='completed', payment_date=paid_at(2024, 3, 31, 23))
+        # Not income: pending, outside the month, salary payment
+        PaymentFactory(invoice=tuition, amount=Decimal('50.00'), status='pending', payment_date=paid_at(2024, 3, 5))
+        PaymentFactory(invoice=tuition, amount=Decimal('70.00'), status='completed', payment_date=paid_at(2024, 4, 1, 0))
+        salary = InvoiceFactory(invoice_type='salary', amount=Decimal('900.00'), status='paid', due_date=date(2024, 3, 28))
+        PaymentFactory(invoice=salary, amount=Decimal('900.00'), status='completed', payment_date=paid_at(2024, 3, 28))
+        InvoiceFactory(invoice_type='salary', amount=Decimal('800.00'), status='pending', due_date=date(2024, 3, 28))
+
+        ExpenseFactory(category='utilities', amount=Decimal('120.00'), expense_date=date(2024, 3, 10))
+        ExpenseFactory(category='utilities', amount=Decimal('30.00'), expense_date=date(2024, 3, 20))
+        ExpenseFactory(category='supplies', amount=Decimal('45.50'), expense_date=date(2024, 3, 31))
+        ExpenseFactory(category='supplies', amount=Decimal('99.00'), expense_date=date(2024, 2, 29))
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_monthly_totals_and_breakdowns(self):
+        summary = compute_report(*report_period('monthly', 2024, 3))
+        self.assertEqual(summary['income']['total'], '500.00')
+        self.assertEqual(summary['income']['by_payment_method'], {'card': '200.00', 'cash': '300.00'})
+        self.assertEqual(summary['income']['by_invoice_type'], {'tuition': '500.00'})
+        self.assertEqual(summary['expenses']['by_category'], {'supplies': '45.50', 'utilities': '150.00'})
+        self.assertEqual(summary['expenses']['salaries'], '900.00')
+        self.assertEqual(summary['expenses']['total'], '1095.50')
+        self.assertEqual(summary['net_profit'], '-595.50')
+
+    def test_report_is_computed_with_constant_queries(self):
+        start, end = report_period('yearly', 2024)
+        with self.assertNumQueries(1):
+            compute_report(start, end)
+        invoice = InvoiceFactory(invoice_type='tuition')
+        Payment.objects.bulk_create([
+            Payment(invoice=invoice, amount=Decimal('10.00'), payment_method='cash',
+                    payment_date=paid_at(2024, 1 + i % 12, 1 + i % 28), status='completed')
+            for i in range(500)
+        ])
+        # bulk_create sends no signals
+        rebuild_ledger(start, end)
+        with self.assertNumQueries(1):
+            summary = compute_report(start, end)
+        self.assertEqual(summary['income']['payment_count'], 503)
+
+    def test_generate_action_stores_report_and_renders_file(self):
+        response = self.client.post(self.url, {'report_type': 'monthly', 'year': 2024, 'month': 3, 'render': 'true'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        report = FinancialReport.objects.get(id=response.data['id'])
+        self.assertEqual(report.total_income, Decimal('500.00'))
+        self.assertEqual(report.net_profit, Decimal('-595.50'))
+        self.assertEqual(response.data['summary']['expenses']['salaries'], '900.00')
+        self.assertEqual((report.start_date, report.end_date), (date(2024, 3, 1), date(2024, 3, 31)))
+        with document_storage().open(report.file_path, 'rb') as f:
+            self.assertTrue(f.read().startswith(b'%PDF'))
+
+        response = self.client.post(self.url, {
+            'report_type': 'custom', 'start_date': '2024-02-01', 'end_date': '2024-03-15', 'language': 'ar',
+            'render': 'true'
+        })
+        self.assertEqual(response.data['total_expenses'], '219.00')
+        self.assertEqual(response.data['summary']['income']['total'], '300.00')
+
+        self.assertEqual(self.client.post(self.url, {'report_type': 'monthly', 'year': 2024}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post(self.url, {
+            'report_type': 'custom', 'start_date': '2024-03-01', 'end_date': '2024-02-01'
+        }).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class LedgerDayTest(TestCase):
+    def setUp(self):
+        self.invoice = InvoiceFactory(invoice_type='tuition', amount=Decimal('500.00'))
+
+    def test_ledger_follows_payment_expense_and_invoice_changes(self):
+        payment = PaymentFactory(invoice=self.invoice, amount=Decimal('100.00'), payment_method='cash',
+                                 status='pending', payment_date=paid_at(2024, 3, 1))
+        self.assertFalse(stored_totals())
+
+        payment.status = 'completed'
+        payment.save()
+        PaymentFactory(invoice=self.invoice, amount=Decimal('50.00'), payment_method='cash',
+                       status='completed', payment_date=paid_at(2024, 3, 1, 15))
+        self.assertEqual(stored_totals(), {
+            (date(2024, 3, 1), 'income', 'tuition', 'cash'): (Decimal('150.00'), 2)
+        })
+
+        payment.payment_date = paid_at(2024, 3, 2)
+        payment.payment_method = 'card'
+        payment.save()
+        self.invoice.invoice_type = 'other'
+        self.invoice.save()
+        self.assertEqual(stored_totals(), {
+            (date(2024, 3, 1), 'income', 'other', 'cash'): (Decimal('50.00'), 1),
+            (date(2024, 3, 2), 'income', 'other', 'card'): (Decimal('100.00'), 1),
+        })
+
+        payment.delete()
+        expense = ExpenseFactory(category='utilities', amount=Decimal('30.00'), expense_date=date(2024, 3, 5))
+        expense.amount = Decimal('45.00')
+        expense.save()
+        salary = InvoiceFactory(invoice_type='salary', amount=Decimal('900.00'), status='pending',
+                                due_date=date(2024, 3, 28))
+        salary.status = 'paid'
+        salary.save()
+        self.assertEqual(stored_totals(), {
+            (date(2024, 3, 1), 'income', 'other', 'cash'): (Decimal('50.00'), 1),
+            (date(2024, 3, 5), 'expense', 'utilities', ''): (Decimal('45.00'), 1),
+            (date(2024, 3, 28), 'salary', 'salary', ''): (Decimal('900.00'), 1),
+        })
+        self.assertEqual(ledger_drift(), [])
+
+    def test_drift_is_detected_and_rebuilt(self):
+        PaymentFactory(invoice=self.invoice, amount=Decimal('100.00'), payment_method='cash',
+                       status='completed', payment_date=paid_at(2024, 3, 1))
+        # Bypasses the signals
+        Payment.objects.update(amount=Decimal('120.00'))
+        key = (date(2024, 3, 1), 'income', 'tuition', 'cash')
+        self.assertEqual(ledger_drift(), [(key, (Decimal('100.00'), 1), (Decimal('120.00'), 1))])
+
+        with self.assertRaises(CommandError):
+            call_command('check_ledger', '--start', '2024-03-01', '--end', '2024-03-31', stdout=StringIO())
+        call_command('check_ledger', '--fix', stdout=StringIO())
+        self.assertEqual(ledger_drift(), [])
+        self.assertEqual(LedgerDay.objects.get().total, Decimal('120.00'))
+
+        # Rebuilding a period leaves the other days alone
+        ExpenseFactory(category='supplies', amount=Decimal('10.00'), expense_date=date(2024, 4, 2))
+        LedgerDay.objects.filter(date=date(2024, 3, 1)).update(total=0)
+        rebuild_ledger(date(2024, 4, 1), date(2024, 4, 30))
+        self.assertEqual(len(ledger_drift()), 1)
+        call_command('rebuild_ledger', stdout=StringIO())
+        self.assertEqual(ledger_drift(), [])
+
+
+class InvoiceBalanceTest(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(user=UserFactory(role='manager'))
+        self.invoice = InvoiceFactory(invoice_type='tuition', amount=Decimal('500.00'), status='pending',
+                                      due_date=date(2030, 1, 1))
+
+    def test_balance_and_status_follow_payments(self):
+        self.assertEqual(self.invoice.balance_due, Decimal('500.00'))
+        payment = PaymentFactory(invoice=self.invoice, amount=Decimal('200.00'), status='completed')
+        PaymentFactory(invoice=self.invoice, amount=Decimal('300.00'), status='pending')
+        self.invoice.refresh_from_db()
+        self.assertEqual((self.invoice.amount_paid, self.invoice.balance_due), (Decimal('200.00'), Decimal('300.00')))
+        self.assertEqual(self.invoice.status, 'pending')
+
+        Payment.objects.filter(status='pending').get().delete()
+        PaymentFactory(invoice=self.invoice, amount=Decimal('300.00'), status='completed')
+        self.invoice.refresh_from_db()
+        self.assertEqual((self.invoice.balance_due, self.invoice.status), (Decimal('0.00'), 'paid'))
+
+        payment.status = 'refunded'
+        payment.save()
+        self.invoice.refresh_from_db()
+        self.assertEqual((self.invoice.balance_due, self.invoice.status), (Decimal('200.00'), 'pending'))
+
+        self.invoice.amount = Decimal('300.00')
+        self.invoice.save()
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.balance_due, Decimal('0.00'))
+
+    def test_pay_action_posts_payment_and_rejects_overpayment(self):
+        url = f'/api/finance/invoices/{self.invoice.id}/pay/'
+        response = self.client.post(url, {'amount': '600.00', 'payment_method': 'cash'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(url, {'amount': '500.00', 'payment_method': 'cash'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['invoice']['balance_due'], '0.00')
+        self.assertEqual(response.data['invoice']['status'], 'paid')
+
+        response = self.client.post(url, {'amount': '10.00', 'payment_method': 'cash'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invoices_filter_and_sort_by_balance(self):
+        other = InvoiceFactory(invoice_type='tuition', amount=Decimal('900.00'), status='pending')
+        PaymentFactory(invoice=other, amount=Decimal('100.00'), status='completed')
+        response = self.client.get('/api/finance/invoices/', {'balance_due__gt': '0', 'ordering': '-balance_due'})
+        self.assertEqual([row['id'] for row in response.data['results']], [other.id, self.invoice.id])
+
+    def test_backfill_settles_open_invoices_paid_in_full(self):
+        cancelled = InvoiceFactory(invoice_type='tuition', amount=Decimal('500.00'), status='cancelled')
+        partial = InvoiceFactory(invoice_type='tuition', amount=Decimal('500.00'), status='overdue')
+        PaymentFactory(invoice=self.invoice, amount=Decimal('500.00'), status='completed')
+        PaymentFactory(invoice=cancelled, amount=Decimal('500.00'), status='completed')
+        PaymentFactory(invoice=partial, amount=Decimal('100.00'), status='completed')
+        # As before the balance columns existed
+        Invoice.objects.update(amount_paid=0, balance_due=0)
+        Invoice.objects.filter(id=self.invoice.id).update(status='pending')
+        Invoice.objects.filter(id=cancelled.id).update(status='cancelled')
+
+        import_module('apps.finance.migrations.0004_invoice_balance').fill_balances(django_apps, None)
+        statuses = dict(Invoice.objects.values_list('id', 'status'))
+        self.assertEqual(statuses[self.invoice.id], 'paid')
+        self.assertEqual(statuses[cancelled.id], 'cancelled')
+        self.assertEqual(statuses[partial.id], 'overdue')
+        self.assertEqual(Invoice.objects.get(id=partial.id).balance_due, Decimal('400.00'))
+
+
+class ReceivablesAgingTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=UserFactory(role='manager'))
+        self.today = timezone.localdate()
+        level = LevelFactory(name='Primaire')
+        self.class_a = ClassFactory(name='A', level=level)
+        self.class_b = ClassFactory(name='B', level=level)
+        self.student_a = StudentClassFactory(class_obj=self.class_a, is_active=True).student
+        self.student_b = StudentClassFactory(class_obj=self.class_b, is_active=True).student
+
+        self.owed(self.student_a, '100.00', 0)
+        self.owed(self.student_a, '200.00', 1)
+        self.owed(self.student_a, '300.00', 45)
+        self.owed(self.student_b, '400.00', 61)
+        self.owed(self.student_b, '500.00', 120)
+        partly_paid = self.owed(self.student_b, '600.00', 10)
+        PaymentFactory(invoice=partly_paid, amount=Decimal('150.00'), status='completed')
+        # Not receivables: paid, cancelled, salary
+        self.owed(self.student_a, '700.00', 30, status='paid')
+        self.owed(self.student_a, '800.00', 30, status='cancelled')
+        self.owed(self.student_a, '900.00', 30, invoice_type='salary')
+
+    def owed(self, student, amount, days_overdue, status='pending', invoice_type='tuition'):
+        return InvoiceFactory(student=student, amount=Decimal(amount), status=status, invoice_type=invoice_type,
+                              due_date=self.today - timedelta(days=days_overdue))
+
+    def test_buckets_by_class_and_level_in_one_query(self):
+        with self.assertNumQueries(2):
+            report = aging_report(self.today)
+        self.assertEqual(report['totals'], {
+            'current': '100.00', '1_30': '650.00', '31_60': '300.00', '61_90': '400.00', '90_plus': '500.00',
+            'total': '1950.00', 'invoice_count': 6
+        })
+        class_a, class_b = report['classes']
+        self.assertEqual((class_a['class_id'], class_a['total']), (self.class_a.id, '600.00'))
+        self.assertEqual(class_b['buckets']['1_30'], '450.00')
+        self.assertEqual(report['levels'][0]['level_name'], 'Primaire')
+        self.assertEqual(report['levels'][0]['buckets'], {key: report['totals'][key] for key in report['buckets']})
+
+    def test_aging_endpoint_is_cached_and_drills_down(self):
+        response = self.client.get('/api/finance/invoices/aging/')
+        self.assertEqual(response.data['totals']['total'], '1950.00')
+        self.owed(self.student_a, '1000.00', 5)
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/finance/invoices/aging/')
+        self.assertEqual(response.data['totals']['total'], '1950.00')
+
+        response = self.client.get('/api/finance/invoices/aging/invoices/', {
+            'bucket': '1_30', 'class_id': self.class_a.id
+        })
+        self.assertEqual(sorted(row['amount'] for row in response.data['results']), ['1000.00', '200.00'])
+        response = self.client.get('/api/finance/invoices/aging/invoices/', {
+            'bucket': '90_plus', 'level_id': self.class_b.level_id
+        })
+        self.assertEqual([row['amount'] for row in response.data['results']], ['500.00'])
+        response = self.client.get('/api/finance/invoices/aging/invoices/', {'bucket': '1_2'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class OverdueSweepTest(TestCase):
+    def setUp(self):
+        today = timezone.localdate()
+        self.late = InvoiceFactory(status='pending', due_date=today - timedelta(days=1), invoice_type='tuition')
+        self.due_today = InvoiceFactory(status='pending', due_date=today)
+        self.paid = InvoiceFactory(status='paid', due_date=today - timedelta(days=10))
+        ParentStudentFactory(student=self.late.student, parent__user__preferred_language='ar')
+        ParentStudentFactory(student=self.late.student, parent__user__preferred_language='fr')
+
+    def test_sweep_marks_late_pending_invoices_in_one_update(self):
+        with self.assertNumQueries(1):
+            invoice_ids = sweep_overdue()
+        self.assertEqual(invoice_ids, [self.late.id])
+        statuses = dict(Invoice.objects.values_list('id', 'status'))
+        self.assertEqual(statuses, {self.late.id: 'overdue', self.due_today.id: 'pending', self.paid.id: 'paid'})
+        self.assertEqual(sweep_overdue(), [])
+
+        self.assertEqual(send_overdue_reminders(invoice_ids), 2)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual({self.late.invoice_number in message.subject for message in mail.outbox}, {True})
+
+    def test_command_sweeps_and_reminds(self):
+        out = StringIO()
+        call_command('sweep_overdue_invoices', '--remind', stdout=out)
+        self.assertIn('Marked 1 invoices overdue', out.getvalue())
+        self.assertEqual(len(mail.outbox), 2)
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=True)
+    def test_reminders_only_target_the_invoices_swept(self):
+        # Turned overdue by an earlier sweep, in the same second or not: not reminded again
+        earlier = InvoiceFactory(status='overdue', due_date=self.late.due_date, student=self.late.student)
+        Invoice.objects.filter(id=earlier.id).update(updated_at=timezone.now())
+
+        self.assertEqual(sweep_overdue_invoices.apply(kwargs={'remind': True}).get(), 1)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertNotIn(earlier.invoice_number, ' '.join(message.subject for message in mail.outbox))
+
+
+class BulkInvoicingTest(APITestCase):
+    url = '/api/finance/invoices/bulk/'
+
+    def setUp(self):
+        self.client.force_authenticate(user=UserFactory(role='manager'))
+        self.year = AcademicYearFactory()
+        primaire = LevelFactory()
+        sixieme = LevelFactory(parent_level=primaire)
+        self.class_a = ClassFactory(level=primaire, academic_year=self.year)
+        self.class_b = ClassFactory(level=sixieme, academic_year=self.year)
+        StudentClassFactory.create_batch(3, class_obj=self.class_a, is_active=True)
+        StudentClassFactory.create_batch(2, class_obj=self.class_b, is_active=True)
+        StudentClassFactory(class_obj=self.class_b, is_active=False)
+        StudentClassFactory(is_active=True)
+        self.fees = [
+            {'description': 'Frais T1', 'amount': '300.00', 'due_date': '2024-10-01'},
+            {'description': 'Frais T2', 'amount': '250.00', 'due_date': '2025-01-01'},
+        ]
+
+    def test_preview_writes_nothing(self):
+        response = self.client.post(self.url, {
+            'fees': self.fees, 'level_id': self.class_a.level_id, 'preview': True
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['students'], response.data['invoices']), (5, 10))
+        self.assertEqual(response.data['total_amount'], '2750.00')
+        self.assertFalse(Invoice.objects.exists())
+
+    def test_invoices_target_once_in_constant_queries(self):
+        # First allocation of the year in this process: 2 of the queries are the savepoint creating the sequence
+        created_sequences.discard(sequence_name('invoice', timezone.localdate().year))
+        with self.assertNumQueries(8):
+            response = self.client.post(self.url, {'fees': self.fees, 'class_id': self.class_b.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['invoices'], 4)
+        invoice = Invoice.objects.first()
+        self.assertEqual((invoice.status, invoice.balance_due), ('pending', invoice.amount))
+        self.assertTrue(invoice.invoice_number)
+
+        response = self.client.post(self.url, {'fees': self.fees, 'academic_year_id': self.year.id}, format='json')
+        self.assertEqual((response.data['invoices'], response.data['skipped']), (6, 4))
+        self.assertEqual(Invoice.objects.filter(invoice_type='tuition').count(), 10)
+
+        response = self.client.post(self.url, {'fees': self.fees}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class NumberingTest(TestCase):
+    def test_numbers_are_sequential_per_kind_and_year(self):
+        year = timezone.localdate().year
+        self.addCleanup(created_sequences.discard, sequence_name('invoice', year))
+        with self.captureOnCommitCallbacks(execute=True):
+            first = InvoiceFactory(invoice_number='')
+        second = InvoiceFactory(invoice_number='')
+        self.assertRegex(first.invoice_number, rf'^INV-{year}-\d{{6}}$')
+        self.assertEqual(int(second.invoice_number[-6:]), int(first.invoice_number[-6:]) + 1)
+
+        with self.assertNumQueries(1):
+            numbers = reserve_numbers('invoice', 3)
+        self.assertEqual(
+            [int(number[-6:]) for number in numbers],
+            [int(second.invoice_number[-6:]) + i for i in (1, 2, 3)]
+        )
+        self.assertEqual(reserve_numbers('receipt', 1, year=1999), ['RCP-1999-000001'])
+
+    def test_sequence_is_created_once_per_process(self):
+        name = sequence_name('invoice', 1998)
+        self.addCleanup(created_sequences.discard, name)
+        with CaptureQueriesContext(connection) as first, self.captureOnCommitCallbacks(execute=True):
+            reserve_numbers('invoice', 1, year=1998)
+        self.assertTrue(any('CREATE SEQUENCE' in query['sql'] for query in first))
+
+        with CaptureQueriesContext(connection) as then:
+            self.assertEqual(reserve_numbers('invoice', 2, year=1998), ['INV-1998-000002', 'INV-1998-000003'])
+        self.assertEqual(len(then), 1)
+        self.assertNotIn('CREATE SEQUENCE', then[0]['sql'])
+
+    def test_failed_creation_does_not_mark_the_sequence(self):
+        name = sequence_name('invoice', 1997)
+        self.addCleanup(created_sequences.discard, name)
+        with mock.patch('apps.finance.numbering.allocate', side_effect=DatabaseError('connection lost')), \
+                self.captureOnCommitCallbacks(execute=True), self.assertRaises(DatabaseError):
+            reserve_numbers('invoice', 1, year=1997)
+        self.assertNotIn(name, created_sequences)
+
+    def test_sequence_created_concurrently_is_used(self):
+        name = sequence_name('invoice', 1996)
+        self.addCleanup(created_sequences.discard, name)
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE SEQUENCE {name}")
+
+        def allocate(statement, count):
+            if 'CREATE SEQUENCE' in statement:
+                raise IntegrityError('duplicate key value violates unique constraint "pg_type_typname_nsp_index"')
+            return real_allocate(statement, count)
+
+        real_allocate = numbering.allocate
+        with mock.patch('apps.finance.numbering.allocate', side_effect=allocate):
+            self.assertEqual(reserve_numbers('invoice', 2, year=1996), ['INV-1996-000001', 'INV-1996-000002'])
+        self.assertIn(name, created_sequences)
+
+    def test_gaps_list_reserved_numbers_never_used(self):
+        for value in (1, 2, 5, 9):
+            InvoiceFactory(invoice_number=f'INV-2001-{value:06d}')
+        InvoiceFactory(invoice_number='INV-3F2A91BC')
+        self.assertEqual(number_gaps(Invoice.objects.all(), 'invoice_number', 'invoice', 2001), [(3, 4), (6, 8)])
+        self.assertEqual(number_gaps(Receipt.objects.all(), 'receipt_number', 'receipt', 2001), [])
+
+
+class StatementReconciliationTest(APITestCase):
+    url = '/api/finance/payments/reconcile/'
+
+    def setUp(self):
+        self.client.force_authenticate(user=UserFactory(role='manager'))
+        invoice = InvoiceFactory(invoice_number='INV-2024-000007', amount=Decimal('2000.00'), status='pending')
+
+        def pay(amount, day, method='bank_transfer', reference=''):
+            return PaymentFactory(invoice=invoice, amount=Decimal(amount), payment_method=method,
+                                  reference_number=reference, payment_date=paid_at(2024, 3, day), status='completed')
+
+        self.by_reference = pay('300.00', 1, reference='VIR-8812')
+        self.by_invoice = pay('150.00', 2)
+        self.by_label = pay('80.00', 3, method='cheque', reference='CHQ 4410')
+        self.by_amount = pay('42.50', 10)
+        self.ambiguous = [pay('60.00', 12), pay('60.00', 13)]
+        self.cash = pay('300.00', 1, method='cash', reference='VIR-8812')
+        self.unpaid = pay('99.00', 20)
+
+    def statement(self):
+        return SimpleUploadedFile('statement.csv', (
+            "Date;Montant;Référence;Libellé\n"
+            "01/03/2024;300,00;vir 8812;VIREMENT PARENT\n"
+            "02/03/2024;150,00;;VIR RECU FACTURE INV-2024-000007\n"
+            "04/03/2024;80,00;;REMISE CHQ4410\n"
+            "12/03/2024;42,50;;VIREMENT\n"
+            "12/03/2024;60,00;;VIREMENT\n"
+            "15/03/2024;1 250,00;;INCONNU\n"
+            "31/03/2024;-20,00;;FRAIS BANCAIRES\n"
+        ).encode('utf-8'), content_type='text/csv')
+
+    def test_statement_lines_match_by_rule_and_mark_payments(self):
+        response = self.client.post(self.url, {'file': self.statement(), 'dry_run': 'true'})
+        self.assertEqual(len(response.data['matched']), 4)
+        self.assertFalse(Payment.objects.filter(reconciled_at__isnull=False).exists())
+
+        response = self.client.post(self.url, {'file': self.statement()})
+        rules = {row['payment_id']: row['rule'] for row in response.data['matched']}
+        self.assertEqual(rules, {
+            self.by_reference.id: 'reference', self.by_invoice.id: 'invoice',
+            self.by_label.id: 'label', self.by_amount.id: 'amount',
+        })
+        self.assertEqual([row['line'] for row in response.data['unmatched_lines']], [6, 7])
+        self.assertEqual(
+            {row['payment_id'] for row in response.data['unmatched_payments']},
+            {payment.id for payment in self.ambiguous} | {self.unpaid.id}
+        )
+        self.assertEqual(set(Payment.objects.filter(reconciled_at__isnull=False).values_list('id', flat=True)),
+                         set(rules))
+
+        # Reconciled payments are not matched again
+        response = self.client.post(self.url, {'file': self.statement()})
+        self.assertEqual(response.data['matched'], [])
+
+    def test_debit_lines_of_a_debit_credit_statement_are_skipped(self):
+        statement = SimpleUploadedFile('statement.csv', (
+            "Date;Libellé;Débit;Crédit\n"
+            "01/03/2024;FRAIS TENUE;12,00;\n"
+            "01/03/2024;VIR-8812;;300,00\n"
+        ).encode('utf-8'), content_type='text/csv')
+        response = self.client.post(self.url, {'file': statement, 'dry_run': 'true'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(row['line'], row['payment_id']) for row in response.data['matched']],
+                         [(3, self.by_reference.id)])
+        self.assertEqual(response.data['unmatched_lines'], [])
+
+    def test_statement_without_amount_column_is_rejected(self):
+        statement = SimpleUploadedFile('statement.csv', b"date,label\n2024-03-01,X\n", content_type='text/csv')
+        response = self.client.post(self.url, {'file': statement})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PayrollTest(APITestCase):
+    url = '/api/finance/invoices/payroll/'
+
+    def setUp(self):
+        self.manager = UserFactory(role='manager')
+        self.client.force_authenticate(user=self.manager)
+        self.veteran = TeacherFactory(salary=Decimal('1500.00'), hire_date=date(2020, 9, 1))
+        # Hired on the 21st of a 30-day month: 10 days of 30
+        self.newcomer = TeacherFactory(salary=Decimal('1200.00'), hire_date=date(2024, 4, 21))
+        TeacherFactory(salary=None, hire_date=date(2020, 9, 1))
+        TeacherFactory(salary=Decimal('1000.00'), hire_date=date(2020, 9, 1), is_active=False)
+        TeacherFactory(salary=Decimal('1000.00'), hire_date=date(2024, 5, 2))
+
+    def test_payroll_issues_prorated_invoices_once_per_month(self):
+        response = self.client.post(self.url, {'year': 2024, 'month': 4})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            (response.data['issued'], response.data['prorated'], response.data['without_salary']), (2, 1, 1)
+        )
+        self.assertEqual(response.data['total_amount'], '1900.00')
+        invoice = Invoice.objects.get(teacher=self.newcomer)
+        self.assertEqual((invoice.amount, invoice.due_date, invoice.period), (
+            Decimal('400.00'), date(2024, 4, 30), date(2024, 4, 1)
+        ))
+
+        response = self.client.post(self.url, {'year': 2024, 'month': 4})
+        self.assertEqual((response.data['issued'], response.data['already_issued']), (0, 2))
+        self.assertEqual(Invoice.objects.filter(invoice_type='salary').count(), 2)
+
+        self.assertEqual(self.client.post(self.url, {'year': 2024, 'month': 13}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+    def test_command_runs_payroll_of_a_month(self):
+        out = StringIO()
+        call_command('run_payroll', '--year', '2024', '--month', '5', '--preview', stdout=out)
+        self.assertIn('Would issue 3 salary invoices', out.getvalue())
+        self.assertFalse(Invoice.objects.exists())
+        call_command('run_payroll', '--year', '2024', '--month', '5', stdout=StringIO())
+        self.assertEqual(Invoice.objects.filter(period=date(2024, 5, 1), manager=self.manager).count(), 3)
+
+
+class FinanceDashboardTest(APITestCase):
+    url = '/api/finance/dashboard/'
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=UserFactory(role='manager'))
+        self.today = timezone.localdate()
+        this_month = timezone.make_aware(datetime.combine(self.today.replace(day=1), datetime.min.time()))
+        last_month = this_month - timedelta(days=3)
+        self.invoice = InvoiceFactory(invoice_type='tuition', amount=Decimal('1000.00'), status='pending')
+        PaymentFactory(invoice=self.invoice, amount=Decimal('300.00'), payment_method='cash',
+                       status='completed', payment_date=this_month)
+        PaymentFactory(invoice=self.invoice, amount=Decimal('200.00'), payment_method='card',
+                       status='completed', payment_date=last_month)
+        InvoiceFactory(invoice_type='tuition', amount=Decimal('400.00'), status='overdue')
+        ExpenseFactory(category='utilities', amount=Decimal('80.00'), expense_date=self.today)
+
+    def test_kpis_from_aggregates(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['collected'], {
+            'this_month': '300.00', 'last_month': '200.00', 'change_percent': '50.0'
+        })
+        self.assertEqual(response.data['outstanding_tuition'], '900.00')
+        self.assertEqual((response.data['overdue_tuition'], response.data['overdue_count']), ('400.00', 1))
+        self.assertEqual(response.data['expenses_by_category'], {'utilities': '80.00'})
+        self.assertEqual(response.data['collected_by_payment_method'], {'cash': '300.00'})
+
+    def test_cached_until_a_finance_write(self):
+        cached_dashboard_kpis()
+        with self.assertNumQueries(0):
+            cached_dashboard_kpis()
+        with self.captureOnCommitCallbacks(execute=True):
+            ExpenseFactory(category='supplies', amount=Decimal('20.00'), expense_date=self.today)
+        self.assertEqual(cached_dashboard_kpis()['expenses_by_category']['supplies'], '20.00')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            sweep_overdue(self.today + timedelta(days=3650))
+        self.assertEqual(cached_dashboard_kpis()['overdue_count'], 2)
+
+    def test_ledger_rebuild_drops_the_cached_kpis(self):
+        # Ledger rows lost behind the signals' back: the drifted figures get cached
+        LedgerDay.objects.filter(entry_type='expense').delete()
+        self.assertEqual(cached_dashboard_kpis()['expenses_by_category'], {})
+        with self.captureOnCommitCallbacks(execute=True):
+            check_ledger_drift()
+        self.assertEqual(cached_dashboard_kpis()['expenses_by_category'], {'utilities': '80.00'})
+
+    def test_cache_outage_does_not_fail_finance_writes(self):
+        with mock.patch.object(cache, 'delete', side_effect=ConnectionError('cache down')), \
+                self.assertLogs('apps.finance.dashboard', 'WARNING'), \
+                self.captureOnCommitCallbacks(execute=True):
+            expense = ExpenseFactory(category='supplies', amount=Decimal('20.00'), expense_date=self.today)
+        self.assertTrue(Expense.objects.filter(id=expense.id).exists())
@@ -11,4 +11,5 @@ router.register(r'financial-reports', views.FinancialReportViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('dashboard/', views.FinanceDashboardView.as_view(), name='finance-dashboard'),
 ]
@@ -1,25 +1,178 @@
-from rest_framework import viewsets, permissions
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .aging import BUCKETS, aging_invoices, cached_aging_report
+from .balances import PaymentRejected, post_payment
+from .dashboard import cached_dashboard_kpis
+from .invoicing import invoice_fee_schedule
 from .models import Invoice, Payment, Receipt, Expense, FinancialReport
-from .serializers import InvoiceSerializer, PaymentSerializer, ReceiptSerializer, ExpenseSerializer, FinancialReportSerializer
+from .payroll import run_payroll
+from .reconciliation import StatementError, reconcile_statement
+from .reports import generate_report, report_period
+from .serializers import (
+    InvoiceSerializer, BulkInvoiceSerializer, PaymentSerializer, PaymentPostingSerializer, ReceiptSerializer,
+    ExpenseSerializer, FinancialReportSerializer
+)
 from apps.accounts.permissions import IsManagerOrAdministrator
+from apps.documents.layouts import LABELS
+from apps.documents.pdf_generator import FinancialReportPDFGenerator
+from apps.documents.receipts import pending_payments
+from apps.documents.storage import save_generated_file, serve_generated_file
+from apps.documents.tasks import issue_pending_receipts
+
+
+def stored_file_response(request, file_path):
+    """
+    Serve a generated finance file, or 404 if it was never written
+    """
+    if not file_path:
+        return Response({'error': 'File has not been generated yet'}, status=status.HTTP_404_NOT_FOUND)
+    return serve_generated_file(request, file_path)
 
 
 class InvoiceViewSet(viewsets.ModelViewSet):
     queryset = Invoice.objects.all()
     serializer_class = InvoiceSerializer
     permission_classes = [permissions.IsAuthenticated, IsManagerOrAdministrator]
+    filterset_fields = {
+        'invoice_type': ['exact'],
+        'status': ['exact'],
+        'student': ['exact'],
+        'balance_due': ['exact', 'gt', 'gte', 'lt', 'lte'],
+    }
+    ordering_fields = ['balance_due', 'due_date', 'amount', 'created_at']
+    
+    @action(detail=True, methods=['post'])
+    def pay(self, request, pk=None):
+        """
+        Post a completed payment against the invoice; the balance and status follow
+        """
+        invoice = self.get_object()
+        serializer = PaymentPostingSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            payment = post_payment(invoice.id, **serializer.validated_data)
+        except PaymentRejected as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        invoice.refresh_from_db()
+        return Response({
+            'payment': PaymentSerializer(payment).data,
+            'invoice': self.get_serializer(invoice).data
+        }, status=status.HTTP_201_CREATED)
+    
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Invoice a fee schedule to every student enrolled in a class, a level
+        (with its sublevels) or an academic year; preview=true only counts
+        """
+        serializer = BulkInvoiceSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        result = invoice_fee_schedule(
+            data['fees'],
+            request.user,
+            class_id=data.get('class_id'),
+            level_id=data.get('level_id'),
+            academic_year_id=data.get('academic_year_id'),
+            invoice_type=data['invoice_type'],
+            preview=data['preview']
+        )
+        return Response(result, status=status.HTTP_200_OK if data['preview'] else status.HTTP_201_CREATED)
+    
+    @action(detail=False, methods=['post'])
+    def payroll(self, request):
+        """
+        Issue the salary invoices of a month (year, month) for all active
+        teachers; teachers already invoiced that month are skipped
+        """
+        preview = str(request.data.get('preview', '')).lower() in ('1', 'true', 'yes')
+        try:
+            summary = run_payroll(request.data.get('year'), request.data.get('month'), request.user, preview=preview)
+        except (TypeError, ValueError) as e:
+            return Response({'error': f'Invalid payroll month: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(summary, status=status.HTTP_200_OK if preview else status.HTTP_201_CREATED)
+    
+    @action(detail=False, methods=['get'])
+    def aging(self, request):
+        """
+        Open tuition receivables by days overdue (current, 1-30, 31-60, 61-90, 90+),
+        overall, by level and by class
+        """
+        return Response(cached_aging_report())
+    
+    @action(detail=False, methods=['get'], url_path='aging/invoices')
+    def aging_invoices(self, request):
+        """
+        Drill-down of the aging report: open receivables filtered by bucket,
+        class_id ('none' for students without a class) and level_id
+        """
+        bucket = request.query_params.get('bucket')
+        if bucket and bucket not in [key for key, first, last in BUCKETS]:
+            return Response({'error': f'Unknown aging bucket: {bucket}'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        queryset = aging_invoices(
+            self.filter_queryset(self.get_queryset()),
+            bucket=bucket,
+            class_id=request.query_params.get('class_id'),
+            level_id=request.query_params.get('level_id')
+        )
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(queryset, many=True).data)
 
 
 class PaymentViewSet(viewsets.ModelViewSet):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
     permission_classes = [permissions.IsAuthenticated, IsManagerOrAdministrator]
+    
+    @action(detail=False, methods=['post'])
+    def reconcile(self, request):
+        """
+        Match an uploaded bank statement CSV (file) against the unreconciled
+        bank transfer and cheque payments; dry_run=true only reports
+        """
+        statement = request.FILES.get('file')
+        if statement is None:
+            return Response({'error': 'A statement file is required'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+        try:
+            report = reconcile_statement(statement, dry_run=dry_run)
+        except StatementError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report)
 
 
 class ReceiptViewSet(viewsets.ModelViewSet):
     queryset = Receipt.objects.all()
     serializer_class = ReceiptSerializer
     permission_classes = [permissions.IsAuthenticated, IsManagerOrAdministrator]
+    
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """
+        Download the receipt PDF
+        """
+        return stored_file_response(request, self.get_object().file_path)
+    
+    @action(detail=False, methods=['post'])
+    def issue(self, request):
+        """
+        Queue receipt issuing for all completed payments that have none yet
+        """
+        language = request.data.get('language')
+        if language and language not in LABELS:
+            return Response({'error': f'Unsupported language: {language}'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        pending = pending_payments().count()
+        if pending:
+            issue_pending_receipts.delay(language)
+        return Response({'pending': pending}, status=status.HTTP_202_ACCEPTED)
 
 
 class ExpenseViewSet(viewsets.ModelViewSet):
@@ -31,4 +184,49 @@ class ExpenseViewSet(viewsets.ModelViewSet):
 class FinancialReportViewSet(viewsets.ModelViewSet):
     queryset = FinancialReport.objects.all()
     serializer_class = FinancialReportSerializer
-    permission_classes = [permissions.IsAuthenticated, IsManagerOrAdministrator]
\ No newline at end of file
+    permission_classes = [permissions.IsAuthenticated, IsManagerOrAdministrator]
+    
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """
+        Download the rendered report file
+        """
+        return stored_file_response(request, self.get_object().file_path)
+    
+    @action(detail=False, methods=['post'])
+    def generate(self, request):
+        """
+        Compute a monthly (year, month), yearly (year) or custom (start_date,
+        end_date) report from the recorded payments and expenses.
+        With render=true the report PDF is rendered too.
+        """
+        data = request.data
+        report_type = data.get('report_type')
+        try:
+            start, end = report_period(
+                report_type, data.get('year'), data.get('month'), data.get('start_date'), data.get('end_date')
+            )
+        except (TypeError, ValueError) as e:
+            return Response({'error': f'Invalid report period: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        language = data.get('language', 'fr')
+        if language not in LABELS:
+            return Response({'error': f'Unsupported language: {language}'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        report = generate_report(report_type, start, end, request.user, data.get('title', ''))
+        if str(data.get('render', '')).lower() in ('1', 'true', 'yes'):
+            content = FinancialReportPDFGenerator(language=language).build_report(report, language)
+            report.file_path, size = save_generated_file(f"reports/report_{report.id}_{language}.pdf", content)
+            report.save(update_fields=['file_path'])
+        
+        return Response(self.get_serializer(report).data, status=status.HTTP_201_CREATED)
+
+
+class FinanceDashboardView(APIView):
+    """
+    Finance KPIs of the manager's home screen (cached, dropped on every finance write)
+    """
+    permission_classes = [permissions.IsAuthenticated, IsManagerOrAdministrator]
+    
+    def get(self, request):
+        return Response(cached_dashboard_kpis())
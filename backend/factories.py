@@ -26,7 +26,7 @@ class UserFactory(DjangoModelFactory):
     username = factory.LazyAttribute(lambda obj: fake.user_name()[:20])
     first_name = factory.LazyAttribute(lambda obj: fake.first_name())
     last_name = factory.LazyAttribute(lambda obj: fake.last_name())
-    phone = factory.LazyAttribute(lambda obj: fake.phone_number())
+    phone = factory.LazyAttribute(lambda obj: fake.phone_number()[:20])
     role = factory.Iterator(['parent', 'student', 'teacher', 'administrator', 'manager'])
     preferred_language = factory.Iterator(['fr', 'ar'])
     is_active = True
@@ -39,7 +39,7 @@ class InstitutionFactory(DjangoModelFactory):
     name = factory.LazyAttribute(lambda obj: fake.company())
     name_ar = factory.LazyAttribute(lambda obj: f"مؤسسة {fake.company()}")
     address = factory.LazyAttribute(lambda obj: fake.address())
-    phone = factory.LazyAttribute(lambda obj: fake.phone_number())
+    phone = factory.LazyAttribute(lambda obj: fake.phone_number()[:20])
     email = factory.LazyAttribute(lambda obj: fake.email())
 
 
@@ -50,7 +50,7 @@ class ParentFactory(DjangoModelFactory):
     user = factory.SubFactory(UserFactory, role='parent')
     profession = factory.LazyAttribute(lambda obj: fake.job())
     address = factory.LazyAttribute(lambda obj: fake.address())
-    emergency_contact = factory.LazyAttribute(lambda obj: fake.phone_number())
+    emergency_contact = factory.LazyAttribute(lambda obj: fake.phone_number()[:20])
 
 
 class StudentFactory(DjangoModelFactory):
@@ -62,7 +62,7 @@ class StudentFactory(DjangoModelFactory):
     date_of_birth = factory.LazyAttribute(lambda obj: fake.date_of_birth(minimum_age=6, maximum_age=18))
     gender = factory.Iterator(['M', 'F'])
     address = factory.LazyAttribute(lambda obj: fake.address())
-    emergency_contact = factory.LazyAttribute(lambda obj: fake.phone_number())
+    emergency_contact = factory.LazyAttribute(lambda obj: fake.phone_number()[:20])
     medical_info = factory.LazyAttribute(lambda obj: fake.text(max_nb_chars=200))
     is_archived = False
 
@@ -93,7 +93,7 @@ class AcademicYearFactory(DjangoModelFactory):
     class Meta:
         model = AcademicYear
     
-    name = factory.LazyAttribute(lambda obj: f"{fake.year()}-{fake.year() + 1}")
+    name = factory.LazyAttribute(lambda obj: f"{fake.year()}-{int(fake.year()) + 1}")
     start_date = factory.LazyAttribute(lambda obj: fake.date_between(start_date='-1y', end_date='today'))
     end_date = factory.LazyAttribute(lambda obj: fake.date_between(start_date='today', end_date='+1y'))
     is_current = factory.LazyAttribute(lambda obj: fake.boolean())
@@ -289,7 +289,7 @@ class BulletinFactory(DjangoModelFactory):
         model = Bulletin
     
     student = factory.SubFactory(StudentFactory)
-    academic_year = factory.LazyAttribute(lambda obj: f"{fake.year()}-{fake.year() + 1}")
+    academic_year = factory.LazyAttribute(lambda obj: f"{fake.year()}-{int(fake.year()) + 1}")
     trimester = factory.Iterator(['1er Trimestre', '2ème Trimestre', '3ème Trimestre'])
     class_name = factory.LazyAttribute(lambda obj: f"Classe {fake.random_int(min=1, max=5)}")
     language = factory.Iterator(['fr', 'ar'])
@@ -324,7 +324,7 @@ class AttestationFactory(DjangoModelFactory):
     student = factory.SubFactory(StudentFactory)
     attestation_type = factory.Iterator(['presence', 'inscription'])
     language = factory.Iterator(['fr', 'ar'])
-    academic_year = factory.LazyAttribute(lambda obj: f"{fake.year()}-{fake.year() + 1}")
+    academic_year = factory.LazyAttribute(lambda obj: f"{fake.year()}-{int(fake.year()) + 1}")
     class_name = factory.LazyAttribute(lambda obj: f"Classe {fake.random_int(min=1, max=5)}")
     level_name = factory.LazyAttribute(lambda obj: fake.word().title())
     valid_from = factory.LazyAttribute(lambda obj: fake.date_between(start_date='-30d', end_date='today'))
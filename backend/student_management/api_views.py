@@ -40,6 +40,7 @@ def api_root(request):
                 'documents': '/api/documents/documents/',
                 'bulletins': '/api/documents/bulletins/',
                 'attestations': '/api/documents/attestations/',
+                'jobs': '/api/documents/jobs/',
             },
             'admin': '/admin/',
         },
@@ -0,0 +1,20 @@
+"""
+Celery application for student_management project.
+
+Workers are started with:
+    celery -A student_management worker -l info
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'student_management.settings')
+
+app = Celery('student_management')
+
+# Read CELERY_* settings from Django settings
+app.config_from_object('django.conf:settings', namespace='CELERY')
+
+# Load tasks.py modules from all installed apps
+app.autodiscover_tasks()
@@ -10,9 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from decouple import config
 from datetime import timedelta
+from celery.schedules import crontab
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -149,6 +151,86 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Generated documents (bulletins, attestations, receipts, reports):
+# 'local' keeps them under MEDIA_ROOT/documents, 's3' uses any S3-compatible bucket
+DOCUMENTS_STORAGE = config('DOCUMENTS_STORAGE', default='local')
+
+if DOCUMENTS_STORAGE == 's3':
+    DOCUMENTS_STORAGE_BACKEND = {
+        'BACKEND': 'storages.backends.s3boto3.S3Boto3Storage',
+        'OPTIONS': {
+            'bucket_name': config('AWS_STORAGE_BUCKET_NAME', default='documents'),
+            'endpoint_url': config('AWS_S3_ENDPOINT_URL', default=None),
+            'access_key': config('AWS_ACCESS_KEY_ID', default=None),
+            'secret_key': config('AWS_SECRET_ACCESS_KEY', default=None),
+            'region_name': config('AWS_S3_REGION_NAME', default=None),
+            'location': 'documents',
+            'default_acl': 'private',
+            'querystring_auth': True,
+            'querystring_expire': 300,
+            'file_overwrite': True,
+        },
+    }
+else:
+    DOCUMENTS_STORAGE_BACKEND = {
+        'BACKEND': 'apps.documents.storage.DocumentFileSystemStorage',
+    }
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+    'documents': DOCUMENTS_STORAGE_BACKEND,
+}
+
+# Let nginx deliver generated files through X-Accel-Redirect (internal /media/documents/)
+DOCUMENTS_X_ACCEL_REDIRECT = config('DOCUMENTS_X_ACCEL_REDIRECT', default=False, cast=bool)
+
+# PDF rendering engine per document type: 'reportlab' or 'weasyprint' (HTML/CSS templates)
+DOCUMENT_RENDERERS = {
+    'bulletin': config('DOCUMENT_RENDERER_BULLETIN', default='reportlab'),
+    'attestation_presence': config('DOCUMENT_RENDERER_ATTESTATION_PRESENCE', default='reportlab'),
+    'attestation_inscription': config('DOCUMENT_RENDERER_ATTESTATION_INSCRIPTION', default='reportlab'),
+    'receipt': config('DOCUMENT_RENDERER_RECEIPT', default='reportlab'),
+    'financial_report': config('DOCUMENT_RENDERER_FINANCIAL_REPORT', default='reportlab'),
+}
+
+# Where fonts optimized for PDF embedding are cached (default: <tmp>/document-fonts)
+DOCUMENT_FONT_CACHE_DIR = config('DOCUMENT_FONT_CACHE_DIR', default='')
+
+# Worker processes rendering receipts in the batch issuing run (1 renders in-process)
+RECEIPT_RENDER_WORKERS = config('RECEIPT_RENDER_WORKERS', default=min(4, os.cpu_count() or 1), cast=int)
+
+# Cache shared by web and worker processes (Redis URL). Falls back to the Celery
+# broker when it is a Redis instance; the per-process memory cache is only used
+# when neither is configured, as invalidations then never reach the workers.
+# A Redis outage degrades to cache misses (logged) instead of failing requests.
+CACHE_URL = config('CACHE_URL', default='')
+if not CACHE_URL and config('CELERY_BROKER_URL', default='').startswith(('redis://', 'rediss://')):
+    CACHE_URL = config('CELERY_BROKER_URL')
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': CACHE_URL,
+            'OPTIONS': {
+                'IGNORE_EXCEPTIONS': True,
+                'SOCKET_CONNECT_TIMEOUT': 1,
+                'SOCKET_TIMEOUT': 1,
+            },
+        }
+    }
+    DJANGO_REDIS_LOG_IGNORED_EXCEPTIONS = True
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -216,6 +298,19 @@ EMAIL_PORT = config('EMAIL_PORT', default=587, cast=int)
 EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=True, cast=bool)
 EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='webmaster@localhost')
+
+# Bulletin e-mail distribution: messages per second, messages per batch, attempts per recipient
+BULLETIN_MAIL_RATE = config('BULLETIN_MAIL_RATE', default=10, cast=float)
+BULLETIN_MAIL_BATCH_SIZE = config('BULLETIN_MAIL_BATCH_SIZE', default=100, cast=int)
+BULLETIN_MAIL_MAX_ATTEMPTS = config('BULLETIN_MAIL_MAX_ATTEMPTS', default=3, cast=int)
+
+# Receivables aging report cache lifetime (seconds)
+FINANCE_AGING_CACHE_SECONDS = config('FINANCE_AGING_CACHE_SECONDS', default=60, cast=int)
+# Finance dashboard KPIs cache lifetime (seconds); also dropped on every finance write
+FINANCE_DASHBOARD_CACHE_SECONDS = config('FINANCE_DASHBOARD_CACHE_SECONDS', default=300, cast=int)
+# Mail parents when the nightly sweep turns their children's invoices overdue
+FINANCE_OVERDUE_REMINDERS = config('FINANCE_OVERDUE_REMINDERS', default=False, cast=bool)
 
 # Celery Configuration
 CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='redis://localhost:6379/0')
@@ -224,6 +319,20 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+# Run tasks in-process without a broker (local development and tests)
+CELERY_TASK_ALWAYS_EAGER = config('CELERY_TASK_ALWAYS_EAGER', default=False, cast=bool)
+# Periodic tasks (celery -A student_management beat)
+CELERY_BEAT_SCHEDULE = {
+    'sweep-overdue-invoices': {
+        'task': 'apps.finance.tasks.sweep_overdue_invoices',
+        'schedule': crontab(hour=0, minute=30),
+        'kwargs': {'remind': FINANCE_OVERDUE_REMINDERS},
+    },
+    'check-ledger-drift': {
+        'task': 'apps.finance.tasks.check_ledger_drift',
+        'schedule': crontab(hour=2, minute=0),
+    },
+}
 
 # Logging Configuration
 LOGGING = {